@@ -0,0 +1,84 @@
+"""
+Streaming CSV and NDJSON encoders for statement exports.
+
+Rows are plain tuples read from a server-side cursor, encoded one at a time
+and flushed in blocks, so memory use does not depend on the number of rows
+exported.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+
+BLOCO_BYTES = 64 * 1024
+
+
+class _Eco:
+    """File-like object whose write() returns what it was given."""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(colunas, linhas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(colunas)
+    for linha in linhas:
+        yield escritor.writerow(linha)
+
+
+def linhas_ndjson(colunas, linhas):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for linha in linhas:
+        yield encoder.encode(dict(zip(colunas, linha))) + '\n'
+
+
+FORMATOS = {
+    'csv': (linhas_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (linhas_ndjson, 'application/x-ndjson'),
+}
+
+
+def formato_requisitado(request):
+    """Return the ?formato= of the request, csv by default."""
+    formato = request.query_params.get('formato', 'csv')
+    if formato not in FORMATOS:
+        raise ValidationError({'formato': 'Use csv ou ndjson.'})
+    return formato
+
+
+def _em_blocos(partes):
+    """Join small strings into blocks of about BLOCO_BYTES.
+
+    The first part is sent on its own so the client gets the first byte as
+    soon as the first row is read.
+    """
+    partes = iter(partes)
+    for parte in partes:
+        yield parte.encode()
+        break
+
+    bloco = []
+    tamanho = 0
+    for parte in partes:
+        bloco.append(parte)
+        tamanho += len(parte)
+        if tamanho >= BLOCO_BYTES:
+            yield ''.join(bloco).encode()
+            bloco = []
+            tamanho = 0
+    if bloco:
+        yield ''.join(bloco).encode()
+
+
+def exportar(formato, nome, colunas, linhas):
+    """Return a StreamingHttpResponse with linhas encoded as formato."""
+    codificar, content_type = FORMATOS[formato]
+    response = StreamingHttpResponse(
+        _em_blocos(codificar(colunas, linhas)),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nome}.{formato}"'
+    return response
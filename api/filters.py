@@ -0,0 +1,50 @@
+"""
+Filters for the history listings.
+"""
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+def _periodo(valor, parametro):
+    """Return the [inicio, fim) interval denoted by a date or datetime string."""
+    try:
+        data = parse_date(valor)
+        data_hora = None if data else parse_datetime(valor)
+    except ValueError:
+        data = data_hora = None
+
+    if data_hora is not None:
+        if timezone.is_naive(data_hora):
+            data_hora = timezone.make_aware(data_hora)
+        return data_hora, data_hora + datetime.timedelta(microseconds=1)
+
+    if data is None:
+        raise ValidationError({parametro: 'Data inválida, use AAAA-MM-DD.'})
+
+    inicio = timezone.make_aware(datetime.datetime.combine(data, datetime.time.min))
+    fim = timezone.make_aware(datetime.datetime.combine(
+        data + datetime.timedelta(days=1), datetime.time.min))
+    return inicio, fim
+
+
+class PeriodoFilter(BaseFilterBackend):
+    """Filter a listing by ?from= and ?to= on the view's periodo_field.
+
+    Both bounds accept a date, which includes the whole day, or a datetime.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        campo = getattr(view, 'periodo_field', 'created_at')
+        inicio = request.query_params.get('from')
+        fim = request.query_params.get('to')
+
+        if inicio:
+            queryset = queryset.filter(**{f'{campo}__gte': _periodo(inicio, 'from')[0]})
+        if fim:
+            queryset = queryset.filter(**{f'{campo}__lt': _periodo(fim, 'to')[1]})
+
+        return queryset
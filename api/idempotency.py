@@ -0,0 +1,121 @@
+"""
+Idempotency-Key support for money-moving endpoints.
+
+A request sent with an ``Idempotency-Key`` header runs at most once per
+user and key. Its response is stored in the same transaction as the
+money movement, so a retry gets the stored response back without running
+the view again. A retry that arrives while the first request is still
+running waits on the unique index until the first one commits.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils import encoders
+
+from core.models import ChaveIdempotencia
+
+
+HEADER = 'Idempotency-Key'
+
+
+def _cache_key(user, chave):
+    return 'idempotencia:%s:%s' % (user.pk, hashlib.sha256(chave.encode()).hexdigest())
+
+
+def _assinatura(request):
+    """Fingerprint of the request, to refuse a key reused with another payload."""
+    conteudo = b'\n'.join([request.method.encode(), request.path.encode(), request.body])
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+def _reproduzir(armazenada, assinatura):
+    """Return the stored response, or an error if the key belongs to another request."""
+    if armazenada['assinatura'] != assinatura:
+        return Response(
+            {'message': 'Idempotency-Key já utilizada em outra requisição'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    return Response(armazenada['resposta'], status=armazenada['status_code'],
+                    headers={'Idempotent-Replayed': 'true'})
+
+
+def _reservar(user, chave, assinatura):
+    """Create the key row, or return the stored response of an earlier request.
+
+    Inserting a key that another transaction is still writing blocks until
+    that transaction ends, which is what makes concurrent retries wait.
+    """
+    agora = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return ChaveIdempotencia.objects.create(
+                    user=user,
+                    chave=chave,
+                    assinatura=assinatura,
+                    expira_em=agora + settings.IDEMPOTENCY_KEY_TTL
+                ), None
+        except IntegrityError:
+            registro = ChaveIdempotencia.objects.get(user=user, chave=chave)
+            if registro.expira_em > agora:
+                return None, {
+                    'assinatura': registro.assinatura,
+                    'status_code': registro.status_code,
+                    'resposta': registro.resposta,
+                }
+            registro.delete()
+
+    raise IntegrityError('Idempotency-Key em uso')
+
+
+def idempotente(view_method):
+    """Make a viewset method replay its response for a repeated Idempotency-Key."""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        chave = request.headers.get(HEADER)
+        if not chave:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(chave) > 255:
+            return Response({'message': 'Idempotency-Key inválida'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        assinatura = _assinatura(request)
+        cache_key = _cache_key(request.user, chave)
+        armazenada = cache.get(cache_key)
+        if armazenada is not None:
+            return _reproduzir(armazenada, assinatura)
+
+        with transaction.atomic():
+            registro, armazenada = _reservar(request.user, chave, assinatura)
+            if armazenada is not None:
+                return _reproduzir(armazenada, assinatura)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code >= 500:
+                registro.delete()
+                return response
+
+            registro.status_code = response.status_code
+            registro.resposta = json.loads(json.dumps(response.data, cls=encoders.JSONEncoder))
+            registro.save(update_fields=['status_code', 'resposta'])
+
+            armazenada = {
+                'assinatura': assinatura,
+                'status_code': registro.status_code,
+                'resposta': registro.resposta,
+            }
+            timeout = (registro.expira_em - timezone.now()).total_seconds()
+            transaction.on_commit(lambda: cache.set(cache_key, armazenada, timeout))
+
+        return response
+
+    return wrapper
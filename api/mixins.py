@@ -0,0 +1,49 @@
+"""
+Request-scoped account context for the api views.
+"""
+from rest_framework.exceptions import NotFound
+
+from core.models import Conta
+
+
+HEADER = 'X-Conta'
+PARAMETRO = 'conta'
+
+
+def contas_do_usuario(request):
+    """Return the contas of request.user, read once per request."""
+    contas = getattr(request, '_contas', None)
+    if contas is None:
+        contas = request._contas = list(
+            Conta.objects.filter(user=request.user).select_related('user').order_by('id')
+        )
+    return contas
+
+
+def conta_selecionada(request):
+    """Return the conta the request acts on, or None if the user has none.
+
+    A user with several contas picks one by id with the X-Conta header or
+    the ?conta= parameter; otherwise the oldest conta is used.
+    """
+    contas = contas_do_usuario(request)
+    escolhida = request.headers.get(HEADER) or request.query_params.get(PARAMETRO)
+    if not escolhida:
+        return contas[0] if contas else None
+
+    for conta in contas:
+        if str(conta.pk) == escolhida:
+            return conta
+    raise NotFound({'message': 'Conta não encontrada'})
+
+
+class ContaContextMixin:
+    """Expose the caller's contas and the selected conta to a view."""
+
+    @property
+    def contas(self):
+        return contas_do_usuario(self.request)
+
+    @property
+    def conta(self):
+        return conta_selecionada(self.request)
@@ -1,6 +1,9 @@
+from decimal import Decimal
+
+from django.conf import settings
 from rest_framework import serializers
 
-from core.models import Conta, Transferencia, Cartao, Emprestimo, ParcelaEmprestimo, CartaoGasto, Extrato
+from core.models import Conta, Transferencia, TransferenciaPendente, Cartao, Emprestimo, ParcelaEmprestimo, CartaoGasto, Extrato
 
 
 class AccountSerializer(serializers.ModelSerializer):
@@ -30,6 +33,7 @@ class TransferenciaSerializer(serializers.ModelSerializer):
     from_account = AccountSerializer(read_only=True, many=False)
     to_account = AccountSerializer(read_only=True, many=False)
     to_account_id = serializers.IntegerField()
+    value = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
 
     class Meta:
         model = Transferencia
@@ -38,13 +42,58 @@ class TransferenciaSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'from_account', 'created_at', 'to_account']
         
 
+class TransferenciaPendenteSerializer(serializers.ModelSerializer):
+    """Serializer for the status of an asynchronous transfer."""
+
+    class Meta:
+        model = TransferenciaPendente
+        fields = ['id', 'from_account_id', 'to_account_id', 'value', 'status',
+                  'motivo', 'transferencia_id', 'created_at', 'processada_em']
+        read_only_fields = fields
+
+
+class TransferenciaItemSerializer(serializers.Serializer):
+    to_account_id = serializers.IntegerField()
+    value = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
+
+class TransferenciaLoteSerializer(serializers.Serializer):
+    """Serializer for a batch of transfers from the authenticated account."""
+    transferencias = serializers.ListField(
+        child=TransferenciaItemSerializer(),
+        allow_empty=False,
+        max_length=settings.TRANSFERENCIAS_LOTE_MAXIMO
+    )
+
+
 class EmprestimoSerializer(serializers.ModelSerializer):
     account = AccountSerializer(read_only=True, many=False)
+    qtd_parcelas = serializers.IntegerField(min_value=1,
+                                            max_value=settings.EMPRESTIMO_PARCELAS_MAXIMO)
     
     class Meta:
         model = Emprestimo
-        fields = ['valorRequisitado', 'valorTotal', 'data_pedido', 'qtd_parcelas', 'account', 'status']
-        read_only_fields = ['valorTotal', 'data_pedido', 'account', 'status']
+        fields = ['valorRequisitado', 'valorTotal', 'data_pedido', 'qtd_parcelas', 'account', 'status',
+                  'taxa_juros', 'sistema_amortizacao']
+        read_only_fields = ['valorTotal', 'data_pedido', 'account', 'status', 'taxa_juros']
+
+
+class SimulacaoEmprestimoSerializer(serializers.Serializer):
+    """Serializer for the terms of a loan simulation grid."""
+    valorRequisitado = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    qtd_parcelas = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=settings.EMPRESTIMO_PARCELAS_MAXIMO),
+        allow_empty=False,
+        max_length=settings.EMPRESTIMO_PARCELAS_MAXIMO
+    )
+    taxa_juros = serializers.ListField(
+        child=serializers.DecimalField(max_digits=9, decimal_places=8, min_value=0, max_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=settings.SIMULACAO_TAXAS_MAXIMO
+    )
+    sistema_amortizacao = serializers.ChoiceField(choices=Emprestimo.SISTEMAS_AMORTIZACAO,
+                                                  default=Emprestimo.PRICE)
 
 
 class ParcelaEmprestimoSerializer(serializers.ModelSerializer):
@@ -52,19 +101,45 @@ class ParcelaEmprestimoSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = ParcelaEmprestimo
-        fields = ['valorParcela', 'valorPago', 'numParcela', 'dataVencimento', 'dataPaga', 'emprestimo']
+        fields = ['valorParcela', 'valorPago', 'amortizacao', 'juros', 'numParcela', 'dataVencimento',
+                  'dataPaga', 'status', 'dias_atraso', 'multa', 'juros_mora', 'emprestimo']
         read_only_fields = fields
 
 
+class PagamentoParcelasSerializer(serializers.Serializer):
+    """Serializer for which installments of a loan to pay.
+
+    Send parcelas (installment numbers), quantidade (the next open ones) or
+    quitar to pay off the loan; nothing pays the next open installment.
+    """
+    parcelas = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=settings.EMPRESTIMO_PARCELAS_MAXIMO
+    )
+    quantidade = serializers.IntegerField(required=False, min_value=1,
+                                          max_value=settings.EMPRESTIMO_PARCELAS_MAXIMO)
+    quitar = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        escolhas = [campo for campo in ('parcelas', 'quantidade') if campo in attrs]
+        if attrs['quitar']:
+            escolhas.append('quitar')
+        if len(escolhas) > 1:
+            raise serializers.ValidationError('Informe apenas um de parcelas, quantidade ou quitar.')
+        return attrs
+
+
 class DepositoSerializer(serializers.Serializer):
-    value = serializers.DecimalField(max_digits=5, decimal_places=2)
+    value = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('0.01'))
 
     class Meta:
         fields = ['value']
 
 
 class SaqueSerializer(serializers.Serializer):
-    value = serializers.DecimalField(max_digits=5, decimal_places=2)
+    value = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('0.01'))
 
     class Meta:
         fields = ['value']
@@ -99,7 +174,8 @@ class SendCartaoGastoSerializer(serializers.Serializer):
 
 class CartaoGastoSerializer(serializers.ModelSerializer):
     cartao = SendCartaoGastoSerializer(many=False)
-    
+    valor = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
     class Meta:
         model = CartaoGasto
         fields = ['id', 'cartao', 'valor', 'nome', 'created_at']
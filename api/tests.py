@@ -1,3 +1,902 @@
-from django.test import TestCase
+"""
+Tests for the api app.
+"""
+import csv
+import datetime
+import io
+import json
+import time
+from collections import namedtuple
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework import status, viewsets
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.idempotency import idempotente
+from core import amortizacao, revogacao, services, simulacao
+from core.authentication import guardar_usuario
+from core.benchmark import executar_concorrente
+from core.models import (Cartao, CartaoGasto, ChaveIdempotencia, Conta, Emprestimo, Extrato, Lancamento,
+                         ParcelaEmprestimo, Transferencia, TransferenciaPendente, User)
+
+
+class PeriodoIndexTests(TestCase):
+    """Date-range statement queries must be served by indexes."""
+
+    tabelas = ('core_extrato', 'core_transferencia', 'core_cartaogasto')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='periodo@example.com', cpf='11111111111')
+        outro = User.objects.create(email='outro@example.com', cpf='22222222222')
+        cls.conta = Conta.objects.create(user=cls.user, agencia='0001', numero='00000018', saldo=0)
+        outra = Conta.objects.create(user=outro, agencia='0001', numero='00000026', saldo=0)
+
+        services.depositar(cls.conta.pk, Decimal('100.00'))
+        services.transferir(cls.conta.pk, outra.pk, Decimal('10.00'))
+        services.transferir(outra.pk, cls.conta.pk, Decimal('5.00'))
+        cartao = Cartao.objects.create(nome='Periodo Teste', cvv='123', numero='6504870000000000',
+                                       limite=Decimal('100.00'), tipo='Crédito', conta=cls.conta)
+        services.registrar_gasto(cartao, Decimal('1.00'), 'Padaria')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        hoje = timezone.localdate()
+        self.periodo = f'from={hoje - datetime.timedelta(days=90)}&to={hoje}'
+
+    def assertSemSeqScan(self, url):
+        """Fail if a query of the listing on a history table plans a Seq Scan.
+
+        Sequential scans are disabled for the EXPLAIN, so the planner only
+        picks one when no index can serve the query.
+        """
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()['results'])
+
+        planos = 0
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for consulta in consultas.captured_queries:
+                sql = consulta['sql']
+                if not sql.lstrip('(').startswith('SELECT'):
+                    continue
+                if not any(f'"{tabela}"' in sql for tabela in self.tabelas):
+                    continue
+                cursor.execute('EXPLAIN ' + sql)
+                plano = '\n'.join(linha for linha, in cursor.fetchall())
+                self.assertNotIn('Seq Scan', plano, f'{url}\n{sql}\n{plano}')
+                planos += 1
+
+        self.assertGreater(planos, 0)
+
+    def test_extrato_por_periodo(self):
+        self.assertSemSeqScan(f'/api/v1/extrato/?{self.periodo}')
+
+    def test_extrato_por_periodo_e_tipo(self):
+        self.assertSemSeqScan(f'/api/v1/extrato/?{self.periodo}&tipo=Deposito')
+
+    def test_transferencias_por_periodo(self):
+        self.assertSemSeqScan(f'/api/v1/transferencias/?{self.periodo}')
+
+    def test_transferencias_enviadas_por_periodo(self):
+        self.assertSemSeqScan(f'/api/v1/transferencias/?{self.periodo}&tipo=enviada')
+
+    def test_transferencias_recebidas_por_periodo(self):
+        self.assertSemSeqScan(f'/api/v1/transferencias/?{self.periodo}&tipo=recebida')
+
+    def test_gastos_por_periodo(self):
+        self.assertSemSeqScan(f'/api/v1/gastos/?{self.periodo}')
+
+    def test_periodo_invalido(self):
+        response = self.client.get('/api/v1/extrato/?from=ontem')
+        self.assertEqual(response.status_code, 400)
+
+
+class ContaContextTests(TestCase):
+    """The caller's contas are read once per request."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='contexto@example.com', cpf='33333333333')
+        outro = User.objects.create(email='terceiro@example.com', cpf='44444444444')
+        cls.conta = Conta.objects.create(user=cls.user, agencia='0001', numero='00000034', saldo=0)
+        cls.segunda = Conta.objects.create(user=cls.user, agencia='0001', numero='00000042', saldo=0)
+        cls.alheia = Conta.objects.create(user=outro, agencia='0001', numero='00000059', saldo=0)
+
+        services.depositar(cls.conta.pk, Decimal('100.00'))
+        services.depositar(cls.segunda.pk, Decimal('50.00'))
+        for _ in range(5):
+            services.transferir(cls.conta.pk, cls.alheia.pk, Decimal('1.00'))
+            services.transferir(cls.alheia.pk, cls.conta.pk, Decimal('1.00'))
+
+        cls.cartoes = [
+            Cartao.objects.create(nome='Contexto Teste', cvv='123', numero=f'650487000000001{n}',
+                                  limite=Decimal('100.00'), tipo='Crédito', conta=cls.conta)
+            for n in range(2)
+        ]
+        for cartao in cls.cartoes:
+            for _ in range(3):
+                services.registrar_gasto(cartao, Decimal('1.00'), 'Padaria')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertConsultas(self, quantidade, url, **extra):
+        with self.assertNumQueries(quantidade):
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_extrato(self):
+        self.assertEqual(len(self.assertConsultas(2, '/api/v1/extrato/')['results']), 11)
+
+    def test_transferencias(self):
+        self.assertEqual(len(self.assertConsultas(3, '/api/v1/transferencias/')['results']), 10)
+
+    def test_transferencias_enviadas(self):
+        self.assertConsultas(2, '/api/v1/transferencias/?tipo=enviada')
+
+    def test_cartoes(self):
+        self.assertEqual(len(self.assertConsultas(2, '/api/v1/cartoes/listar-cartoes/')), 2)
+
+    def test_gastos_de_todos_os_cartoes(self):
+        self.assertEqual(len(self.assertConsultas(4, '/api/v1/gastos/')['results']), 6)
+
+    def test_emprestimos(self):
+        self.assertConsultas(2, '/api/v1/emprestimos/listar-emprestimos/')
+
+    def test_conta_pelo_header(self):
+        dados = self.assertConsultas(2, '/api/v1/extrato/', HTTP_X_CONTA=str(self.segunda.pk))
+        self.assertEqual([item['conta']['id'] for item in dados['results']], [self.segunda.pk])
+
+    def test_conta_pelo_parametro(self):
+        dados = self.assertConsultas(2, f'/api/v1/extrato/?conta={self.segunda.pk}')
+        self.assertEqual(len(dados['results']), 1)
+
+    def test_conta_alheia(self):
+        response = self.client.get(f'/api/v1/extrato/?conta={self.alheia.pk}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_transferencia_da_conta_selecionada(self):
+        response = self.client.post('/api/v1/transferencias/',
+                                    {'to_account_id': self.alheia.pk, 'value': '10.00'},
+                                    format='json', HTTP_X_CONTA=str(self.segunda.pk))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.segunda.refresh_from_db()
+        self.assertEqual(self.segunda.saldo, Decimal('40.00'))
+
+    def test_saque_de_conta_alheia(self):
+        response = self.client.post(f'/api/v1/accounts/{self.alheia.pk}/sacar/',
+                                    {'value': '1.00'}, format='json')
+        self.assertEqual(response.status_code, 404, response.content)
+        self.alheia.refresh_from_db()
+        self.assertEqual(self.alheia.saldo, Decimal('0.00'))
+
+    def test_valores_nao_positivos(self):
+        rotas = [f'/api/v1/accounts/{self.conta.pk}/depositar/',
+                 f'/api/v1/accounts/{self.conta.pk}/sacar/',
+                 '/api/v1/transferencias/']
+        for url in rotas:
+            for valor in ('0.00', '-10.00'):
+                with self.subTest(url=url, valor=valor):
+                    response = self.client.post(url, {'value': valor, 'to_account_id': self.alheia.pk},
+                                                format='json')
+                    self.assertEqual(response.status_code, 400, response.content)
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo, Decimal('100.00'))
+
+    def test_gasto_negativo(self):
+        cartao = self.cartoes[0]
+        response = self.client.post('/api/v1/gastos/', {
+            'cartao': {'nome': cartao.nome, 'cvv': cartao.cvv, 'numero': cartao.numero,
+                       'data_exp': '2030-01-01'},
+            'valor': '-10.00', 'nome': 'Estorno'}, format='json')
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(CartaoGasto.objects.filter(cartao=cartao).count(), 3)
+
+    def test_transferencia_para_a_propria_conta(self):
+        response = self.client.post('/api/v1/transferencias/',
+                                    {'to_account_id': self.segunda.pk, 'value': '1000.00'},
+                                    format='json', HTTP_X_CONTA=str(self.segunda.pk))
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(Transferencia.objects.filter(from_account=self.segunda).exists())
+
+
+class TransferenciaLoteTests(TestCase):
+    """A batch answers every item, in order, and settles only the accepted ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='lote@example.com', cpf='55555555555')
+        outro = User.objects.create(email='lote-destino@example.com', cpf='55555555556')
+        cls.conta = Conta.objects.create(user=cls.user, agencia='0001', numero='00000067', saldo=0)
+        cls.destinos = [Conta.objects.create(user=outro, agencia='0001', numero=f'0000007{n}', saldo=0)
+                        for n in range(2)]
+        services.depositar(cls.conta.pk, Decimal('10.00'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def lote(self, itens):
+        return self.client.post('/api/v1/transferencias/batch/', {'transferencias': [
+            {'to_account_id': conta_id, 'value': valor} for conta_id, valor in itens
+        ]}, format='json')
+
+    def test_resultado_por_item(self):
+        a, b = self.destinos
+        response = self.lote([(a.pk, '4.00'), (999999, '1.00'), (self.conta.pk, '1.00'),
+                              (b.pk, '7.00'), (b.pk, '6.00')])
+
+        self.assertEqual(response.status_code, 200, response.content)
+        resultados = response.json()['resultados']
+        self.assertEqual([(r['indice'], r['message']) for r in resultados], [
+            (0, 'ok'), (1, 'Conta não encontrada'), (2, 'Conta de destino inválida'),
+            (3, 'Saldo insuficiente'), (4, 'ok'),
+        ])
+        self.assertEqual([r.get('id') is not None for r in resultados], [True, False, False, False, True])
+        self.assertEqual(
+            list(Transferencia.objects.filter(pk__in=[resultados[0]['id'], resultados[4]['id']])
+                 .order_by('id').values_list('to_account_id', 'value')),
+            [(a.pk, Decimal('4.00')), (b.pk, Decimal('6.00'))]
+        )
+        saldos = dict(Conta.objects.values_list('pk', 'saldo'))
+        self.assertEqual([saldos[self.conta.pk], saldos[a.pk], saldos[b.pk]],
+                         [Decimal('0.00'), Decimal('4.00'), Decimal('6.00')])
+        self.assertEqual(Lancamento.objects.filter(tipo='Transferencia').count(), 4)
+
+    def test_lote_invalido(self):
+        a, _ = self.destinos
+        for itens in ([], [(a.pk, '0.00')], [(a.pk, '0.01')] * (settings.TRANSFERENCIAS_LOTE_MAXIMO + 1)):
+            with self.subTest(itens=len(itens)):
+                self.assertEqual(self.lote(itens).status_code, 400)
+        self.assertFalse(Transferencia.objects.exists())
+
+
+class ExportacaoTests(TestCase):
+    """Exports stream every filtered row of the selected conta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='exportacao@example.com', cpf='56565656565')
+        outro = User.objects.create(email='exportacao-outro@example.com', cpf='56565656566')
+        cls.conta = Conta.objects.create(user=cls.user, agencia='0001', numero='00000083', saldo=0)
+        cls.outra = Conta.objects.create(user=outro, agencia='0001', numero='00000091', saldo=0)
+        services.depositar(cls.conta.pk, Decimal('10.00'))
+        services.depositar(cls.outra.pk, Decimal('10.00'))
+        services.sacar(cls.conta.pk, Decimal('1.50'))
+        cls.enviada = services.transferir(cls.conta.pk, cls.outra.pk, Decimal('2.00'))
+        cls.recebida = services.transferir(cls.outra.pk, cls.conta.pk, Decimal('3.00'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def exportar(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_extrato_csv(self):
+        response, corpo = self.exportar('/api/v1/extrato/exportar/')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="extrato.csv"')
+        linhas = list(csv.reader(io.StringIO(corpo)))
+        self.assertEqual(linhas[0], ['id', 'tipo', 'valor', 'created_at'])
+        esperado = Extrato.objects.filter(conta=self.conta).order_by('id')
+        self.assertEqual([(int(i), tipo, Decimal(valor)) for i, tipo, valor, _ in linhas[1:]],
+                         list(esperado.values_list('id', 'tipo', 'valor')))
+
+    def test_extrato_ndjson_filtrado(self):
+        hoje = timezone.localdate()
+        _, corpo = self.exportar(f'/api/v1/extrato/exportar/?formato=ndjson&tipo=deposito&from={hoje}')
+
+        linhas = [json.loads(linha) for linha in corpo.splitlines()]
+        self.assertEqual([(linha['tipo'], linha['valor']) for linha in linhas], [('Deposito', '10.00')])
+
+        ontem = hoje - datetime.timedelta(days=1)
+        self.assertEqual(self.exportar(f'/api/v1/extrato/exportar/?formato=ndjson&to={ontem}')[1], '')
+
+    def test_transferencias(self):
+        _, corpo = self.exportar('/api/v1/transferencias/exportar/?formato=ndjson')
+        linhas = [json.loads(linha) for linha in corpo.splitlines()]
+        self.assertEqual([(linha['id'], linha['tipo'], linha['value']) for linha in linhas], [
+            (self.enviada.pk, 'enviada', '2.00'), (self.recebida.pk, 'recebida', '3.00'),
+        ])
+
+        _, corpo = self.exportar('/api/v1/transferencias/exportar/?tipo=recebida')
+        linhas = list(csv.reader(io.StringIO(corpo)))
+        self.assertEqual(linhas[0], ['id', 'tipo', 'from_account_id', 'to_account_id', 'value', 'created_at'])
+        self.assertEqual([linha[:5] for linha in linhas[1:]],
+                         [[str(self.recebida.pk), 'recebida', str(self.outra.pk), str(self.conta.pk), '3.00']])
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get('/api/v1/extrato/exportar/?formato=xml').status_code, 400)
+
+
+class TransferenciaAssincronaTests(TestCase):
+    """Transfers sent with Prefer: respond-async are queued and settled later."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='assincrona@example.com', cpf='88888888888')
+        outro = User.objects.create(email='recebedor@example.com', cpf='88888888889')
+        cls.conta = Conta.objects.create(user=cls.user, agencia='0001', numero='00000091', saldo=0)
+        cls.destino = Conta.objects.create(user=outro, agencia='0001', numero='00000109', saldo=0)
+        services.depositar(cls.conta.pk, Decimal('100.00'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def agendar(self, valor, destino=None):
+        return self.client.post('/api/v1/transferencias/',
+                                {'to_account_id': (destino or self.destino).pk, 'value': valor},
+                                format='json', HTTP_PREFER='respond-async')
+
+    def test_agenda_e_liquida(self):
+        response = self.agendar('30.00')
+
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response['Location'], response.data['url'])
+        self.assertEqual(response['Preference-Applied'], 'respond-async')
+        self.assertFalse(Transferencia.objects.exists())
+        self.assertEqual(self.client.get(response['Location']).data['status'],
+                         TransferenciaPendente.PENDENTE)
+
+        services.liquidar_transferencias(10)
+
+        dados = self.client.get(response['Location']).data
+        self.assertEqual(dados['status'], TransferenciaPendente.CONCLUIDA)
+        self.assertEqual(dados['transferencia_id'], Transferencia.objects.get().pk)
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo, Decimal('70.00'))
+
+    def test_validacao_imediata(self):
+        self.assertEqual(self.agendar('100.01').status_code, 403)
+        self.assertEqual(self.agendar('1.00', destino=self.conta).status_code, 400)
+        self.assertEqual(self.agendar('1.00', destino=Conta(pk=0)).status_code, 404)
+        self.assertEqual(self.agendar('0.00').status_code, 400)
+        self.assertEqual(self.agendar('-10.00').status_code, 400)
+        self.assertFalse(TransferenciaPendente.objects.exists())
+
+    def test_status_de_outro_usuario(self):
+        pendente = services.agendar_transferencia(self.destino.pk, self.conta.pk, Decimal('1.00'))
+
+        response = self.client.get(f'/api/v1/transferencias/pendentes/{pendente.pk}/')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class LeiturasAssincronasTests(TestCase):
+    """The async read views answer like their sync counterparts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='assincrono@example.com', password='senha123',
+                                            cpf='99999999999')
+        outro = User.objects.create(email='alheio@example.com', cpf='99999999998')
+        cls.conta = Conta.objects.create(user=cls.user, agencia='0001', numero='00000117', saldo=0)
+        cls.alheia = Conta.objects.create(user=outro, agencia='0001', numero='00000125', saldo=0)
+        for _ in range(5):
+            services.depositar(cls.conta.pk, Decimal('2.00'))
+            services.sacar(cls.conta.pk, Decimal('1.00'))
+        Cartao.objects.create(nome='Async Teste', cvv='123', numero='6504870000000030',
+                              limite=Decimal('100.00'), tipo='Crédito', conta=cls.conta)
+        Emprestimo.objects.create(valorRequisitado=Decimal('100.00'), valorTotal=Decimal('120.00'),
+                                  qtd_parcelas=12, conta=cls.conta, status='Aprovado')
+
+    def setUp(self):
+        self.token = RefreshToken.for_user(self.user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_mesmas_respostas(self):
+        pares = [
+            ('/api/v1/accounts/00000117/', '/api/v1/async/accounts/00000117/'),
+            ('/api/v1/extrato/?tipo=saque', '/api/v1/async/extrato/?tipo=saque'),
+            ('/api/v1/cartoes/listar-cartoes/', '/api/v1/async/cartoes/'),
+            ('/api/v1/emprestimos/listar-emprestimos/', '/api/v1/async/emprestimos/'),
+        ]
+        for sincrona, assincrona in pares:
+            with self.subTest(assincrona):
+                esperada = self.client.get(sincrona)
+                response = self.client.get(assincrona)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(response.json(), esperada.json())
+
+    def test_paginas(self):
+        vistos = []
+        url = '/api/v1/async/extrato/?page_size=3'
+        while url:
+            dados = self.client.get(url).json()
+            vistos += [item['id'] for item in dados['results']]
+            url = dados['next']
+
+        esperados = list(Extrato.objects.filter(conta=self.conta).order_by('-id').values_list('id', flat=True))
+        self.assertEqual(vistos, esperados)
+
+    def test_conta_alheia(self):
+        self.assertEqual(self.client.get('/api/v1/async/accounts/00000125/').status_code, 404)
+        response = self.client.get(f'/api/v1/async/extrato/?conta={self.alheia.pk}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_sem_credenciais(self):
+        self.assertEqual(APIClient().get('/api/v1/async/extrato/').status_code, 401)
+
+    def test_token_revogado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            revogacao.revogar(self.token, 'logout', self.user.pk)
+
+        response = self.client.get('/api/v1/async/cartoes/')
+
+        self.assertEqual(response.status_code, 401)
+
+
+class FalhaViewSet(viewsets.ViewSet):
+    """Viewset whose idempotent action always answers 503."""
+
+    @idempotente
+    def create(self, request):
+        return Response({'message': 'indisponível'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class IdempotenciaTests(TestCase):
+    """Requests repeated with an Idempotency-Key run once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='idempotencia@example.com', cpf='88888888888')
+        cls.conta = Conta.objects.create(user=cls.user, agencia='0001', numero='00000067', saldo=0)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/v1/accounts/{self.conta.pk}/depositar/'
+
+    def depositar(self, valor, chave='chave-1'):
+        return self.client.post(self.url, {'value': valor}, format='json', HTTP_IDEMPOTENCY_KEY=chave)
+
+    def assertSaldo(self, saldo):
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo, Decimal(saldo))
+
+    def test_repeticao_devolve_a_resposta_guardada(self):
+        primeira = self.depositar('10.00')
+        self.assertEqual(primeira.status_code, 200, primeira.content)
+
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.depositar('10.00')
+
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertFalse([c for c in consultas.captured_queries if '"core_conta"' in c['sql']])
+        self.assertSaldo('10.00')
+
+    def test_repeticao_servida_pelo_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            primeira = self.depositar('10.00')
+
+        with self.assertNumQueries(0):
+            segunda = self.depositar('10.00')
+
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertSaldo('10.00')
+
+    def test_chave_com_outro_conteudo(self):
+        self.depositar('10.00')
+        response = self.depositar('20.00')
+
+        self.assertEqual(response.status_code, 422, response.content)
+        self.assertSaldo('10.00')
+
+    def test_resposta_5xx_libera_a_chave(self):
+        view = FalhaViewSet.as_view({'post': 'create'})
+        request = APIRequestFactory().post('/falha/', {}, format='json', HTTP_IDEMPOTENCY_KEY='chave-1')
+        force_authenticate(request, user=self.user)
+
+        response = view(request)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(ChaveIdempotencia.objects.filter(user=self.user).exists())
+
+    def test_chave_expirada_e_reaproveitada(self):
+        ChaveIdempotencia.objects.create(
+            user=self.user, chave='chave-1', assinatura='outra', status_code=200,
+            resposta={'saldo': '0.00'}, expira_em=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+        response = self.depositar('10.00')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertSaldo('10.00')
+        registro = ChaveIdempotencia.objects.get(user=self.user, chave='chave-1')
+        self.assertGreater(registro.expira_em, timezone.now())
+
+
+class IdempotenciaConcorrenteTests(TransactionTestCase):
+    """A retry sent while the first request is running waits for it."""
+
+    def test_requisicoes_simultaneas(self):
+        user = User.objects.create(email='simultaneas@example.com', cpf='99999999999')
+        conta = Conta.objects.create(user=user, agencia='0001', numero='00000075', saldo=0)
+        depositar = services.depositar
+
+        def lento(*args, **kwargs):
+            time.sleep(0.2)
+            return depositar(*args, **kwargs)
+
+        respostas = [None, None]
+
+        def cliente(indice):
+            client = APIClient()
+            client.force_authenticate(user)
+            respostas[indice] = client.post(f'/api/v1/accounts/{conta.pk}/depositar/',
+                                            {'value': '10.00'}, format='json',
+                                            HTTP_IDEMPOTENCY_KEY='chave-1')
+
+        with mock.patch.object(services, 'depositar', side_effect=lento) as chamado:
+            _, erros = executar_concorrente(2, cliente)
+
+        self.assertEqual(erros, [])
+        self.assertEqual(chamado.call_count, 1)
+        self.assertEqual([r.status_code for r in respostas], [200, 200])
+        self.assertEqual(respostas[0].json(), respostas[1].json())
+        conta.refresh_from_db()
+        self.assertEqual(conta.saldo, Decimal('10.00'))
+
+
+class SimulacaoTests(TestCase):
+    """Loan simulations are computed over the whole grid and cached."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='simulacao@example.com', cpf='10101010101')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def simular(self, **parametros):
+        return self.client.get('/api/v1/emprestimos/simular/', parametros)
+
+    def test_grade(self):
+        response = self.simular(valorRequisitado='1000.00', qtd_parcelas=[6, 12, 24],
+                                taxa_juros=['0', '0.0399'], sistema_amortizacao='SAC')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        simulacoes = response.json()['simulacoes']
+        self.assertEqual([len(linha['cenarios']) for linha in simulacoes], [3, 3])
+        sem_juros = simulacoes[0]['cenarios'][1]
+        self.assertEqual((sem_juros['primeira_parcela'], sem_juros['valorTotal'], sem_juros['juros']),
+                         (83.33, 1000.0, 0.0))
+
+    def test_confere_com_o_cronograma(self):
+        response = self.simular(valorRequisitado='1000.00', qtd_parcelas=[12, 72])
+
+        for cenario in response.json()['simulacoes'][0]['cenarios']:
+            cronograma = amortizacao.cronograma(Decimal('1000.00'), settings.EMPRESTIMO_TAXA_MENSAL,
+                                                cenario['qtd_parcelas'])
+            self.assertAlmostEqual(cenario['primeira_parcela'], float(cronograma[0].valor), delta=0.01)
+            self.assertAlmostEqual(cenario['valorTotal'], float(sum(p.valor for p in cronograma)),
+                                   delta=0.01 * len(cronograma))
+
+    def test_requisicao_repetida_vem_do_cache(self):
+        parametros = {'valorRequisitado': '500.00', 'qtd_parcelas': [3, 6]}
+        primeira = self.simular(**parametros)
+
+        with mock.patch.object(simulacao, 'simular') as simular, self.assertNumQueries(0):
+            segunda = self.simular(**parametros)
+
+        simular.assert_not_called()
+        self.assertEqual(segunda.json(), primeira.json())
+
+    def test_parametros_invalidos(self):
+        response = self.simular(valorRequisitado='1000.00', qtd_parcelas=[0, 500])
+        self.assertEqual(response.status_code, 400)
+
+
+class PagamentoParcelasTests(TestCase):
+    """Installments are paid from the loan's conta in one transaction."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='pagamento@example.com', cpf='12121212121')
+        cls.conta = Conta.objects.create(user=cls.user, agencia='0001', numero='00000091', saldo=0)
+        services.depositar(cls.conta.pk, Decimal('1000.00'))
+        cls.emprestimo = Emprestimo.objects.create(
+            valorRequisitado=Decimal('1200.00'), valorTotal=0, qtd_parcelas=12, conta=cls.conta,
+            status='Aprovado', taxa_juros=Decimal('0.01'),
+            data_pedido=timezone.now() - datetime.timedelta(days=45)
+        )
+        amortizacao.criar_parcelas([cls.emprestimo])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def pagar(self, **dados):
+        return self.client.post(f'/api/v1/emprestimos/{self.emprestimo.pk}/pagar/', dados, format='json')
+
+    def assertSaldo(self, saldo):
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo, saldo)
+
+    def test_proxima_parcela(self):
+        primeira = ParcelaEmprestimo.objects.get(emprestimo=self.emprestimo, numParcela=1)
+
+        response = self.pagar()
+
+        self.assertEqual(response.status_code, 200, response.content)
+        primeira.refresh_from_db()
+        self.assertEqual((primeira.status, primeira.valorPago, primeira.dataPaga),
+                         (ParcelaEmprestimo.PAGA, primeira.valorParcela, timezone.localdate()))
+        self.assertSaldo(Decimal('1000.00') - primeira.valorParcela)
+        self.assertTrue(Extrato.objects.filter(conta=self.conta, tipo='Pagamento Emprestimo',
+                                               valor=primeira.valorParcela).exists())
+
+    def test_parcelas_escolhidas_com_atraso(self):
+        ParcelaEmprestimo.objects.filter(emprestimo=self.emprestimo, numParcela=1).update(
+            multa=Decimal('2.00'), juros_mora=Decimal('0.50'))
+
+        response = self.pagar(parcelas=[1, 3])
+
+        self.assertEqual(response.status_code, 200, response.content)
+        pagas = {p['numParcela']: Decimal(str(p['valorPago'])) for p in response.json()['parcelas']}
+        valores = dict(ParcelaEmprestimo.objects.filter(emprestimo=self.emprestimo)
+                       .values_list('numParcela', 'valorParcela'))
+        self.assertEqual(pagas, {1: valores[1] + Decimal('2.50'), 3: valores[3]})
+        self.assertEqual(ParcelaEmprestimo.objects.filter(dataPaga__isnull=False).count(), 2)
+
+    def test_quitacao_sem_juros_futuros(self):
+        services.depositar(self.conta.pk, Decimal('1000.00'))
+
+        response = self.pagar(quitar=True)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        parcelas = ParcelaEmprestimo.objects.filter(emprestimo=self.emprestimo)
+        self.assertFalse(parcelas.filter(dataPaga__isnull=True).exists())
+        devido = sum(p.valorParcela if p.dataVencimento <= timezone.localdate() else p.amortizacao
+                     for p in parcelas)
+        self.assertEqual(Decimal(str(response.json()['valorPago'])), devido)
+        self.emprestimo.refresh_from_db()
+        self.assertEqual(self.emprestimo.status, 'Quitado')
+
+        lancamentos = Lancamento.objects.filter(tipo='Pagamento Emprestimo')
+        self.assertEqual(sum(l.valor for l in lancamentos if l.natureza == Lancamento.DEBITO),
+                         sum(l.valor for l in lancamentos if l.natureza == Lancamento.CREDITO))
+
+    def test_saldo_insuficiente(self):
+        response = self.pagar(quitar=True)
+
+        self.assertEqual(response.status_code, 403, response.content)
+        self.assertSaldo(Decimal('1000.00'))
+        self.assertFalse(ParcelaEmprestimo.objects.filter(dataPaga__isnull=False).exists())
+
+    def test_parcela_ja_paga(self):
+        self.pagar(parcelas=[2])
+        response = self.pagar(parcelas=[2])
+
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_emprestimo_alheio(self):
+        outro = User.objects.create(email='alheio@example.com', cpf='13131313131')
+        self.client.force_authenticate(outro)
+
+        self.assertEqual(self.pagar().status_code, 404)
+
+
+Orcamento = namedtuple('Orcamento', 'consultas ms')
+
+
+def _rotas(urlconf, namespace):
+    """Yield (method, route name) for every view of urlconf."""
+    for padrao in get_resolver(urlconf).url_patterns:
+        if isinstance(padrao, URLResolver):
+            padroes = padrao.url_patterns
+        else:
+            padroes = [padrao]
+        for rota in padroes:
+            acoes = getattr(rota.callback, 'actions', None)
+            if acoes is None:
+                classe = rota.callback.cls
+                acoes = [m for m in classe.http_method_names if hasattr(classe, m)]
+            for metodo in acoes:
+                if metodo not in ('head', 'options'):
+                    yield metodo.upper(), f'{namespace}:{rota.name}'
+
+
+class OrcamentoConsultasTests(TestCase):
+    """Every route of the api and user apps stays within its query budget.
+
+    Data is seeded at a volume where a query per row would show up, every
+    route is called once with a real JWT, a warm user cache and a fresh
+    revocation filter, and the number and total time of its SQL queries
+    are checked against ORCAMENTOS. Routes without a budget fail the test
+    too, so new endpoints have to declare one.
+    """
+
+    VOLUME = 120
+
+    ORCAMENTOS = {
+        ('GET', 'api:api-root'): Orcamento(0, 20),
+        ('GET', 'api:conta-list'): Orcamento(1, 20),
+        ('POST', 'api:conta-list'): Orcamento(4, 20),
+        ('GET', 'api:conta-detail'): Orcamento(1, 20),
+        ('PUT', 'api:conta-detail'): Orcamento(2, 20),
+        ('PATCH', 'api:conta-detail'): Orcamento(2, 20),
+        ('DELETE', 'api:conta-detail'): Orcamento(5, 20),
+        ('POST', 'api:conta-depositar'): Orcamento(10, 20),
+        ('POST', 'api:conta-sacar'): Orcamento(10, 20),
+        ('GET', 'api:conta-saldo-em'): Orcamento(3, 20),
+        ('GET', 'api:extrato-list'): Orcamento(2, 20),
+        ('GET', 'api:extrato-detail'): Orcamento(2, 20),
+        ('GET', 'api:extrato-exportar'): Orcamento(2, 50),
+        ('GET', 'api:transferencia-list'): Orcamento(3, 20),
+        ('POST', 'api:transferencia-list'): Orcamento(11, 20),
+        ('GET', 'api:transferencia-detail'): Orcamento(2, 20),
+        ('GET', 'api:transferencia-exportar'): Orcamento(2, 50),
+        ('POST', 'api:transferencia-batch'): Orcamento(12, 20),
+        ('GET', 'api:transferencia-pendente-detail'): Orcamento(1, 20),
+        ('GET', 'api:cartao-listar-cartoes'): Orcamento(2, 20),
+        ('GET', 'api:cartao-detail'): Orcamento(1, 20),
+        ('GET', 'api:solicitar-cartao'): Orcamento(5, 20),
+        ('GET', 'api:cartaogasto-list'): Orcamento(4, 20),
+        ('POST', 'api:cartaogasto-list'): Orcamento(11, 20),
+        ('GET', 'api:emprestimo-listar-emprestimos'): Orcamento(2, 20),
+        ('POST', 'api:emprestimo-solicitar-emprestimo'): Orcamento(15, 20),
+        ('GET', 'api:emprestimo-detail'): Orcamento(1, 20),
+        ('GET', 'api:emprestimo-simular'): Orcamento(0, 20),
+        ('POST', 'api:emprestimo-pagar'): Orcamento(12, 20),
+        ('GET', 'api_async:conta-detail'): Orcamento(1, 20),
+        ('GET', 'api_async:extrato-list'): Orcamento(2, 20),
+        ('GET', 'api_async:cartao-list'): Orcamento(2, 20),
+        ('GET', 'api_async:emprestimo-list'): Orcamento(2, 20),
+        ('POST', 'user:create'): Orcamento(3, 20),
+        ('GET', 'user:me'): Orcamento(0, 20),
+        ('POST', 'user:logout'): Orcamento(1, 20),
+        ('PUT', 'user:me'): Orcamento(4, 20),
+        ('PATCH', 'user:me'): Orcamento(2, 20),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='orcamento@example.com', password='senha123',
+                                            cpf='55555555555', first_name='Orca', last_name='Mento')
+        outro = User.objects.create(email='destino@example.com', cpf='66666666666')
+        cls.conta = Conta.objects.create(user=cls.user, agencia='0001', numero='00000067', saldo=0)
+        cls.vazia = Conta.objects.create(user=cls.user, agencia='0001', numero='00000075', saldo=0)
+        cls.destino = Conta.objects.create(user=outro, agencia='0001', numero='00000083', saldo=0)
+
+        services.depositar(cls.conta.pk, Decimal('100000.00'))
+        for _ in range(cls.VOLUME):
+            services.transferir(cls.conta.pk, cls.destino.pk, Decimal('2.00'))
+            services.transferir(cls.destino.pk, cls.conta.pk, Decimal('1.00'))
+            services.depositar(cls.conta.pk, Decimal('1.00'))
+
+        cls.cartoes = [
+            Cartao.objects.create(nome='Orca Mento', cvv='123', numero=f'650487000000002{n}',
+                                  limite=Decimal('100000.00'), tipo='Crédito', conta=cls.conta)
+            for n in range(3)
+        ]
+        for cartao in cls.cartoes:
+            for _ in range(cls.VOLUME // 3):
+                services.registrar_gasto(cartao, Decimal('1.00'), 'Padaria')
+
+        cls.emprestimos = [
+            Emprestimo.objects.create(valorRequisitado=Decimal('100.00'), valorTotal=Decimal('180.00'),
+                                      qtd_parcelas=12, conta=cls.conta, status='Aprovado')
+            for _ in range(cls.VOLUME // 4)
+        ]
+        amortizacao.criar_parcelas(cls.emprestimos)
+        cls.pendente = services.agendar_transferencia(cls.conta.pk, cls.destino.pk, Decimal('1.00'))
+
+    def setUp(self):
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def requisicoes(self):
+        """Return the url args and body used to call each route."""
+        conta = [self.conta.pk]
+        cartao = self.cartoes[0]
+        usuario = {'email': 'orcamento@example.com', 'first_name': 'Orca',
+                   'last_name': 'Mento', 'cpf': '55555555555', 'password': 'senha123'}
+        return {
+            ('POST', 'api:conta-list'): ([], {}),
+            ('GET', 'api:conta-detail'): ([self.conta.numero], None),
+            ('GET', 'api_async:conta-detail'): ([self.conta.numero], None),
+            ('PUT', 'api:conta-detail'): (conta, {}),
+            ('PATCH', 'api:conta-detail'): (conta, {}),
+            ('DELETE', 'api:conta-detail'): ([self.vazia.pk], None),
+            ('POST', 'api:conta-depositar'): (conta, {'value': '10.00'}),
+            ('POST', 'api:conta-sacar'): (conta, {'value': '10.00'}),
+            ('GET', 'api:conta-saldo-em'): (conta, {'data': str(timezone.localdate())}),
+            ('GET', 'api:extrato-detail'): ([Extrato.objects.filter(conta=self.conta).latest('id').pk], None),
+            ('POST', 'api:transferencia-list'): ([], {'to_account_id': self.destino.pk, 'value': '1.00'}),
+            ('GET', 'api:transferencia-detail'): ([Transferencia.objects.filter(from_account=self.conta).latest('id').pk], None),
+            ('POST', 'api:transferencia-batch'): ([], {'transferencias': [
+                {'to_account_id': self.destino.pk, 'value': '1.00'}] * 10}),
+            ('GET', 'api:transferencia-pendente-detail'): ([self.pendente.pk], None),
+            ('GET', 'api:cartao-detail'): ([cartao.pk], None),
+            ('POST', 'api:cartaogasto-list'): ([], {
+                'cartao': {'nome': cartao.nome, 'cvv': cartao.cvv, 'numero': cartao.numero,
+                           'data_exp': '2030-01-01'},
+                'valor': '1.00', 'nome': 'Padaria'}),
+            ('POST', 'api:emprestimo-solicitar-emprestimo'): ([], {'valorRequisitado': '100.00',
+                                                                   'qtd_parcelas': 12}),
+            ('GET', 'api:emprestimo-detail'): ([self.emprestimos[0].pk], None),
+            ('POST', 'api:emprestimo-pagar'): ([self.emprestimos[0].pk], {'quitar': True}),
+            ('GET', 'api:emprestimo-simular'): ([], {'valorRequisitado': '1000.00',
+                                                     'qtd_parcelas': list(range(1, 73)),
+                                                     'taxa_juros': ['0.0199', '0.0299', '0.0399']}),
+            ('POST', 'user:create'): ([], dict(usuario, email='novo@example.com', cpf='77777777777')),
+            ('PUT', 'user:me'): ([], usuario),
+            ('PATCH', 'user:me'): ([], {'first_name': 'Orcamento'}),
+        }
+
+    def medir(self, metodo, nome, args, dados):
+        """Call a route in a rolled back transaction and return (queries, ms, status)."""
+        url = reverse(nome, args=args)
+        chamar = getattr(self.client, metodo.lower())
+        guardar_usuario(User.objects.get(pk=self.user.pk))
+        revogacao.atualizar(forcar=True)
+        with transaction.atomic(), CaptureQueriesContext(connection) as consultas:
+            if metodo == 'GET':
+                response = chamar(url, dados)
+            else:
+                response = chamar(url, dados, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+
+        ms = sum(float(consulta['time']) for consulta in consultas.captured_queries) * 1000
+        return len(consultas), ms, response.status_code
+
+    def test_orcamentos(self):
+        rotas = sorted(set(_rotas('api.urls', 'api')) | set(_rotas('api.urls_async', 'api_async'))
+                       | set(_rotas('user.urls', 'user')))
+        requisicoes = self.requisicoes()
+
+        sem_orcamento = [f'{metodo} {nome}' for metodo, nome in rotas
+                         if (metodo, nome) not in self.ORCAMENTOS]
+        self.assertFalse(sem_orcamento, 'Routes without a budget: ' + ', '.join(sem_orcamento))
+
+        linhas = []
+        estourou = False
+        for metodo, nome in rotas:
+            args, dados = requisicoes.get((metodo, nome), ([], None))
+            consultas, ms, codigo = self.medir(metodo, nome, args, dados)
+            self.assertLess(codigo, 500, f'{metodo} {nome}')
+
+            orcamento = self.ORCAMENTOS[metodo, nome]
+            acima = consultas > orcamento.consultas or ms > orcamento.ms
+            estourou |= acima
+            linhas.append(
+                f'{"!" if acima else " "} {metodo:6} {nome:40} {codigo:>4}'
+                f' {consultas:>4}/{orcamento.consultas:<4} {ms:>8.1f}/{orcamento.ms:<6}'
+            )
+
+        if estourou:
+            cabecalho = f'  {"method":6} {"route":40} {"code":>4} {"queries":>9} {"sql ms":>15}'
+            self.fail('Query budget exceeded (marked with !):\n' + '\n'.join([cabecalho] + linhas))
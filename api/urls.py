@@ -13,6 +13,8 @@ from api import views
 router = DefaultRouter()
 router.register('accounts', views.AccountViewSet)
 router.register('transferencias', views.TransferenciaViewSet)
+router.register('transferencias/pendentes', views.TransferenciaPendenteViewSet,
+                basename='transferencia-pendente')
 router.register('cartoes', views.CartaoViewSet)
 router.register('gastos', views.CartaoGastoViewset)
 router.register('emprestimos', views.EmprestimoViewSet)
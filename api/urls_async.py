@@ -0,0 +1,15 @@
+"""
+URL mappings for the async read views of the api app.
+"""
+from django.urls import path
+
+from api import views_async
+
+app_name = 'api_async'
+
+urlpatterns = [
+    path('accounts/<str:numero>/', views_async.conta_detalhe, name='conta-detail'),
+    path('extrato/', views_async.extrato, name='extrato-list'),
+    path('cartoes/', views_async.cartoes, name='cartao-list'),
+    path('emprestimos/', views_async.emprestimos, name='emprestimo-list'),
+]
@@ -4,32 +4,43 @@ from rest_framework import (
     status,
 )
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import Case, Q, Value, When
 from django.shortcuts import get_object_or_404
-from django.db import IntegrityError, DatabaseError, InternalError, transaction
+from django.db import transaction
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 
-from rest_framework_simplejwt import authentication as authenticationJWT
-from core.models import Conta, Transferencia, Cartao, Emprestimo, CartaoGasto, Extrato
+from core.authentication import CachedJWTAuthentication
+from core.models import Conta, Transferencia, TransferenciaPendente, Cartao, Emprestimo, ParcelaEmprestimo, CartaoGasto, Extrato
+from core import amortizacao, cartoes, contas, credito, saldos, services, simulacao
 from datetime import datetime, timedelta
 from datetime import date
-from api import serializers
-import random
-from django.utils import timezone
-from django.db.models import Sum
+from api import exporters, serializers
+from api.idempotency import idempotente
+from api.mixins import ContaContextMixin, conta_selecionada
+from api.filters import PeriodoFilter
+from api.pagination import KeysetPagination, UniaoKeyset
 
 
 
 from rest_framework.decorators import action, api_view
+from rest_framework.reverse import reverse
 
-from decimal import Decimal
+import hashlib
+import json
+from functools import reduce
+import operator
 
 
 class AccountViewSet(viewsets.ModelViewSet):
     """View for manage account APIs."""
     queryset = Conta.objects.all()
-    authentication_classes = [authenticationJWT.JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     serializer_class = serializers.AccountSerializer
     permission_classes = [IsAuthenticated]
 
@@ -57,7 +68,10 @@ class AccountViewSet(viewsets.ModelViewSet):
             if lookup_field == 'pk':
                 instance = queryset.get(pk=lookup_value)
             else:
-                instance = queryset.get(numero=lookup_value)
+                instance = queryset.get(
+                    agencia=request.query_params.get('agencia', contas.AGENCIA_PADRAO),
+                    numero=lookup_value
+                )
         except Conta.DoesNotExist:
             return Response({'message': 'Conta não encontrada'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -67,19 +81,7 @@ class AccountViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            agencia = '0001'
-            numero = ''
-            for n in range(8):
-                numero += str(random.randint(0, 9))
-
-            conta = Conta(
-                user=self.request.user,
-                numero=numero,
-                agencia=agencia,
-                saldo=0
-            )
-
-            conta.save()
+            contas.abrir_conta(self.request.user)
 
             return Response({"message": "created"},
                             status=status.HTTP_201_CREATED)
@@ -88,267 +90,441 @@ class AccountViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_400_BAD_REQUEST)
 
     @action(methods=['POST'], detail=True, url_path='depositar')
+    @idempotente
     def depositar(self, request, pk=None):
-        conta = Conta.objects.filter(id=pk).first()
         serializer_recebido = serializers.DepositoSerializer(data=request.data)
 
-        if serializer_recebido.is_valid() and conta:
-
-            saldo = Decimal(serializer_recebido.validated_data.get('value'))
-            valor_deposito = Decimal(conta.saldo)
+        if serializer_recebido.is_valid():
+            try:
+                conta = self.get_queryset().get(pk=pk)
+                saldo = services.depositar(
+                    conta.pk, serializer_recebido.validated_data.get('value'))
+            except Conta.DoesNotExist:
+                return Response({'message': 'Conta não encontrada'}, status=status.HTTP_404_NOT_FOUND)
 
-            conta.saldo = saldo + valor_deposito
-            
-            extrato = Extrato.objects.create(
-                conta=conta,
-                valor=valor_deposito,
-                tipo="Deposito"
-            )
-            
-            conta.save()
-            extrato.save()
-            return Response({"saldo": conta.saldo}, status=status.HTTP_200_OK)
+            return Response({"saldo": saldo}, status=status.HTTP_200_OK)
 
         return Response(serializer_recebido.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(methods=['POST'], detail=True, url_path='sacar')
+    @idempotente
     def sacar(self, request, pk=None):
-        conta = Conta.objects.filter(id=pk).first()
         serializer_recebido = serializers.SaqueSerializer(data=request.data)
 
-        if serializer_recebido.is_valid() and conta:
-            valor_saque = serializer_recebido.validated_data.get('value', 0)
-            saldo = Decimal(conta.saldo)
-
-            if saldo >= valor_saque:
-                desconto = max(0, saldo - valor_saque)
-                conta.saldo = desconto
-
-                extrato = Extrato.objects.create(
-                conta=conta,
-                valor=valor_saque,
-                tipo="Saque"
-                )
-            
-                conta.save()
-                extrato.save()
-                return Response({"saldo": conta.saldo}, status=status.HTTP_200_OK)
+        if serializer_recebido.is_valid():
+            try:
+                conta = self.get_queryset().get(pk=pk)
+                saldo = services.sacar(
+                    conta.pk, serializer_recebido.validated_data.get('value', 0))
+            except Conta.DoesNotExist:
+                return Response({'message': 'Conta não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+            except services.SaldoInsuficiente:
+                return Response({'message': 'Saldo insuficiente'}, status=status.HTTP_403_FORBIDDEN)
 
-            return Response({'message': 'Saldo insuficiente'}, status=status.HTTP_403_FORBIDDEN)
+            return Response({"saldo": saldo}, status=status.HTTP_200_OK)
 
         return Response(serializer_recebido.errors, status=status.HTTP_400_BAD_REQUEST)
 
-
-class ExtratoViewSet(viewsets.ModelViewSet):
+    @action(methods=['GET'], detail=True, url_path='saldo-em')
+    def saldo_em(self, request, pk=None):
+        """Return the saldo of the conta at the end of ?data=AAAA-MM-DD."""
+        try:
+            data = parse_date(request.query_params.get('data', ''))
+        except ValueError:
+            data = None
+        if data is None:
+            return Response({'data': 'Data inválida, use AAAA-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        if data > timezone.localdate():
+            return Response({'data': 'Data futura.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        conta = get_object_or_404(self.get_queryset(), pk=pk)
+        return Response({'data': data, 'saldo': saldos.saldo_em(conta.pk, data)},
+                        status=status.HTTP_200_OK)
+
+
+class ExtratoViewSet(ContaContextMixin,
+                     viewsets.GenericViewSet,
+                     mixins.ListModelMixin,
+                     mixins.RetrieveModelMixin):
     queryset = Extrato.objects.all()
     serializer_class = serializers.ExtratoSerializer
-    authentication_classes = [authenticationJWT.JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [PeriodoFilter]
 
     def get_queryset(self):
         """Retrieve conta for authenticated user."""
-        conta = Conta.objects.filter(user=self.request.user).first()
-        queryset = self.queryset
+        queryset = self.queryset.filter(conta=self.conta)
 
-        return queryset.filter(
-            conta=conta
-        ).order_by('-id').distinct()
+        tipo = self.request.query_params.get('tipo')
+        if tipo:
+            queryset = queryset.filter(tipo__iexact=tipo)
+
+        return queryset.order_by('-id')
+
+    def paginate_queryset(self, queryset):
+        """Attach the selected conta, already loaded, instead of joining it on every row."""
+        pagina = super().paginate_queryset(queryset)
+        for extrato in pagina:
+            extrato.conta = self.conta
+        return pagina
+
+    def get_object(self):
+        extrato = super().get_object()
+        extrato.conta = self.conta
+        return extrato
 
+    @action(detail=False, methods=['get'], url_path='exportar')
+    def exportar(self, request):
+        """Stream the filtered extrato as ?formato=csv or ndjson."""
+        formato = exporters.formato_requisitado(request)
+        colunas = ['id', 'tipo', 'valor', 'created_at']
+        linhas = self.filter_queryset(self.get_queryset()).order_by('id').values_list(
+            *colunas).iterator(chunk_size=settings.EXPORTACAO_CHUNK_SIZE)
 
-class TransferenciaViewSet(viewsets.GenericViewSet,
+        return exporters.exportar(formato, 'extrato', colunas, linhas)
+
+
+class TransferenciaViewSet(ContaContextMixin,
+                           viewsets.GenericViewSet,
                            mixins.ListModelMixin,
                            mixins.CreateModelMixin,
                            mixins.RetrieveModelMixin):
 
-    authentication_classes = [authenticationJWT.JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = serializers.TransferenciaSerializer
     queryset = Transferencia.objects.all()
+    pagination_class = KeysetPagination
+    filter_backends = [PeriodoFilter]
 
     def get_queryset(self):
-        queryset = self.queryset
-        account = Conta.objects.filter(user=self.request.user).first()
-
-        return queryset.filter(Q(from_account=account) | Q(to_account=account)).order_by('-id').distinct()
-
+        queryset = self.queryset.select_related('from_account', 'to_account')
+        account = self.conta
+
+        ramos = {
+            'enviada': Q(from_account=account),
+            'recebida': Q(to_account=account),
+        }
+        tipo = self.request.query_params.get('tipo')
+        if tipo:
+            if tipo not in ramos:
+                raise ValidationError({'tipo': 'Use enviada ou recebida.'})
+            ramos = {tipo: ramos[tipo]}
+        self.ramos = list(ramos.values())
+
+        return queryset.filter(reduce(operator.or_, self.ramos)).order_by('-id')
+
+    def paginate_queryset(self, queryset):
+        """Page sent and received transfers as one index range scan each."""
+        return super().paginate_queryset(UniaoKeyset(queryset, *self.ramos))
+
+    @action(detail=False, methods=['get'], url_path='exportar')
+    def exportar(self, request):
+        """Stream the filtered transfers as ?formato=csv or ndjson."""
+        formato = exporters.formato_requisitado(request)
+        colunas = ['id', 'tipo', 'from_account_id', 'to_account_id', 'value', 'created_at']
+        linhas = self.filter_queryset(self.get_queryset()).annotate(tipo=Case(
+            When(from_account=self.conta, then=Value('enviada')),
+            default=Value('recebida')
+        )).order_by('id').values_list(*colunas).iterator(
+            chunk_size=settings.EXPORTACAO_CHUNK_SIZE)
+
+        return exporters.exportar(formato, 'transferencias', colunas, linhas)
+
+    @idempotente
     def create(self, request):
-        auth_user = request.user
         serializer = serializers.TransferenciaSerializer(data=request.data)
 
         if serializer.is_valid():
-            sid = transaction.savepoint()
-            from_account = Conta.objects.filter(user=auth_user).first()
-            to_account = get_object_or_404(Conta.objects.filter(
-                pk=serializer.validated_data.get('to_account_id')))
+            from_account = self.conta
+            if from_account is None:
+                return Response({'message': 'Conta não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+
+            if 'respond-async' in request.headers.get('Prefer', ''):
+                return self.agendar(from_account, serializer.validated_data)
+
             try:
-                if from_account.saldo > 0 and from_account.saldo > serializer.validated_data.get('value'):
-                    from_account.saldo -= serializer.validated_data.get(
-                        'value')
-                    to_account.saldo += serializer.validated_data.get('value')
-                else:
-                    return Response({'message': "Saldo insuficiente"}, status=status.HTTP_403_FORBIDDEN)
-
-                from_account.save()
-                to_account.save()
-
-                Transferencia.objects.create(
-                    from_account=from_account,
-                    to_account=to_account,
-                    value=serializer.validated_data.get('value')
+                services.transferir(
+                    from_account.pk,
+                    serializer.validated_data.get('to_account_id'),
+                    serializer.validated_data.get('value')
                 )
+            except Conta.DoesNotExist:
+                return Response({'message': 'Conta não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+            except services.ContaDestinoInvalida:
+                return Response({'message': 'Conta de destino inválida'}, status=status.HTTP_400_BAD_REQUEST)
+            except services.SaldoInsuficiente:
+                return Response({'message': "Saldo insuficiente"}, status=status.HTTP_403_FORBIDDEN)
 
-                transaction.savepoint_commit(sid)
-                return Response({'message': 'ok'}, status=status.HTTP_201_CREATED)
-            except IntegrityError or DatabaseError or InternalError:
-                transaction.savepoint_rollback(sid)
+            return Response({'message': 'ok'}, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def agendar(self, from_account, dados):
+        """Queue the transfer for the liquidar_transferencias workers and answer 202.
+
+        The saldo read with the conta is checked up front so an obviously
+        uncovered transfer is refused right away; the worker checks it
+        again when it settles the transfer.
+        """
+        if dados['value'] > from_account.saldo:
+            return Response({'message': "Saldo insuficiente"}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            pendente = services.agendar_transferencia(from_account.pk, dados['to_account_id'], dados['value'])
+        except Conta.DoesNotExist:
+            return Response({'message': 'Conta não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+        except services.ContaDestinoInvalida:
+            return Response({'message': 'Conta de destino inválida'}, status=status.HTTP_400_BAD_REQUEST)
+
+        url = reverse('api:transferencia-pendente-detail', args=[pendente.pk], request=self.request)
+        return Response(
+            {'message': 'Transferência agendada', 'id': pendente.pk, 'status': pendente.status, 'url': url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': url, 'Preference-Applied': 'respond-async'}
+        )
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    @idempotente
+    def batch(self, request):
+        """Settle a list of transfers from the authenticated account at once.
 
-class CartaoViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
+        Accepts up to settings.TRANSFERENCIAS_LOTE_MAXIMO items and returns
+        one result per item, in the order they were sent.
+        """
+        serializer = serializers.TransferenciaLoteSerializer(data=request.data)
+
+        if serializer.is_valid():
+            from_account = self.conta
+            if from_account is None:
+                return Response({'message': 'Conta não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+
+            resultados = services.transferir_lote(from_account.pk, [
+                (item['to_account_id'], item['value'])
+                for item in serializer.validated_data['transferencias']
+            ])
+
+            return Response({'resultados': resultados}, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TransferenciaPendenteViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
+    """Status of a transfer sent with Prefer: respond-async."""
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = serializers.TransferenciaPendenteSerializer
+    queryset = TransferenciaPendente.objects.all()
+
+    def get_queryset(self):
+        """Retrieve the pending transfers sent by the authenticated user."""
+        return self.queryset.filter(from_account__user=self.request.user)
+
+
+class CartaoViewSet(ContaContextMixin, viewsets.GenericViewSet, mixins.RetrieveModelMixin):
     queryset = Cartao.objects.all()
     serializer_class = serializers.CartaoSerializer
-    authentication_classes = [authenticationJWT.JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        """Retrieve the cartões of the authenticated user."""
+        return self.queryset.filter(conta__user=self.request.user).select_related('conta')
+
     @action(detail=False, methods=['get'], url_path='listar-cartoes')
     def listar_cartoes(self, request):
         """Lista os cartões de uma conta específica"""
-        conta = Conta.objects.filter(user=request.user).first()
-        cartoes = Cartao.objects.filter(conta=conta)
+        cartoes = Cartao.objects.filter(conta=self.conta).select_related('conta')
         serializer = self.get_serializer(cartoes, many=True)
         return Response(serializer.data)
 
     @api_view(http_method_names=['GET'],)
     def solicitar_cartao(request):
         """Solicita a criação de um novo cartão"""
-        conta = Conta.objects.filter(user=request.user).first()
+        conta = conta_selecionada(request)
         nome = f"{request.user.first_name} {request.user.last_name}"
-        numero = CartaoViewSet.gerar_numero_cartao()
-        cvv = CartaoViewSet.gerar_cvv_cartao()
         limite = float(conta.saldo) + 250 * 1.25
         data_expiracao = (date.today() + timedelta(days=365 * 5))
 
-        novo_cartao = Cartao.objects.create(
+        novo_cartao = cartoes.emitir_cartao(
             nome=nome,
-            numero=numero,
-            cvv=cvv,
             limite=limite,
             data_exp=data_expiracao,
             tipo='Crédito',
             conta=conta
         )
 
-        novo_cartao.save()
         serializer = serializers.CartaoSerializer(novo_cartao)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    @staticmethod
-    def gerar_numero_cartao():
-        numeros_existentes = set(
-            Cartao.objects.values_list('numero', flat=True))
-        while True:
-            numero = ''.join(str(random.randint(0, 9)) for _ in range(16))
-            if numero not in numeros_existentes:
-                break
-        return numero
-
-    @staticmethod
-    def gerar_cvv_cartao():
-        cvvs_existentes = set(Cartao.objects.values_list('cvv', flat=True))
-        while True:
-            cvv = ''.join(str(random.randint(0, 9)) for _ in range(3))
-            if cvv not in cvvs_existentes:
-                break
-        return cvv
-
-
-class CartaoGastoViewset(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin):
+
+class CartaoGastoViewset(ContaContextMixin,
+                         viewsets.GenericViewSet,
+                         mixins.ListModelMixin,
+                         mixins.CreateModelMixin):
     queryset = CartaoGasto.objects.all()
     serializer_class = serializers.CartaoGastoSerializer
-    authentication_classes = [authenticationJWT.JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [PeriodoFilter]
 
     def get_queryset(self):
-        """Retrieve conta for authenticated user."""
-        conta = Conta.objects.filter(user=self.request.user).first()
-        cartao = Cartao.objects.filter(conta=conta).first()
-        queryset = self.queryset
-
-        return queryset.filter(
-            cartao=cartao
-        ).order_by('-id').distinct()
-
+        """Retrieve the gastos of every cartão of the selected conta."""
+        queryset = self.queryset.select_related('cartao')
+        self.ramos = [
+            Q(cartao_id=cartao_id)
+            for cartao_id in Cartao.objects.filter(conta=self.conta).values_list('pk', flat=True)
+        ]
+        if not self.ramos:
+            return queryset.none()
+
+        return queryset.filter(reduce(operator.or_, self.ramos)).order_by('-id')
+
+    def paginate_queryset(self, queryset):
+        """Page the gastos of each cartão as its own index range scan."""
+        if self.ramos:
+            queryset = UniaoKeyset(queryset, *self.ramos)
+        return super().paginate_queryset(queryset)
+
+    @idempotente
     def create(self, request):
         """Função para criar um gasto no cartão"""
         serializer = serializers.CartaoGastoSerializer(data=request.data)
 
         if serializer.is_valid():
-            conta = Conta.objects.filter(user=request.user).first()
             cartao = serializer.validated_data.get("cartao")
-            cartao_selecionado = get_object_or_404(Cartao.objects.filter(conta=conta).filter(
+            cartao_selecionado = get_object_or_404(Cartao.objects.filter(conta=self.conta).filter(
                 numero=cartao["numero"]).filter(cvv=cartao["cvv"]).filter(nome=cartao["nome"]))
             
-            mes_atual = timezone.now().month
-
-            soma_valores = CartaoGasto.objects.filter(
-                cartao=cartao_selecionado,
-                created_at__month=mes_atual
-            ).aggregate(Sum('valor'))
-
-            soma_total = soma_valores['valor__sum'] or 0
-            if (serializer.validated_data.get("valor") > cartao_selecionado.limite or soma_total > cartao_selecionado.limite):
+            try:
+                services.registrar_gasto(
+                    cartao_selecionado,
+                    serializer.validated_data.get("valor"),
+                    serializer.validated_data.get("nome")
+                )
+            except services.LimiteInsuficiente:
                 return Response({"message": "Limite insuficiente"}, status=status.HTTP_401_UNAUTHORIZED)
 
-            gasto = CartaoGasto.objects.create(
-                cartao=cartao_selecionado,
-                valor=serializer.validated_data.get("valor"),
-                nome=serializer.validated_data.get("nome")
-            )
-            gasto.save()
-
             return Response({"message": "Gasto salvo"}, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class EmprestimoViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
+class EmprestimoViewSet(ContaContextMixin, viewsets.GenericViewSet, mixins.RetrieveModelMixin):
     queryset = Emprestimo.objects.all()
     serializer_class = serializers.EmprestimoSerializer
-    authentication_classes = [authenticationJWT.JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        """Retrieve the empréstimos of the authenticated user."""
+        return self.queryset.filter(conta__user=self.request.user)
+
     @action(detail=False, methods=['get'], url_path='listar-emprestimos')
     def listar_emprestimos(self, request):
         """Lista os emprestimos de uma conta específica"""
-        conta = Conta.objects.filter(user=request.user).first()
-        emprestimos = Emprestimo.objects.filter(conta=conta)
+        emprestimos = Emprestimo.objects.filter(conta=self.conta)
         serializer = self.get_serializer(emprestimos, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['post'], url_path='pagar')
+    @idempotente
+    def pagar(self, request, pk=None):
+        """Pay one, several or every open installment of the empréstimo."""
+        serializer = serializers.PagamentoParcelasSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            emprestimo = self.get_queryset().get(pk=pk)
+            pagas = services.pagar_parcelas(
+                emprestimo,
+                numeros=serializer.validated_data.get('parcelas'),
+                quantidade=serializer.validated_data.get('quantidade'),
+                quitar=serializer.validated_data['quitar']
+            )
+        except Emprestimo.DoesNotExist:
+            return Response({'message': 'Empréstimo não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        except services.ParcelasInvalidas as erro:
+            return Response({'message': str(erro)}, status=status.HTTP_400_BAD_REQUEST)
+        except services.SaldoInsuficiente:
+            return Response({'message': 'Saldo insuficiente'}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response({
+            'parcelas': [
+                {'numParcela': parcela.numParcela, 'valorPago': parcela.valorPago,
+                 'dataPaga': parcela.dataPaga}
+                for parcela in pagas
+            ],
+            'valorPago': sum(parcela.valorPago for parcela in pagas),
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='simular')
+    def simular(self, request):
+        """Simulate every combination of ?qtd_parcelas= and ?taxa_juros= for ?valorRequisitado=.
+
+        Parameters may repeat. The answer only depends on them, so identical
+        requests are served from the cache without touching the database.
+        """
+        serializer = serializers.SimulacaoEmprestimoSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        termos = dict(serializer.validated_data)
+        termos.setdefault('taxa_juros', [settings.EMPRESTIMO_TAXA_MENSAL])
+        chave = 'simulacao:' + hashlib.sha256(
+            json.dumps(termos, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        resposta = cache.get(chave)
+        if resposta is None:
+            resposta = dict(termos, simulacoes=simulacao.simular(
+                termos['valorRequisitado'],
+                termos['qtd_parcelas'],
+                termos['taxa_juros'],
+                termos['sistema_amortizacao']
+            ))
+            cache.set(chave, resposta, settings.SIMULACAO_CACHE_TTL.total_seconds())
+
+        return Response(resposta, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['post'], url_path='solicitar-emprestimo')
     def solicitar_emprestimo(self, request):
         """Solicita um novo empréstimo"""
         serializer = serializers.EmprestimoSerializer(data=request.data)
 
         if serializer.is_valid():
-            conta = Conta.objects.filter(user=request.user).first()
+            conta = self.conta
 
             if conta:
-                # Se o saldo em conta vezes 3.2 for maior ou igual ao empréstimo desejado, aprovado
-                condicao = float(
-                    conta.saldo) * 3.2 >= serializer.validated_data['valorRequisitado']
+                decisao = credito.decidir(
+                    conta,
+                    serializer.validated_data['valorRequisitado'],
+                    serializer.validated_data['qtd_parcelas']
+                )
+                condicao = decisao.aprovado
 
-                emprestimo = Emprestimo.objects.create(
+                emprestimo = Emprestimo(
                     valorRequisitado=serializer.validated_data['valorRequisitado'],
-                    valorTotal=Decimal(
-                        float(serializer.validated_data['valorRequisitado']) * 1.8),
                     qtd_parcelas=serializer.validated_data['qtd_parcelas'],
+                    sistema_amortizacao=serializer.validated_data.get(
+                        'sistema_amortizacao', Emprestimo.PRICE),
                     conta=conta,
-                    status="Aprovado" if condicao else "Não Aprovado - O valor solicitado é muito para sua conta"
+                    pontuacao_credito=decisao.pontos,
+                    status="Aprovado" if condicao else f"Não Aprovado - {decisao.motivo}"
                 )
+                parcelas = amortizacao.parcelas_do_emprestimo(emprestimo)
+                emprestimo.valorTotal = sum(parcela.valorParcela for parcela in parcelas)
+
+                with transaction.atomic():
+                    emprestimo.save()
 
-                emprestimo.save()
+                    if condicao:
+                        ParcelaEmprestimo.objects.bulk_create(parcelas)
+                        services.desembolsar_emprestimo(emprestimo)
 
                 # Crie um novo serializer para o objeto do empréstimo
                 emprestimo_serializer = serializers.EmprestimoSerializer(
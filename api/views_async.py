@@ -0,0 +1,142 @@
+"""
+Async read views for the hot listings, served natively under ASGI.
+
+DRF views are sync, so under an ASGI server every request is handed to a
+thread. These views answer the same reads with the async ORM instead and
+authenticate with AsyncCachedJWTAuthentication; under WSGI they still work,
+each request running its own event loop.
+"""
+import functools
+
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+
+from api import serializers
+from api.filters import PeriodoFilter
+from api.mixins import HEADER, PARAMETRO
+from api.pagination import KeysetPagination
+from core import contas
+from core.authentication import AsyncCachedJWTAuthentication
+from core.models import Cartao, Conta, Emprestimo, Extrato
+
+
+def _erro(erro):
+    detalhe = erro.detail if isinstance(erro.detail, (dict, list)) else {'detail': erro.detail}
+    return JsonResponse(detalhe, status=erro.status_code, safe=False)
+
+
+def autenticado(view):
+    """Serve view for GET requests of an authenticated user.
+
+    DRF exceptions raised by the view are answered as DRF would.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return JsonResponse({'detail': f'Método "{request.method}" não permitido.'},
+                                status=status.HTTP_405_METHOD_NOT_ALLOWED)
+        try:
+            autenticacao = await AsyncCachedJWTAuthentication().aauthenticate(request)
+            if autenticacao is None:
+                raise NotAuthenticated
+            request.user, request.auth = autenticacao
+            return await view(request, *args, **kwargs)
+        except APIException as erro:
+            return _erro(erro)
+
+    # Listed by method like the routes of a viewset.
+    wrapper.actions = {'get': view.__name__}
+    return wrapper
+
+
+async def conta_selecionada(request):
+    """Async version of api.mixins.conta_selecionada."""
+    escolhida = request.headers.get(HEADER) or request.GET.get(PARAMETRO)
+    async for conta in Conta.objects.filter(user=request.user).order_by('id'):
+        if not escolhida or str(conta.pk) == escolhida:
+            return conta
+    if escolhida:
+        raise NotFound({'message': 'Conta não encontrada'})
+    return None
+
+
+async def paginar(request, queryset, serializer_class, **relacionados):
+    """Return a keyset page of queryset, newest first, like KeysetPagination.
+
+    Only forward cursors are accepted: the page links to the next one.
+    relacionados are set on every row, for objects every row shares.
+    """
+    paginador = KeysetPagination()
+    requisicao = Request(request)
+    tamanho = paginador.get_page_size(requisicao)
+
+    cursor = paginador.decode_cursor(requisicao)
+    if cursor is not None:
+        if cursor.reverse or cursor.offset or cursor.position is None:
+            raise NotFound(paginador.invalid_cursor_message)
+        queryset = queryset.filter(id__lt=cursor.position)
+
+    linhas = [linha async for linha in queryset.order_by('-id')[:tamanho + 1]]
+    for linha in linhas:
+        for campo, valor in relacionados.items():
+            setattr(linha, campo, valor)
+    proxima = None
+    if len(linhas) > tamanho:
+        paginador.base_url = request.build_absolute_uri()
+        proxima = paginador.encode_cursor(Cursor(offset=0, reverse=False, position=linhas[tamanho - 1].pk))
+
+    return {
+        'next': proxima,
+        'previous': None,
+        'results': serializer_class(linhas[:tamanho], many=True).data,
+    }
+
+
+@autenticado
+async def conta_detalhe(request, numero):
+    """Async version of GET /api/v1/accounts/<numero>/."""
+    try:
+        conta = await Conta.objects.aget(
+            user=request.user,
+            agencia=request.GET.get('agencia', contas.AGENCIA_PADRAO),
+            numero=numero
+        )
+    except Conta.DoesNotExist:
+        return JsonResponse({'message': 'Conta não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+
+    return JsonResponse(serializers.AccountDetailSerializer(conta).data)
+
+
+@autenticado
+async def extrato(request):
+    """Async version of GET /api/v1/extrato/."""
+    conta = await conta_selecionada(request)
+    queryset = Extrato.objects.filter(conta=conta)
+
+    tipo = request.GET.get('tipo')
+    if tipo:
+        queryset = queryset.filter(tipo__iexact=tipo)
+    queryset = PeriodoFilter().filter_queryset(Request(request), queryset, None)
+
+    return JsonResponse(await paginar(request, queryset, serializers.ExtratoSerializer, conta=conta))
+
+
+@autenticado
+async def cartoes(request):
+    """Async version of GET /api/v1/cartoes/listar-cartoes/."""
+    conta = await conta_selecionada(request)
+    cartoes = [cartao async for cartao in Cartao.objects.filter(conta=conta).select_related('conta')]
+
+    return JsonResponse(serializers.CartaoSerializer(cartoes, many=True).data, safe=False)
+
+
+@autenticado
+async def emprestimos(request):
+    """Async version of GET /api/v1/emprestimos/listar-emprestimos/."""
+    conta = await conta_selecionada(request)
+    emprestimos = [emprestimo async for emprestimo in Emprestimo.objects.filter(conta=conta)]
+
+    return JsonResponse(serializers.EmprestimoSerializer(emprestimos, many=True).data, safe=False)
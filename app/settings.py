@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 import datetime
+from decimal import Decimal
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -99,6 +100,17 @@ DATABASES = {
     }
 }
 
+# Process-local by default. Production should point every worker at a
+# shared backend, e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and CACHE_LOCATION=redis://redis:6379/0 (needs the redis package), or
+# the login lockout and the other cache users are counted per process.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND') or 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -160,7 +172,7 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -170,8 +182,101 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=30),
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'user.serializers.RevogavelTokenRefreshSerializer',
 }
 
+# Default and maximum ?page_size= of the keyset-paginated history listings.
+PAGINACAO_TAMANHO = 50
+PAGINACAO_TAMANHO_MAXIMO = 500
+
+# Rows fetched per round trip by the server-side cursor of statement exports.
+EXPORTACAO_CHUNK_SIZE = 2000
+
+# Maximum number of items accepted by POST /api/v1/transferencias/batch/.
+# Every conta of a batch stays locked until the whole batch is written, so
+# larger payrolls should be split into several requests.
+TRANSFERENCIAS_LOTE_MAXIMO = 1000
+
+# Pending transfers (sent with Prefer: respond-async) claimed per
+# transaction by each liquidar_transferencias worker.
+TRANSFERENCIAS_PENDENTES_LOTE = 500
+
+# How long a response stored for an Idempotency-Key can be replayed.
+IDEMPOTENCY_KEY_TTL = datetime.timedelta(hours=24)
+
+# Card numbers are CARTAO_BIN + 9 digits + Luhn digit (see core.cartoes).
+# CARTAO_NUMERO_CHAVE keys the permutation of the allocation sequence and
+# must never change once cards have been issued.
+CARTAO_BIN = os.environ.get('CARTAO_BIN') or '650487'
+CARTAO_NUMERO_CHAVE = os.environ.get('CARTAO_NUMERO_CHAVE') or SECRET_KEY
+
+# Failed logins on /api/token/ allowed per email within LOGIN_JANELA before
+# the email is locked out for LOGIN_BLOQUEIO (see core.bloqueio). Locks live
+# in the cache; LOGIN_BLOQUEIO_PERSISTIR also records them on the User row
+# from a background thread.
+LOGIN_TENTATIVAS_MAXIMAS = 3
+LOGIN_JANELA = datetime.timedelta(minutes=15)
+LOGIN_BLOQUEIO = datetime.timedelta(minutes=15)
+LOGIN_BLOQUEIO_PERSISTIR = os.environ.get('LOGIN_BLOQUEIO_PERSISTIR', '') == '1'
+
+# Authenticated users are kept in the shared cache for USUARIO_CACHE_TTL and
+# in a per-process LRU of USUARIO_CACHE_LOCAL_TAMANHO entries for
+# USUARIO_CACHE_LOCAL_TTL (see core.authentication). Saving a User evicts
+# it; other processes see the change once their local copy expires.
+USUARIO_CACHE_TTL = datetime.timedelta(minutes=5)
+USUARIO_CACHE_LOCAL_TTL = datetime.timedelta(seconds=5)
+USUARIO_CACHE_LOCAL_TAMANHO = 10000
+
+# Revoked tokens (see core.revogacao). Each worker checks them against a
+# Bloom filter sized for REVOGACAO_BLOOM_CAPACIDADE jtis at a false positive
+# rate of REVOGACAO_BLOOM_ERRO, reads new revocations every
+# REVOGACAO_ATUALIZACAO and rebuilds it every REVOGACAO_RECONSTRUCAO.
+REVOGACAO_BLOOM_CAPACIDADE = 100000
+REVOGACAO_BLOOM_ERRO = 0.001
+REVOGACAO_ATUALIZACAO = datetime.timedelta(seconds=5)
+REVOGACAO_RECONSTRUCAO = datetime.timedelta(hours=1)
+
+# New users are approved by the aprovar_usuarios command once they are this
+# old.
+APROVACAO_USUARIO_ESPERA = datetime.timedelta(minutes=3)
+
+# Monthly interest rate of new loans and the most installments a loan may
+# be split into (see core.amortizacao).
+EMPRESTIMO_TAXA_MENSAL = Decimal('0.0399')
+EMPRESTIMO_PARCELAS_MAXIMO = 72
+
+# Overdue installments (see core.inadimplencia) pay a one-off late fee of
+# EMPRESTIMO_MULTA_ATRASO plus EMPRESTIMO_JUROS_MORA_DIA per day late, both
+# over the amount still unpaid.
+EMPRESTIMO_MULTA_ATRASO = Decimal('0.02')
+EMPRESTIMO_JUROS_MORA_DIA = Decimal('0.00033')
+
+# Loan simulations (see core.simulacao) accept up to SIMULACAO_TAXAS_MAXIMO
+# rates per request and identical requests are answered from the cache for
+# SIMULACAO_CACHE_TTL.
+SIMULACAO_TAXAS_MAXIMO = 20
+SIMULACAO_CACHE_TTL = datetime.timedelta(minutes=10)
+
+# Credit decisions (see core.credito): the rules run on each loan request,
+# in order, and the points needed for approval. CapacidadeDeSaldo refuses
+# loans above CREDITO_MULTIPLICADOR_SALDO times the saldo.
+CREDITO_REGRAS = [
+    'core.credito.CapacidadeDeSaldo',
+    'core.credito.FluxoDeCaixa',
+    'core.credito.UtilizacaoDeCartao',
+]
+CREDITO_PONTUACAO_MINIMA = -20
+CREDITO_MULTIPLICADOR_SALDO = Decimal('3.2')
+
+# Outbox of money movement events (see core.outbox). publicar_eventos hands
+# them to EVENTOS_DESTINO, a class path; core.outbox.DestinoArquivo appends
+# them to EVENTOS_ARQUIVO. Events younger than EVENTOS_ESPERA wait for the
+# next batch, so transactions still committing are never skipped.
+EVENTOS_DESTINO = os.environ.get('EVENTOS_DESTINO') or 'core.outbox.DestinoArquivo'
+EVENTOS_ARQUIVO = os.environ.get('EVENTOS_ARQUIVO') or 'vol/web/eventos.ndjson'
+EVENTOS_ESPERA = datetime.timedelta(seconds=5)
+EVENTOS_LOTE = 1000
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True
 }
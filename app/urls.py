@@ -15,6 +15,7 @@ from django.conf import settings
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
+    path('api/v1/async/', include('api.urls_async')),
     path('api/v1/', include('api.urls')),
 
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -0,0 +1,137 @@
+"""
+Loan amortization schedules.
+
+Price schedules have constant installments; SAC schedules amortize the
+same principal every month, so installments fall as the interest does.
+Amounts are Decimals rounded to cents per installment, and the last
+installment amortizes whatever principal is left, so the amortizations
+always add up to the loan exactly. Installments of a Price schedule may
+differ by a cent or two from month to month because of that rounding.
+"""
+import calendar
+import datetime
+import io
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import connection, transaction
+
+from core.models import Emprestimo, ParcelaEmprestimo
+
+
+CENTAVO = Decimal('0.01')
+
+Parcela = namedtuple('Parcela', 'numero vencimento valor amortizacao juros saldo')
+
+
+def _centavos(valor):
+    return valor.quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def somar_meses(data, meses):
+    """Return data moved by meses months, clamped to the end of the month."""
+    ano, mes = divmod(data.month - 1 + meses, 12)
+    ano += data.year
+    mes += 1
+    return datetime.date(ano, mes, min(data.day, calendar.monthrange(ano, mes)[1]))
+
+
+def prestacao_price(principal, taxa, parcelas):
+    """Return the constant installment of a Price schedule, in cents."""
+    if not taxa:
+        return _centavos(principal / parcelas)
+    return _centavos(principal * taxa / (1 - (1 + taxa) ** -parcelas))
+
+
+def cronograma(principal, taxa, parcelas, sistema=Emprestimo.PRICE, inicio=None):
+    """Return the Parcela of each month of a loan.
+
+    principal is lent at the monthly rate taxa and repaid in parcelas
+    installments, the first one a month after inicio. Every month the
+    installment (Price) or the amortization (SAC) is recomputed from the
+    remaining saldo, so rounding never piles up on the last installment.
+    """
+    principal = Decimal(principal)
+    taxa = Decimal(taxa)
+    inicio = inicio or datetime.date.today()
+    if sistema not in (Emprestimo.PRICE, Emprestimo.SAC):
+        raise ValueError(f'Sistema de amortização desconhecido: {sistema}')
+
+    saldo = principal
+    resultado = []
+    for numero in range(1, parcelas + 1):
+        restantes = parcelas - numero + 1
+        juros = _centavos(saldo * taxa)
+        if numero == parcelas:
+            amortizacao = saldo
+        elif sistema == Emprestimo.PRICE:
+            amortizacao = min(prestacao_price(saldo, taxa, restantes) - juros, saldo)
+        else:
+            amortizacao = min(_centavos(saldo / restantes), saldo)
+
+        saldo -= amortizacao
+        resultado.append(Parcela(
+            numero=numero,
+            vencimento=somar_meses(inicio, numero),
+            valor=amortizacao + juros,
+            amortizacao=amortizacao,
+            juros=juros,
+            saldo=saldo
+        ))
+
+    return resultado
+
+
+def cronograma_do_emprestimo(emprestimo):
+    """Return the schedule of an Emprestimo from its own terms."""
+    return cronograma(
+        emprestimo.valorRequisitado,
+        emprestimo.taxa_juros,
+        emprestimo.qtd_parcelas,
+        emprestimo.sistema_amortizacao,
+        emprestimo.data_pedido.date()
+    )
+
+
+def parcelas_do_emprestimo(emprestimo):
+    """Build the unsaved ParcelaEmprestimo rows of an Emprestimo."""
+    return [
+        ParcelaEmprestimo(
+            emprestimo=emprestimo,
+            numParcela=parcela.numero,
+            dataVencimento=parcela.vencimento,
+            valorParcela=parcela.valor,
+            amortizacao=parcela.amortizacao,
+            juros=parcela.juros,
+            valorPago=0
+        )
+        for parcela in cronograma_do_emprestimo(emprestimo)
+    ]
+
+
+def criar_parcelas(emprestimos):
+    """Save the installments of every emprestimo with a single COPY.
+
+    Building INSERT statements through the ORM costs more than the insert
+    itself for batches of this size, so rows are streamed to Postgres as
+    text. Returns how many installments were created.
+    """
+    colunas = ['emprestimo_id', 'numParcela', 'dataVencimento', 'valorParcela',
+               'amortizacao', 'juros', 'valorPago', 'status', 'dias_atraso', 'multa',
+               'juros_mora']
+    # COPY does not apply the model defaults, so every column is written.
+    padroes = f'0\t{ParcelaEmprestimo.EM_ABERTO}\t0\t0\t0'
+    buffer = io.StringIO()
+    criadas = 0
+    for emprestimo in emprestimos:
+        for parcela in cronograma_do_emprestimo(emprestimo):
+            buffer.write(f'{emprestimo.pk}\t{parcela.numero}\t{parcela.vencimento}\t'
+                         f'{parcela.valor}\t{parcela.amortizacao}\t{parcela.juros}\t{padroes}\n')
+            criadas += 1
+    buffer.seek(0)
+
+    tabela = connection.ops.quote_name(ParcelaEmprestimo._meta.db_table)
+    colunas = ', '.join(connection.ops.quote_name(coluna) for coluna in colunas)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {tabela} ({colunas}) FROM STDIN', buffer)
+    return criadas
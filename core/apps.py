@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core.authentication import invalidar_usuario
+        from core.models import User
+
+        post_save.connect(invalidar_usuario, sender=User,
+                          dispatch_uid='core.authentication.invalidar_usuario.save')
+        post_delete.connect(invalidar_usuario, sender=User,
+                            dispatch_uid='core.authentication.invalidar_usuario.delete')
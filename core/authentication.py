@@ -0,0 +1,231 @@
+"""
+JWT authentication with cached users.
+
+simplejwt loads the User row on every authenticated request. Here users are
+looked up first in a small per-process LRU with a short TTL, then in the
+shared cache, and only then in the database. Saving or deleting a User
+evicts it from both levels; other processes may keep serving their local
+copy for up to USUARIO_CACHE_LOCAL_TTL.
+
+AsyncCachedJWTAuthentication does the same for the async views, without
+leaving the event loop unless the user has to be read from the database.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core import revogacao
+
+
+class _LRU:
+    """Thread-safe LRU of (expiry, value) entries."""
+
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.entradas = OrderedDict()
+
+    def get(self, chave):
+        with self.trava:
+            entrada = self.entradas.get(chave)
+            if entrada is None:
+                return None
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self.entradas[chave]
+                return None
+            self.entradas.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl, tamanho):
+        with self.trava:
+            self.entradas[chave] = (time.monotonic() + ttl, valor)
+            self.entradas.move_to_end(chave)
+            while len(self.entradas) > tamanho:
+                self.entradas.popitem(last=False)
+
+    def delete(self, chave):
+        with self.trava:
+            self.entradas.pop(chave, None)
+
+    def clear(self):
+        with self.trava:
+            self.entradas.clear()
+
+
+_locais = _LRU()
+
+
+def _chave(user_id):
+    return f'usuario:{user_id}'
+
+
+def obter_usuario(user_id):
+    """Return a copy of the cached User with user_id, or None."""
+    chave = _chave(user_id)
+    user = _locais.get(chave)
+    if user is None:
+        user = cache.get(chave)
+        if user is None:
+            return None
+        _guardar_local(chave, user)
+
+    # Views may change the instance they get; never hand out the cached one.
+    return copy.copy(user)
+
+
+async def aobter_usuario(user_id):
+    """Async version of obter_usuario."""
+    chave = _chave(user_id)
+    user = _locais.get(chave)
+    if user is None:
+        user = await cache.aget(chave)
+        if user is None:
+            return None
+        _guardar_local(chave, user)
+
+    return copy.copy(user)
+
+
+def guardar_usuario(user):
+    """Cache user at both levels."""
+    chave = _chave(user.pk)
+    cache.set(chave, user, timeout=settings.USUARIO_CACHE_TTL.total_seconds())
+    _guardar_local(chave, user)
+
+
+async def aguardar_usuario(user):
+    """Async version of guardar_usuario."""
+    chave = _chave(user.pk)
+    await cache.aset(chave, user, timeout=settings.USUARIO_CACHE_TTL.total_seconds())
+    _guardar_local(chave, user)
+
+
+def _guardar_local(chave, user):
+    _locais.set(chave, copy.copy(user),
+                settings.USUARIO_CACHE_LOCAL_TTL.total_seconds(),
+                settings.USUARIO_CACHE_LOCAL_TAMANHO)
+
+
+def invalidar_usuarios(ids):
+    """Evict users from both cache levels, now and again on commit.
+
+    The second eviction drops a copy another request may have cached from
+    the old row while the change was still uncommitted.
+    """
+    chaves = [_chave(user_id) for user_id in ids]
+
+    def invalidar():
+        for chave in chaves:
+            _locais.delete(chave)
+        cache.delete_many(chaves)
+
+    invalidar()
+    transaction.on_commit(invalidar)
+
+
+def invalidar_usuario(sender, instance, **kwargs):
+    """Signal receiver evicting a saved or deleted User."""
+    invalidar_usuarios([instance.pk])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that resolves the user through the user cache.
+
+    Tokens revoked through core.revogacao are rejected.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti is not None and revogacao.revogado(jti):
+            raise InvalidToken(_('Token has been revoked'))
+
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = obter_usuario(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            guardar_usuario(user)
+            return user
+
+        self.conferir_senha(validated_token, user)
+        return user
+
+    def conferir_senha(self, validated_token, user):
+        """Reject tokens issued before the user's password changed."""
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code='password_changed'
+                )
+
+
+class AsyncCachedJWTAuthentication(CachedJWTAuthentication):
+    """CachedJWTAuthentication for async views.
+
+    aauthenticate takes a Django HttpRequest and returns (user, token) or
+    None like authenticate. Decoding the token and checking it against the
+    revocation filter stay on the event loop; the user comes from the
+    local LRU, the shared cache or, on a miss, the async ORM.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = await self.aget_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_validated_token(self, raw_token):
+        validated_token = JWTAuthentication.get_validated_token(self, raw_token)
+
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti is not None and await revogacao.arevogado(jti):
+            raise InvalidToken(_('Token has been revoked'))
+
+        return validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = await aobter_usuario(user_id)
+        if user is None:
+            User = get_user_model()
+            try:
+                user = await User.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            if not user.is_active:
+                raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+            await aguardar_usuario(user)
+
+        self.conferir_senha(validated_token, user)
+        return user
@@ -0,0 +1,69 @@
+"""
+Helpers shared by the bench_* management commands.
+"""
+import contextlib
+import threading
+import time
+
+from django.db import connection, connections
+
+
+@contextlib.contextmanager
+def banco_descartavel(verbosity=0):
+    """Run the block against a throwaway test database.
+
+    The database is created with every migration applied, like the one used
+    by ``manage.py test``, and dropped on exit so benchmarks never write to
+    the configured database.
+    """
+    nome_original = connection.settings_dict['NAME']
+    nome_teste = connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    try:
+        yield nome_teste
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(nome_original, verbosity=verbosity)
+
+
+def executar_concorrente(trabalhadores, alvo):
+    """Call alvo(indice) from trabalhadores threads started at the same time.
+
+    Every thread uses its own database connection. Return the elapsed wall
+    time in seconds and the list of exceptions raised by the threads.
+    """
+    barreira = threading.Barrier(trabalhadores + 1)
+    erros = []
+
+    def rodar(indice):
+        try:
+            barreira.wait()
+            alvo(indice)
+        except Exception as erro:
+            erros.append(erro)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=rodar, args=(indice,))
+        for indice in range(trabalhadores)
+    ]
+    for thread in threads:
+        thread.start()
+
+    barreira.wait()
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.join()
+
+    return time.perf_counter() - inicio, erros
+
+
+def percentil(amostras, p):
+    """Return the p-th percentile (0-100) of a list of numbers."""
+    if not amostras:
+        return 0.0
+    ordenadas = sorted(amostras)
+    indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+    return ordenadas[indice]
@@ -0,0 +1,99 @@
+"""
+Login lockout tracked in the cache.
+
+Failed logins are counted per email in a sliding window approximated by
+two fixed windows: the count of the current window plus the count of the
+previous one weighted by how much of it still overlaps the sliding window.
+Every step is a cache operation, so a wave of bad passwords never writes
+to the user table. Locks can optionally be copied to the User row by a
+background thread.
+"""
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from core.authentication import invalidar_usuarios
+from core.models import User
+
+
+_persistencia = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bloqueio-login')
+
+
+def _chave(tipo, email, *sufixo):
+    digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+    return ':'.join(['login', tipo, digest, *map(str, sufixo)])
+
+
+def bloqueado(email):
+    """Return whether logins for email are locked."""
+    return cache.get(_chave('bloqueio', email)) is not None
+
+
+def registrar_falha(email):
+    """Count a failed login and lock the email if it failed too often.
+
+    Returns True when this failure locked the email.
+    """
+    janela_segundos = settings.LOGIN_JANELA.total_seconds()
+    janela, decorrido = divmod(time.time(), janela_segundos)
+    janela = int(janela)
+
+    chave = _chave('falhas', email, janela)
+    cache.add(chave, 0, timeout=2 * janela_segundos)
+    try:
+        atuais = cache.incr(chave)
+    except ValueError:
+        # The counter expired between add() and incr().
+        cache.set(chave, 1, timeout=2 * janela_segundos)
+        atuais = 1
+    anteriores = cache.get(_chave('falhas', email, janela - 1), 0)
+
+    falhas = atuais + anteriores * (1 - decorrido / janela_segundos)
+    if falhas < settings.LOGIN_TENTATIVAS_MAXIMAS:
+        return False
+
+    bloquear(email, falhas=atuais + anteriores)
+    return True
+
+
+def bloquear(email, falhas=0):
+    """Lock logins for email for settings.LOGIN_BLOQUEIO."""
+    locked_at = timezone.now()
+    unlocked_at = locked_at + settings.LOGIN_BLOQUEIO
+    cache.set(_chave('bloqueio', email), unlocked_at.timestamp(),
+              timeout=settings.LOGIN_BLOQUEIO.total_seconds())
+
+    if settings.LOGIN_BLOQUEIO_PERSISTIR:
+        _persistencia.submit(_persistir, email, falhas, locked_at, unlocked_at)
+
+
+def limpar(email):
+    """Forget the failures of email after a successful login."""
+    janela = int(time.time() // settings.LOGIN_JANELA.total_seconds())
+    cache.delete_many([
+        _chave('falhas', email, janela),
+        _chave('falhas', email, janela - 1),
+    ])
+
+
+def _persistir(email, falhas, locked_at, unlocked_at):
+    """Record a lock on the User row, off the request thread.
+
+    update() sends no post_save, so the cached copies are evicted here.
+    """
+    try:
+        usuarios = User.objects.filter(email__iexact=email.strip())
+        ids = list(usuarios.values_list('pk', flat=True))
+        usuarios.filter(pk__in=ids).update(
+            login_attempts=falhas,
+            locked_at=locked_at,
+            unlocked_at=unlocked_at
+        )
+        invalidar_usuarios(ids)
+    finally:
+        connection.close()
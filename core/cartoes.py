@@ -0,0 +1,103 @@
+"""
+Card number and CVV allocation.
+
+Card numbers are BIN + 9-digit account identifier + Luhn check digit. The
+identifier is the next value of a database sequence passed through a keyed
+Feistel permutation, so numbers are unique without looking at the cards
+already issued, and consecutive cards do not get consecutive numbers.
+"""
+import hashlib
+import hmac
+import secrets
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from core.models import Cartao
+
+
+SEQUENCIA = 'core_cartao_numero_seq'
+
+DOMINIO = 10 ** 9
+# Each Feistel half is taken modulo METADE; METADE ** 2 >= DOMINIO.
+METADE = 31623
+RODADAS = 4
+
+
+class NumerosEsgotados(Exception):
+    """Raised when the BIN has no card numbers left."""
+
+
+def _funcao_rodada(chave, rodada, valor):
+    mensagem = f'{rodada}:{valor}'.encode()
+    digest = hmac.new(chave, mensagem, hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], 'big') % METADE
+
+
+def permutar(valor, chave):
+    """Map valor in [0, DOMINIO) to a unique value in the same range.
+
+    A balanced Feistel network over METADE x METADE is a permutation of
+    [0, METADE ** 2); values that land outside DOMINIO are encrypted again
+    (cycle walking) until they fall inside it.
+    """
+    while True:
+        esquerda, direita = divmod(valor, METADE)
+        for rodada in range(RODADAS):
+            esquerda, direita = direita, (esquerda + _funcao_rodada(chave, rodada, direita)) % METADE
+        valor = esquerda * METADE + direita
+        if valor < DOMINIO:
+            return valor
+
+
+def digito_luhn(numero):
+    """Return the Luhn check digit for the digits in numero."""
+    soma = 0
+    for posicao, digito in enumerate(reversed(numero)):
+        valor = int(digito)
+        if posicao % 2 == 0:
+            valor *= 2
+            if valor > 9:
+                valor -= 9
+        soma += valor
+    return str((10 - soma % 10) % 10)
+
+
+def gerar_numero():
+    """Allocate the next card number of the configured BIN."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [SEQUENCIA])
+        sequencial, = cursor.fetchone()
+
+    if sequencial > DOMINIO:
+        raise NumerosEsgotados(settings.CARTAO_BIN)
+
+    chave = settings.CARTAO_NUMERO_CHAVE.encode()
+    parcial = f'{settings.CARTAO_BIN}{permutar(sequencial - 1, chave):09d}'
+    return parcial + digito_luhn(parcial)
+
+
+def gerar_cvv():
+    """Return a random 3-digit CVV."""
+    return f'{secrets.randbelow(1000):03d}'
+
+
+def emitir_cartao(**campos):
+    """Create a Cartao with a freshly allocated numero and cvv.
+
+    Numbers allocated here never repeat, but cards issued before the
+    allocator existed may share the BIN; on such a clash the next number of
+    the sequence is used.
+    """
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                return Cartao.objects.create(
+                    numero=gerar_numero(),
+                    cvv=gerar_cvv(),
+                    **campos
+                )
+        except IntegrityError:
+            continue
+
+    raise IntegrityError('Não foi possível alocar um número de cartão')
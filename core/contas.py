@@ -0,0 +1,77 @@
+"""
+Account number allocation.
+
+Account numbers are a 7-digit sequential plus a check digit. Sequentials
+come from a database sequence that moves in blocks of BLOCO values: each
+worker reserves a whole block with one nextval() and hands its numbers out
+from memory, so opening an account rarely needs an extra query.
+"""
+import threading
+
+from django.db import IntegrityError, connection, transaction
+
+from core.cartoes import digito_luhn
+from core.models import Conta
+
+
+SEQUENCIA = 'core_conta_numero_seq'
+# Must match the INCREMENT BY of the sequence.
+BLOCO = 100
+AGENCIA_PADRAO = '0001'
+LIMITE = 10 ** 7
+
+
+class NumerosEsgotados(Exception):
+    """Raised when there are no account numbers left."""
+
+
+_trava = threading.Lock()
+_bloco = {'proximo': 0, 'fim': 0}
+
+
+def _reservar_bloco():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [SEQUENCIA])
+        inicio, = cursor.fetchone()
+    _bloco['proximo'], _bloco['fim'] = inicio, inicio + BLOCO
+
+
+def proximo_sequencial():
+    """Return the next sequential reserved by this worker."""
+    with _trava:
+        if _bloco['proximo'] >= _bloco['fim']:
+            _reservar_bloco()
+        sequencial = _bloco['proximo']
+        _bloco['proximo'] += 1
+
+    if sequencial >= LIMITE:
+        raise NumerosEsgotados
+    return sequencial
+
+
+def gerar_numero():
+    """Return a new 8-digit account number with its check digit."""
+    parcial = f'{proximo_sequencial():07d}'
+    return parcial + digito_luhn(parcial)
+
+
+def abrir_conta(user, agencia=AGENCIA_PADRAO):
+    """Create an empty Conta for user with a freshly allocated numero.
+
+    Numbers handed out here never repeat, but accounts opened before the
+    allocator existed have random numbers; on such a clash the next number
+    is used.
+    """
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                return Conta.objects.create(
+                    user=user,
+                    agencia=agencia,
+                    numero=gerar_numero(),
+                    saldo=0
+                )
+        except IntegrityError:
+            continue
+
+    raise IntegrityError('Não foi possível alocar um número de conta')
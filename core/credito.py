@@ -0,0 +1,107 @@
+"""
+Credit decisions for loan requests.
+
+A decision reads the PerfilCredito of the conta (one indexed lookup) and
+runs it through the rules listed in settings.CREDITO_REGRAS. Each rule is
+a class called with the profile and the Pedido; it returns a Parecer with
+the points it adds and, to refuse the loan outright, a reason. A loan is
+approved when no rule refuses it and the points reach
+CREDITO_PONTUACAO_MINIMA.
+"""
+import functools
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from core.models import Cartao, GastoCiclo, PerfilCredito
+from core.services import inicio_do_ciclo
+
+
+Pedido = namedtuple('Pedido', 'conta valor qtd_parcelas')
+Parecer = namedtuple('Parecer', 'pontos recusa', defaults=(0, None))
+Decisao = namedtuple('Decisao', 'aprovado pontos motivo')
+
+
+@functools.lru_cache(maxsize=None)
+def _carregar(caminhos):
+    return [import_string(caminho)() for caminho in caminhos]
+
+
+def regras():
+    """Return the configured rule instances."""
+    return _carregar(tuple(settings.CREDITO_REGRAS))
+
+
+def decidir(conta, valor, qtd_parcelas):
+    """Return the Decisao on lending valor in qtd_parcelas to conta."""
+    perfil = PerfilCredito.objects.filter(conta_id=conta.pk).first() or PerfilCredito(conta=conta)
+    pedido = Pedido(conta, valor, qtd_parcelas)
+
+    pontos = 0
+    for regra in regras():
+        parecer = regra(perfil, pedido)
+        if parecer.recusa:
+            return Decisao(False, pontos + parecer.pontos, parecer.recusa)
+        pontos += parecer.pontos
+
+    if pontos < settings.CREDITO_PONTUACAO_MINIMA:
+        return Decisao(False, pontos, 'Pontuação de crédito insuficiente')
+    return Decisao(True, pontos, None)
+
+
+class CapacidadeDeSaldo:
+    """Refuse loans above CREDITO_MULTIPLICADOR_SALDO times the saldo.
+
+    The larger of the current and the average saldo is used, so a conta
+    without history is judged on its current saldo.
+    """
+
+    def __call__(self, perfil, pedido):
+        base = max(pedido.conta.saldo, Decimal(perfil.saldo_medio))
+        if pedido.valor > base * settings.CREDITO_MULTIPLICADOR_SALDO:
+            return Parecer(recusa='O valor solicitado é muito para sua conta')
+        return Parecer()
+
+
+class FluxoDeCaixa:
+    """Reward contas that take in more than they spend."""
+
+    def __call__(self, perfil, pedido):
+        if not perfil.movimentos:
+            return Parecer()
+        if perfil.entradas > perfil.saidas:
+            return Parecer(10)
+        return Parecer(-10)
+
+
+def utilizacao_cartao(conta):
+    """Return the share of the card limits of conta spent in the current cycle.
+
+    Read from the GastoCiclo counters at decision time, so it starts over
+    when the billing cycle turns. None when conta has no card limit.
+    """
+    gasto = GastoCiclo.objects.filter(cartao=OuterRef('pk'), ciclo=inicio_do_ciclo()).values('total')
+    uso = Cartao.objects.filter(conta_id=conta.pk).annotate(
+        no_ciclo=Coalesce(Subquery(gasto), Value(Decimal(0)))
+    ).aggregate(limite=Sum('limite'), gasto=Sum('no_ciclo'))
+    if not uso['limite']:
+        return None
+    return uso['gasto'] / uso['limite']
+
+
+class UtilizacaoDeCartao:
+    """Penalize cards close to their limit and reward light use."""
+
+    def __call__(self, perfil, pedido):
+        utilizacao = utilizacao_cartao(pedido.conta)
+        if utilizacao is None:
+            return Parecer()
+        if utilizacao >= Decimal('0.9'):
+            return Parecer(-20)
+        if perfil.gastos_cartao and utilizacao <= Decimal('0.3'):
+            return Parecer(5)
+        return Parecer()
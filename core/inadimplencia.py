@@ -0,0 +1,101 @@
+"""
+Nightly accrual of overdue loan installments.
+
+Installments past their due date and not paid are marked overdue, and
+their late fee and default interest are recomputed from the reference
+date, so running the same date twice changes nothing. The book is walked
+in id ranges with one set-based UPDATE per range, each in its own short
+transaction, and the progress of every partition is kept in a Checkpoint
+so an interrupted run resumes where it stopped.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Min
+
+from core.models import Checkpoint, ParcelaEmprestimo
+
+
+JOB = 'inadimplencia'
+
+_tabela = ParcelaEmprestimo._meta.db_table
+
+ACUMULAR = f'''
+    UPDATE {_tabela} SET
+        status = %(vencida)s,
+        dias_atraso = %(data)s - "dataVencimento",
+        multa = ROUND(("valorParcela" - "valorPago") * %(multa)s, 2),
+        juros_mora = ROUND(("valorParcela" - "valorPago") * %(juros)s * (%(data)s - "dataVencimento"), 2)
+    WHERE id BETWEEN %(inicio)s AND %(fim)s
+      AND "dataPaga" IS NULL
+      AND "dataVencimento" < %(data)s
+      AND (status <> %(vencida)s OR dias_atraso <> %(data)s - "dataVencimento")
+'''
+
+
+def particionar(data, particoes):
+    """Return the Checkpoints of the run for data, creating them if needed.
+
+    The id range of the installment book is split in particoes contiguous
+    ranges. A run that already started keeps its own partitions, whatever
+    particoes is now.
+    """
+    referencia = data.isoformat()
+    existentes = list(Checkpoint.objects.filter(job=JOB, referencia=referencia).order_by('particao'))
+    if existentes:
+        return existentes
+
+    limites = ParcelaEmprestimo.objects.aggregate(inicio=Min('id'), fim=Max('id'))
+    if limites['inicio'] is None:
+        return []
+
+    tamanho = -(-(limites['fim'] - limites['inicio'] + 1) // particoes)
+    checkpoints = []
+    for particao in range(particoes):
+        inicio = limites['inicio'] + particao * tamanho
+        if inicio > limites['fim']:
+            break
+        checkpoints.append(Checkpoint(
+            job=JOB,
+            referencia=referencia,
+            particao=particao,
+            inicio_id=inicio,
+            fim_id=min(inicio + tamanho - 1, limites['fim']),
+            ultimo_id=inicio - 1
+        ))
+
+    Checkpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+    return list(Checkpoint.objects.filter(job=JOB, referencia=referencia).order_by('particao'))
+
+
+def processar_particao(checkpoint_id, data, lote):
+    """Accrue the installments of one partition, lote ids at a time.
+
+    Every chunk commits together with the checkpoint, so a crash loses at
+    most the chunk in flight. Return the number of installments updated.
+    """
+    checkpoint = Checkpoint.objects.get(pk=checkpoint_id)
+    atualizadas = 0
+    while not checkpoint.concluido:
+        inicio = checkpoint.ultimo_id + 1
+        fim = min(inicio + lote - 1, checkpoint.fim_id)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(ACUMULAR, {
+                'inicio': inicio,
+                'fim': fim,
+                'data': data,
+                'vencida': ParcelaEmprestimo.VENCIDA,
+                'multa': settings.EMPRESTIMO_MULTA_ATRASO,
+                'juros': settings.EMPRESTIMO_JUROS_MORA_DIA,
+            })
+            linhas = cursor.rowcount
+            Checkpoint.objects.filter(pk=checkpoint.pk).update(
+                ultimo_id=fim,
+                linhas=F('linhas') + linhas,
+                concluido=fim >= checkpoint.fim_id
+            )
+
+        atualizadas += linhas
+        checkpoint.ultimo_id = fim
+        checkpoint.concluido = fim >= checkpoint.fim_id
+
+    return atualizadas
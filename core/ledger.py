@@ -0,0 +1,169 @@
+"""
+Double-entry ledger for money movements.
+
+Every movement is stored as immutable Lancamento rows whose debits and
+credits add up to the same amount. ``Conta.saldo`` is the materialized
+balance of the customer side of the ledger: it is moved by the net effect
+of each movement in the same transaction the lançamentos are inserted, so
+reading a balance never needs to look at history.
+
+Each movement also writes an Evento to the outbox in that transaction, so
+downstream consumers learn about it once it commits and only then (see
+core.outbox).
+"""
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+
+from core.models import Conta, Evento, Lancamento
+
+
+CAIXA = 'caixa'
+SALDO_ABERTURA = 'saldo_abertura'
+CARTOES_A_RECEBER = 'cartoes_a_receber'
+ESTABELECIMENTOS = 'estabelecimentos'
+EMPRESTIMOS_A_RECEBER = 'emprestimos_a_receber'
+RECEITAS_EMPRESTIMOS = 'receitas_emprestimos'
+
+
+class SaldoInsuficiente(Exception):
+    """Raised when an account can not cover a debit."""
+
+
+class MovimentoDesbalanceado(ValueError):
+    """Raised when the debits of a movement do not match its credits."""
+
+
+class Movimento:
+    """Balanced group of lançamentos recorded together."""
+
+    def __init__(self, tipo, origem=None):
+        self.id = uuid.uuid4()
+        self.tipo = tipo
+        self.origem = origem
+        self.partidas = []
+
+    def debitar(self, valor, conta_id=None, sistema=''):
+        """Add a debit to a customer conta or to a conta_sistema."""
+        return self._partida(Lancamento.DEBITO, valor, conta_id, sistema)
+
+    def creditar(self, valor, conta_id=None, sistema=''):
+        """Add a credit to a customer conta or to a conta_sistema."""
+        return self._partida(Lancamento.CREDITO, valor, conta_id, sistema)
+
+    def _partida(self, natureza, valor, conta_id, sistema):
+        valor = Decimal(valor)
+        if valor <= 0:
+            raise ValueError(f'{self.tipo}: valor inválido {valor}')
+        self.partidas.append((natureza, valor, conta_id, sistema))
+        return self
+
+    def deltas(self):
+        """Return the net saldo change of each customer conta."""
+        deltas = defaultdict(Decimal)
+        for natureza, valor, conta_id, _ in self.partidas:
+            if conta_id is not None:
+                deltas[conta_id] += valor if natureza == Lancamento.CREDITO else -valor
+        return deltas
+
+    def lancamentos(self):
+        """Build the unsaved Lancamento rows of the movement."""
+        debitos = sum(v for n, v, _, _ in self.partidas if n == Lancamento.DEBITO)
+        creditos = sum(v for n, v, _, _ in self.partidas if n == Lancamento.CREDITO)
+        if not self.partidas or debitos != creditos:
+            raise MovimentoDesbalanceado(
+                f'{self.tipo}: débitos {debitos} != créditos {creditos}')
+
+        origem_tipo = self.origem._meta.model_name if self.origem else ''
+        origem_id = self.origem.pk if self.origem else None
+
+        return [
+            Lancamento(
+                movimento=self.id,
+                tipo=self.tipo,
+                natureza=natureza,
+                valor=valor,
+                conta_id=conta_id,
+                conta_sistema=sistema,
+                origem_tipo=origem_tipo,
+                origem_id=origem_id
+            )
+            for natureza, valor, conta_id, sistema in self.partidas
+        ]
+
+    def evento(self):
+        """Build the unsaved outbox Evento of the movement."""
+        origem = {}
+        if self.origem:
+            origem = {campo.attname: campo.value_from_object(self.origem)
+                      for campo in self.origem._meta.concrete_fields}
+
+        return Evento(
+            movimento=self.id,
+            tipo=self.tipo,
+            origem_tipo=self.origem._meta.model_name if self.origem else '',
+            origem_id=self.origem.pk if self.origem else None,
+            payload={
+                'valor': sum(v for n, v, _, _ in self.partidas if n == Lancamento.DEBITO),
+                'contas': {str(conta_id): delta for conta_id, delta in self.deltas().items()},
+                'origem': origem,
+            }
+        )
+
+
+def aplicar_deltas(deltas):
+    """Apply net saldo changes to customer contas.
+
+    A single conta is changed with one conditional UPDATE. Several contas
+    are locked in id order, checked, and changed with one UPDATE, so
+    movements touching the same contas can never deadlock.
+    """
+    deltas = {conta_id: delta for conta_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    if len(deltas) == 1:
+        (conta_id, delta), = deltas.items()
+        contas = Conta.objects.filter(pk=conta_id)
+        if delta < 0:
+            contas = contas.filter(saldo__gte=-delta)
+        if not contas.update(saldo=F('saldo') + delta):
+            if Conta.objects.filter(pk=conta_id).exists():
+                raise SaldoInsuficiente(conta_id)
+            raise Conta.DoesNotExist
+        return
+
+    saldos = dict(
+        Conta.objects.select_for_update().filter(
+            pk__in=deltas
+        ).order_by('pk').values_list('pk', 'saldo')
+    )
+    if len(saldos) != len(deltas):
+        raise Conta.DoesNotExist
+
+    for conta_id, delta in deltas.items():
+        if saldos[conta_id] + delta < 0:
+            raise SaldoInsuficiente(conta_id)
+
+    Conta.objects.filter(pk__in=deltas).update(saldo=F('saldo') + Case(
+        *[When(pk=conta_id, then=Value(delta)) for conta_id, delta in deltas.items()],
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    ))
+
+
+def lancar(*movimentos):
+    """Record movimentos, their outbox events and move the saldo of the contas they touch."""
+    lancamentos = []
+    deltas = defaultdict(Decimal)
+    for movimento in movimentos:
+        lancamentos.extend(movimento.lancamentos())
+        for conta_id, delta in movimento.deltas().items():
+            deltas[conta_id] += delta
+
+    with transaction.atomic():
+        aplicar_deltas(deltas)
+        Evento.objects.bulk_create([movimento.evento() for movimento in movimentos])
+        return Lancamento.objects.bulk_create(lancamentos)
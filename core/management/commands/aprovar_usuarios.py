@@ -0,0 +1,48 @@
+"""
+Django command to approve the users that waited long enough.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.authentication import invalidar_usuarios
+from core.models import User
+
+
+APROVAR = f'''
+    UPDATE {User._meta.db_table} SET status = 'Aprovado'
+    WHERE id IN (
+        SELECT id FROM {User._meta.db_table}
+        WHERE status <> 'Aprovado' AND created_at <= %s
+        ORDER BY created_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id
+'''
+
+
+class Command(BaseCommand):
+    """Approve eligible users with one UPDATE per chunk."""
+
+    help = 'Approve users created more than APROVACAO_USUARIO_ESPERA ago.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        limite = timezone.now() - settings.APROVACAO_USUARIO_ESPERA
+        aprovados = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(APROVAR, [limite, options['lote']])
+                ids = [user_id for user_id, in cursor.fetchall()]
+                invalidar_usuarios(ids)
+
+            aprovados += len(ids)
+            if len(ids) < options['lote']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'{aprovados} usuários aprovados'))
@@ -0,0 +1,35 @@
+"""
+Django command to fold new account activity into the credit profiles.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import perfis
+
+
+class Command(BaseCommand):
+    """Bring every PerfilCredito source up to date, one batch per transaction."""
+
+    help = 'Update PerfilCredito from the Extrato, Transferencia, CartaoGasto and SaldoDiario rows not yet read.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10000,
+                            help='Source ids folded per transaction.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        for nome in perfis.FONTES:
+            inicio = time.perf_counter()
+            consumidos = 0
+            while True:
+                lote = perfis.atualizar(nome, options['lote'])
+                if not lote:
+                    break
+                consumidos += lote
+
+            decorrido = time.perf_counter() - inicio
+            self.stdout.write(self.style.SUCCESS(
+                f'{nome}: {consumidos} ids em {decorrido:.2f}s '
+                f'({consumidos / max(decorrido, 1e-9):,.0f} linhas/s)'
+            ))
@@ -0,0 +1,171 @@
+"""
+Django command to benchmark the read endpoints under WSGI and under ASGI.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import services
+from core.benchmark import banco_descartavel, percentil
+from core.models import Cartao, Conta, Emprestimo, User
+
+
+async def cliente(porta, requisicao, atraso, fim, latencias, erros):
+    """Send requisicao in two halves atraso seconds apart, until fim."""
+    metade = len(requisicao) // 2
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', porta)
+            writer.write(requisicao[:metade])
+            await writer.drain()
+            await asyncio.sleep(atraso)
+            writer.write(requisicao[metade:])
+            await writer.drain()
+            resposta = await reader.read()
+            writer.close()
+        except OSError as erro:
+            erros.append(erro)
+            continue
+
+        if resposta.startswith(b'HTTP/1.1 200'):
+            latencias.append(time.perf_counter() - inicio)
+        else:
+            erros.append(resposta[:50])
+
+
+async def carga(porta, requisicao, clientes, duracao, atraso):
+    """Run clientes slow clients for duracao seconds; return latencies and errors."""
+    latencias, erros = [], []
+    fim = time.perf_counter() + duracao
+    await asyncio.gather(*[
+        cliente(porta, requisicao, atraso, fim, latencias, erros)
+        for _ in range(clientes)
+    ])
+    return latencias, erros
+
+
+def _porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    """Serve the same data with gunicorn and compare requests/s and p99 latency.
+
+    wsgi runs the DRF views on gthread workers, asgi-sync runs them on
+    uvicorn workers (each request handed to a thread) and asgi runs the
+    async views of api.views_async on uvicorn workers. Every client sends
+    its request in two halves --atraso seconds apart, like a client on a
+    slow network, and reads the whole response before the next request.
+    """
+
+    help = 'Benchmark the read endpoints under WSGI and ASGI on a throwaway test database.'
+
+    modos = {
+        'wsgi': ('app.wsgi:application', ['--worker-class', 'gthread']),
+        'asgi-sync': ('app.asgi:application', ['--worker-class', 'uvicorn.workers.UvicornWorker']),
+        'asgi': ('app.asgi:application', ['--worker-class', 'uvicorn.workers.UvicornWorker']),
+    }
+
+    rotas = {
+        'conta': ('/api/v1/accounts/{numero}/', '/api/v1/async/accounts/{numero}/'),
+        'extrato': ('/api/v1/extrato/', '/api/v1/async/extrato/'),
+        'cartoes': ('/api/v1/cartoes/listar-cartoes/', '/api/v1/async/cartoes/'),
+        'emprestimos': ('/api/v1/emprestimos/listar-emprestimos/', '/api/v1/async/emprestimos/'),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modos', nargs='+', choices=list(self.modos), default=list(self.modos))
+        parser.add_argument('--rota', choices=list(self.rotas), default='extrato')
+        parser.add_argument('--clientes', type=int, default=200)
+        parser.add_argument('--duracao', type=float, default=10.0, help='Seconds of load per mode.')
+        parser.add_argument('--atraso', type=float, default=0.05,
+                            help='Seconds each client waits between the halves of its request.')
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=8, help='Threads per gthread worker.')
+        parser.add_argument('--linhas', type=int, default=200, help='Extrato rows of the conta.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with banco_descartavel() as nome:
+            self.executar(nome, **options)
+
+    def executar(self, nome, modos, rota, clientes, duracao, atraso, workers, threads, linhas,
+                 **options):
+        user = User.objects.create_user(email='bench@easypay.local', password='bench', cpf='00000000000')
+        conta = Conta.objects.create(user=user, agencia='0001', numero='00000001', saldo=0)
+        for _ in range(linhas):
+            services.depositar(conta.pk, Decimal('1.00'))
+        for n in range(3):
+            Cartao.objects.create(nome='Bench', cvv='123', numero=f'650487000000000{n}',
+                                  limite=Decimal('1000.00'), tipo='Crédito', conta=conta)
+            Emprestimo.objects.create(valorRequisitado=Decimal('100.00'), valorTotal=Decimal('120.00'),
+                                      qtd_parcelas=12, conta=conta, status='Aprovado')
+        token = RefreshToken.for_user(user).access_token
+
+        self.stdout.write(
+            f'{clientes} clients, {atraso * 1000:.0f}ms to send each request, {duracao:.0f}s per mode, '
+            f'{workers} worker(s), {threads} threads per gthread worker'
+        )
+        for modo in modos:
+            caminho = self.rotas[rota][modo == 'asgi'].format(numero=conta.numero)
+            requisicao = (
+                f'GET {caminho} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                f'Authorization: Bearer {token}\r\nConnection: close\r\n\r\n'
+            ).encode()
+
+            with self.servidor(nome, modo, workers, threads) as porta:
+                asyncio.run(carga(porta, requisicao, 1, 0.5, 0))
+                latencias, erros = asyncio.run(carga(porta, requisicao, clientes, duracao, atraso))
+
+            self.stdout.write(
+                f'{modo:>9} {caminho:40} {len(latencias) / duracao:8.1f} req/s'
+                f'  p50 {percentil(latencias, 50) * 1000:7.1f}ms'
+                f'  p99 {percentil(latencias, 99) * 1000:7.1f}ms'
+                f'  errors {len(erros)}'
+            )
+
+    def servidor(self, nome, modo, workers, threads):
+        aplicacao, argumentos = self.modos[modo]
+        porta = _porta_livre()
+        processo = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', aplicacao, '--bind', f'127.0.0.1:{porta}',
+             '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning',
+             *argumentos],
+            env=dict(os.environ, DB_NAME=nome),
+        )
+        return _Servidor(processo, porta)
+
+
+class _Servidor:
+    """Context manager waiting for a gunicorn process to listen, then stopping it."""
+
+    def __init__(self, processo, porta):
+        self.processo = processo
+        self.porta = porta
+
+    def __enter__(self):
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
+            if self.processo.poll() is not None:
+                raise CommandError('gunicorn exited before listening; is it installed?')
+            try:
+                socket.create_connection(('127.0.0.1', self.porta), timeout=1).close()
+                return self.porta
+            except OSError:
+                time.sleep(0.2)
+        self.processo.terminate()
+        raise CommandError('gunicorn did not start listening in 30s.')
+
+    def __exit__(self, *exc):
+        self.processo.terminate()
+        self.processo.wait()
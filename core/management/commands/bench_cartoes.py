@@ -0,0 +1,72 @@
+"""
+Django command to benchmark card issuance as the card table grows.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.benchmark import banco_descartavel, percentil
+from core.cartoes import emitir_cartao
+from core.models import Cartao, Conta, User
+
+
+class Command(BaseCommand):
+    """Measure card issuance latency with up to --cartoes existing cards."""
+
+    help = 'Benchmark card number allocation on a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cartoes', type=int, default=10_000_000,
+                            help='Existing cards at the last step.')
+        parser.add_argument('--passos', type=int, default=5)
+        parser.add_argument('--emissoes', type=int, default=500,
+                            help='Cards issued and timed at each step.')
+        parser.add_argument('--legado', action='store_true',
+                            help='Also time loading every numero, as the old allocator did.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with banco_descartavel():
+            self.executar(**options)
+
+    def semear(self, conta, total):
+        """Insert filler cards until the table has total rows."""
+        atual = Cartao.objects.count()
+        if total <= atual:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO core_cartao (nome, cvv, numero, limite, tipo, conta_id)
+                SELECT 'bench', '000', lpad(g::text, 16, '0'), 0, 'Crédito', %s
+                FROM generate_series(%s, %s) AS g
+                """,
+                [conta.pk, atual + 1, total]
+            )
+            cursor.execute('ANALYZE core_cartao')
+
+    def executar(self, cartoes, passos, emissoes, legado, **options):
+        user = User.objects.create(email='bench@easypay.local', cpf='00000000000')
+        conta = Conta.objects.create(user=user, agencia='0001', numero='00000000', saldo=0)
+
+        for passo in range(passos + 1):
+            self.semear(conta, cartoes * passo // passos)
+            existentes = Cartao.objects.count()
+
+            latencias = []
+            for _ in range(emissoes):
+                inicio = time.perf_counter()
+                emitir_cartao(nome='bench', limite=0, tipo='Crédito', conta=conta)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+            linha = (
+                f'{existentes:>11,} cards: p50 {percentil(latencias, 50):.2f}ms '
+                f'p99 {percentil(latencias, 99):.2f}ms'
+            )
+            if legado:
+                inicio = time.perf_counter()
+                set(Cartao.objects.values_list('numero', flat=True))
+                linha += f', loading every numero {(time.perf_counter() - inicio) * 1000:.0f}ms'
+            self.stdout.write(linha)
+
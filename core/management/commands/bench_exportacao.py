@@ -0,0 +1,70 @@
+"""
+Django command to benchmark streaming statement exports.
+"""
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIClient
+
+from core.benchmark import banco_descartavel
+from core.models import Conta, User
+
+
+class Command(BaseCommand):
+    """Measure time to first byte, total time and peak memory of an export."""
+
+    help = 'Benchmark /extrato/exportar/ on a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                            help='Extrato sizes to export.')
+        parser.add_argument('--formato', choices=['csv', 'ndjson'], default='csv')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with banco_descartavel():
+            self.executar(**options)
+
+    def semear(self, conta, total):
+        """Insert filler extrato rows until the conta has total rows."""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM core_extrato WHERE conta_id = %s', [conta.pk])
+            atual, = cursor.fetchone()
+            cursor.execute(
+                """
+                INSERT INTO core_extrato (conta_id, valor, tipo, created_at)
+                SELECT %s, (g %% 1000) + 0.99, 'Deposito', now() - g * interval '1 minute'
+                FROM generate_series(%s, %s) AS g
+                """,
+                [conta.pk, atual + 1, total]
+            )
+            cursor.execute('ANALYZE core_extrato')
+
+    def executar(self, linhas, formato, **options):
+        user = User.objects.create(email='bench@easypay.local', cpf='00000000000')
+        conta = Conta.objects.create(user=user, agencia='0001', numero='00000000', saldo=0)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        for total in sorted(linhas):
+            self.semear(conta, total)
+
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            response = client.get(f'/api/v1/extrato/exportar/?formato={formato}')
+            conteudo = iter(response.streaming_content)
+            bytes_lidos = len(next(conteudo))
+            primeiro_byte = time.perf_counter() - inicio
+            for bloco in conteudo:
+                bytes_lidos += len(bloco)
+            duracao = time.perf_counter() - inicio
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            response.close()
+
+            self.stdout.write(
+                f'{total:>10,} rows: TTFB {primeiro_byte * 1000:.1f}ms, total {duracao:.2f}s, '
+                f'{bytes_lidos / 1024 / 1024:.1f} MiB sent, peak Python memory {pico / 1024 / 1024:.1f} MiB'
+            )
@@ -0,0 +1,101 @@
+"""
+Django command to benchmark concurrent card authorizations on one card.
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core import services
+from core.benchmark import banco_descartavel, executar_concorrente
+from core.models import Cartao, CartaoGasto, Conta, GastoCiclo, User
+
+
+def registrar_gasto_legado(cartao, valor, nome):
+    """Aggregate-then-insert authorization, as it used to be done."""
+    with transaction.atomic():
+        soma_total = CartaoGasto.objects.filter(
+            cartao=cartao,
+            created_at__month=timezone.now().month
+        ).aggregate(Sum('valor'))['valor__sum'] or 0
+        if valor > cartao.limite or soma_total > cartao.limite:
+            raise services.LimiteInsuficiente
+
+        return CartaoGasto.objects.create(cartao=cartao, valor=valor, nome=nome)
+
+
+class Command(BaseCommand):
+    """Measure authorizations/s and overspend on a single hot card."""
+
+    help = 'Benchmark concurrent card spends on a throwaway test database.'
+
+    modos = {
+        'servico': services.registrar_gasto,
+        'legado': registrar_gasto_legado,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escritores', type=int, default=50)
+        parser.add_argument('--gastos', type=int, default=40,
+                            help='Spends attempted by each writer.')
+        parser.add_argument('--valor', type=Decimal, default=Decimal('1.00'))
+        parser.add_argument('--limite', type=Decimal, default=Decimal('1000.00'))
+        parser.add_argument('--historico', type=int, default=0,
+                            help='Spends already recorded on the card this cycle.')
+        parser.add_argument('--modo', choices=sorted(self.modos), default='servico')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with banco_descartavel():
+            self.executar(**options)
+
+    def semear(self, cartao, historico):
+        """Record historico one-cent spends in the current cycle."""
+        CartaoGasto.objects.bulk_create(
+            (CartaoGasto(cartao=cartao, valor=Decimal('0.01'), nome='Historico')
+             for _ in range(historico)),
+            batch_size=5000
+        )
+        GastoCiclo.objects.create(cartao=cartao, ciclo=services.inicio_do_ciclo(),
+                                  total=historico * Decimal('0.01'))
+
+    def executar(self, escritores, gastos, valor, limite, historico, modo, **options):
+        user = User.objects.create(email='bench@easypay.local', cpf='00000000000')
+        conta = Conta.objects.create(user=user, agencia='0001', numero='00000000', saldo=0)
+        cartao = Cartao.objects.create(nome='Bench', cvv='000', numero='6504870000000000',
+                                       limite=limite + historico * Decimal('0.01'),
+                                       tipo='Crédito', conta=conta)
+        self.semear(cartao, historico)
+        registrar = self.modos[modo]
+        anteriores = CartaoGasto.objects.count()
+
+        recusados = []
+
+        def escritor(indice):
+            for _ in range(gastos):
+                try:
+                    registrar(cartao, valor, 'Bench')
+                except services.LimiteInsuficiente:
+                    recusados.append(indice)
+
+        self.stdout.write(f'{escritores} writers x {gastos} spends on one card ({modo})')
+        duracao, erros = executar_concorrente(escritores, escritor)
+
+        autorizados = CartaoGasto.objects.count() - anteriores
+        total = CartaoGasto.objects.aggregate(total=Sum('valor'))['total'] or 0
+        excesso = max(total - cartao.limite, 0)
+
+        self.stdout.write(f'Spends authorized: {autorizados}')
+        self.stdout.write(f'Spends refused (limite insuficiente): {len(recusados)}')
+        self.stdout.write(f'Errors: {len(erros)}')
+        for erro in erros[:5]:
+            self.stdout.write(f'  {erro!r}')
+        self.stdout.write(
+            f'Throughput: {(autorizados + len(recusados)) / duracao:.1f} authorizations/s '
+            f'in {duracao:.2f}s'
+        )
+
+        estilo = self.style.SUCCESS if excesso == 0 else self.style.ERROR
+        self.stdout.write(estilo(f'Overspend: {excesso}'))
@@ -0,0 +1,69 @@
+"""
+Django command to benchmark the nightly installment accrual.
+"""
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from core.benchmark import banco_descartavel
+from core.models import Conta, Emprestimo, ParcelaEmprestimo, User
+
+
+class Command(BaseCommand):
+    """Measure rows/s of processar_parcelas for several process counts."""
+
+    help = 'Benchmark processar_parcelas on a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parcelas', type=int, default=1200000)
+        parser.add_argument('--processos', type=int, nargs='+', default=[1, 4])
+        parser.add_argument('--lote', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with banco_descartavel():
+            self.executar(**options)
+
+    def semear(self, parcelas):
+        """Insert loans of 12 installments, the first half of them already due."""
+        user = User.objects.create(email='bench@easypay.local', cpf='00000000000')
+        conta = Conta.objects.create(user=user, agencia='0001', numero='00000000', saldo=0)
+        emprestimos = Emprestimo._meta.db_table
+        tabela = ParcelaEmprestimo._meta.db_table
+        inicio = timezone.localdate() - timezone.timedelta(days=180)
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {emprestimos} ("valorRequisitado", "valorTotal", data_pedido, qtd_parcelas,
+                                          conta_id, status, taxa_juros, sistema_amortizacao)
+                SELECT 1000, 1200, now(), 12, %s, 'Aprovado', 0.0399, 'Price'
+                FROM generate_series(1, %s)
+            ''', [conta.pk, -(-parcelas // 12)])
+            cursor.execute(f'''
+                INSERT INTO {tabela} ("valorParcela", "valorPago", amortizacao, juros, "numParcela",
+                                      "dataVencimento", status, dias_atraso, multa, juros_mora,
+                                      emprestimo_id)
+                SELECT 100, 0, 90, 10, n, %s::date + n * interval '1 month',
+                       'Em Aberto', 0, 0, 0, e.id
+                FROM {emprestimos} e CROSS JOIN generate_series(1, 12) n
+                ORDER BY e.id, n
+            ''', [inicio])
+            cursor.execute(f'ANALYZE {tabela}')
+
+    def executar(self, parcelas, processos, lote, **options):
+        inicio = time.perf_counter()
+        self.semear(parcelas)
+        total = ParcelaEmprestimo.objects.count()
+        self.stdout.write(f'{total} parcelas semeadas em {time.perf_counter() - inicio:.1f}s')
+
+        for quantidade in processos:
+            self.stdout.write(f'--processos {quantidade}:')
+            call_command('processar_parcelas', processos=quantidade, lote=lote,
+                         reiniciar=True, stdout=self.stdout)
+            # Leave the book as it was, so every run does the same work.
+            ParcelaEmprestimo.objects.update(status=ParcelaEmprestimo.EM_ABERTO, dias_atraso=0,
+                                             multa=0, juros_mora=0)
+            with connection.cursor() as cursor:
+                cursor.execute(f'VACUUM ANALYZE {ParcelaEmprestimo._meta.db_table}')
@@ -0,0 +1,64 @@
+"""
+Django command to benchmark installment generation for approved loans.
+"""
+import time
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import amortizacao
+from core.benchmark import banco_descartavel
+from core.models import Conta, Emprestimo, ParcelaEmprestimo, User
+
+
+def gerar_parcelas_legado(emprestimos):
+    """One INSERT per installment, as a per-row loop would do."""
+    with transaction.atomic():
+        for emprestimo in emprestimos:
+            for parcela in amortizacao.parcelas_do_emprestimo(emprestimo):
+                parcela.save()
+
+
+class Command(BaseCommand):
+    """Measure loans/s and installments/s of the batch schedule generator."""
+
+    help = 'Benchmark installment generation on a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emprestimos', type=int, default=20000)
+        parser.add_argument('--parcelas', type=int, default=12,
+                            help='Installments of each loan.')
+        parser.add_argument('--lote', type=int, default=2000)
+        parser.add_argument('--legado', action='store_true',
+                            help='Save installments one row at a time instead.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with banco_descartavel():
+            self.executar(**options)
+
+    def executar(self, emprestimos, parcelas, lote, legado, **options):
+        user = User.objects.create(email='bench@easypay.local', cpf='00000000000')
+        conta = Conta.objects.create(user=user, agencia='0001', numero='00000000', saldo=0)
+        Emprestimo.objects.bulk_create(
+            (Emprestimo(valorRequisitado=Decimal(1000 + indice % 5000), valorTotal=0,
+                        qtd_parcelas=parcelas, conta=conta, status='Aprovado',
+                        sistema_amortizacao=(Emprestimo.SAC if indice % 2 else Emprestimo.PRICE))
+             for indice in range(emprestimos)),
+            batch_size=5000
+        )
+
+        inicio = time.perf_counter()
+        if legado:
+            gerar_parcelas_legado(Emprestimo.objects.order_by('pk'))
+        else:
+            call_command('gerar_parcelas', lote=lote, stdout=self.stdout)
+        decorrido = time.perf_counter() - inicio
+
+        criadas = ParcelaEmprestimo.objects.count()
+        self.stdout.write(
+            f"{'legado' if legado else 'lote'}: {emprestimos / decorrido:,.0f} empréstimos/s, "
+            f'{criadas / decorrido:,.0f} parcelas/s ({criadas} parcelas em {decorrido:.2f}s)'
+        )
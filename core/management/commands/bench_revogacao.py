@@ -0,0 +1,75 @@
+"""
+Django command to benchmark the per-request cost of token revocation checks.
+"""
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from core import revogacao
+from core.benchmark import banco_descartavel, percentil
+from core.models import TokenRevogado
+
+
+class Command(BaseCommand):
+    """Compare the Bloom filter check with a database lookup per request."""
+
+    help = 'Benchmark token revocation checks on a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--revogados', type=int, default=100000,
+                            help='Revoked tokens stored before measuring.')
+        parser.add_argument('--verificacoes', type=int, default=20000,
+                            help='Checks of tokens that were not revoked.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with banco_descartavel():
+            self.executar(**options)
+
+    def medir(self, nome, verificar, jtis):
+        amostras = []
+        for jti in jtis:
+            inicio = time.perf_counter()
+            verificar(jti)
+            amostras.append(time.perf_counter() - inicio)
+
+        self.stdout.write(
+            f'{nome:>10}: p50 {percentil(amostras, 50) * 1e6:8.1f}us'
+            f'  p99 {percentil(amostras, 99) * 1e6:8.1f}us'
+            f'  total {sum(amostras):.2f}s'
+        )
+
+    def executar(self, revogados, verificacoes, **options):
+        expira_em = timezone.now() + timezone.timedelta(hours=1)
+        TokenRevogado.objects.bulk_create(
+            (TokenRevogado(jti=uuid.uuid4().hex, motivo='bench', expira_em=expira_em)
+             for _ in range(revogados)),
+            batch_size=5000
+        )
+
+        inicio = time.perf_counter()
+        revogacao.atualizar(forcar=True)
+        filtro = revogacao._estado['filtro']
+        self.stdout.write(
+            f'Filter of {revogados} jtis built in {time.perf_counter() - inicio:.2f}s: '
+            f'{len(filtro.vetor) / 1024:.0f}KiB, {filtro.funcoes} hashes'
+        )
+
+        validos = [uuid.uuid4().hex for _ in range(verificacoes)]
+        consultas = 0
+
+        def contar(execute, sql, params, many, context):
+            nonlocal consultas
+            consultas += 1
+            return execute(sql, params, many, context)
+
+        self.medir('database', lambda jti: TokenRevogado.objects.filter(jti=jti).exists(), validos)
+        with connection.execute_wrapper(contar):
+            self.medir('bloom', revogacao.revogado, validos)
+        self.stdout.write(
+            f'Queries during the bloom run: {consultas} for {verificacoes} checks '
+            f'({consultas / verificacoes:.3%}, false positives and refreshes)'
+        )
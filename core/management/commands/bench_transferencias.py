@@ -0,0 +1,123 @@
+"""
+Django command to benchmark concurrent transfers between hot accounts.
+"""
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from core import services
+from core.benchmark import banco_descartavel, executar_concorrente
+from core.management.commands.liquidar_transferencias import liquidar
+from core.models import Conta, Transferencia, TransferenciaPendente, User
+
+
+def transferir_legado(from_account_id, to_account_id, valor):
+    """Read-modify-write transfer, as the views used to do it."""
+    from_account = Conta.objects.get(pk=from_account_id)
+    to_account = Conta.objects.get(pk=to_account_id)
+    if not (from_account.saldo > 0 and from_account.saldo > valor):
+        raise services.SaldoInsuficiente
+
+    from_account.saldo -= valor
+    to_account.saldo += valor
+    from_account.save()
+    to_account.save()
+
+    return Transferencia.objects.create(
+        from_account=from_account,
+        to_account=to_account,
+        value=valor
+    )
+
+
+class Command(BaseCommand):
+    """Measure transfers/s and balance drift under concurrent writers.
+
+    In the async mode the writers only queue the transfers, as the API does
+    for Prefer: respond-async, and --liquidantes worker threads settle the
+    queue afterwards; both rates are reported.
+    """
+
+    help = 'Benchmark concurrent transfers on a throwaway test database.'
+
+    modos = {
+        'servico': services.transferir,
+        'legado': transferir_legado,
+        'async': services.agendar_transferencia,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escritores', type=int, default=50)
+        parser.add_argument('--contas', type=int, default=4,
+                            help='Number of hot accounts shared by every writer.')
+        parser.add_argument('--transferencias', type=int, default=40,
+                            help='Transfers attempted by each writer.')
+        parser.add_argument('--valor', type=Decimal, default=Decimal('1.00'))
+        parser.add_argument('--saldo-inicial', type=Decimal, default=Decimal('1000.00'))
+        parser.add_argument('--modo', choices=sorted(self.modos), default='servico')
+        parser.add_argument('--liquidantes', type=int, default=4,
+                            help='Worker threads settling the queue in the async mode.')
+        parser.add_argument('--lote', type=int, default=100,
+                            help='Pending transfers claimed per transaction in the async mode.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with banco_descartavel():
+            self.executar(**options)
+
+    def executar(self, escritores, contas, transferencias, valor, saldo_inicial, modo,
+                 liquidantes, lote, **options):
+        user = User.objects.create(email='bench@easypay.local', cpf='00000000000')
+        ids = [
+            Conta.objects.create(user=user, agencia='0001', numero=f'{n:08d}', saldo=saldo_inicial).pk
+            for n in range(contas)
+        ]
+        transferir = self.modos[modo]
+        recusadas = []
+
+        def escritor(indice):
+            sorteio = random.Random(indice)
+            for _ in range(transferencias):
+                from_id, to_id = sorteio.sample(ids, 2)
+                try:
+                    transferir(from_id, to_id, valor)
+                except services.SaldoInsuficiente:
+                    recusadas.append(indice)
+
+        self.stdout.write(
+            f'{escritores} writers x {transferencias} transfers on {contas} hot accounts ({modo})'
+        )
+        duracao, erros = executar_concorrente(escritores, escritor)
+
+        if modo == 'async':
+            aceitas = TransferenciaPendente.objects.count()
+            self.stdout.write(f'Accepted: {aceitas / duracao:.1f} transfers/s in {duracao:.2f}s')
+            liquidacao, falhas = executar_concorrente(liquidantes, lambda indice: liquidar(lote))
+            erros += falhas
+            recusadas = TransferenciaPendente.objects.filter(status=TransferenciaPendente.RECUSADA)
+            self.stdout.write(
+                f'Settled by {liquidantes} workers: {aceitas / liquidacao:.1f} transfers/s '
+                f'in {liquidacao:.2f}s'
+            )
+            duracao += liquidacao
+
+        concluidas = Transferencia.objects.count()
+        drift = Decimal('0')
+        for conta in Conta.objects.filter(pk__in=ids):
+            saidas = Transferencia.objects.filter(from_account=conta).aggregate(
+                total=Sum('value'))['total'] or 0
+            entradas = Transferencia.objects.filter(to_account=conta).aggregate(
+                total=Sum('value'))['total'] or 0
+            drift += abs(saldo_inicial - saidas + entradas - conta.saldo)
+
+        self.stdout.write(f'Transfers committed: {concluidas}')
+        self.stdout.write(f'Transfers refused (saldo insuficiente): {len(recusadas)}')
+        self.stdout.write(f'Errors: {len(erros)}')
+        for erro in erros[:5]:
+            self.stdout.write(f'  {erro!r}')
+        self.stdout.write(f'Throughput: {concluidas / duracao:.1f} transfers/s in {duracao:.2f}s')
+
+        estilo = self.style.SUCCESS if drift == 0 else self.style.ERROR
+        self.stdout.write(estilo(f'Balance drift: {drift}'))
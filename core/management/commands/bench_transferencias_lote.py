@@ -0,0 +1,82 @@
+"""
+Django command to benchmark the batch transfer endpoint against single transfers.
+"""
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIClient
+
+from core import services
+from core.benchmark import banco_descartavel
+from core.models import Conta, Transferencia, User
+
+
+class Command(BaseCommand):
+    """Compare N POST /transferencias/ calls with POST /transferencias/batch/."""
+
+    help = 'Benchmark batch transfers against the single-transfer path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transferencias', type=int, default=1000)
+        parser.add_argument('--destinos', type=int, default=100,
+                            help='Number of receiving accounts.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with banco_descartavel():
+            self.executar(**options)
+
+    def executar(self, transferencias, destinos, **options):
+        pagador = User.objects.create(email='pagador@easypay.local', cpf='00000000000')
+        origem = Conta.objects.create(user=pagador, agencia='0001', numero='00000000', saldo=0)
+        services.depositar(origem.pk, Decimal('10000000.00'))
+        recebedor = User.objects.create(email='recebedor@easypay.local', cpf='00000000001')
+        ids = [
+            Conta.objects.create(user=recebedor, agencia='0001', numero=f'{n + 1:08d}', saldo=0).pk
+            for n in range(destinos)
+        ]
+        itens = [
+            {'to_account_id': ids[n % destinos], 'value': '1.00'}
+            for n in range(transferencias)
+        ]
+
+        client = APIClient()
+        client.force_authenticate(pagador)
+
+        def individual():
+            for item in itens:
+                client.post('/api/v1/transferencias/', item, format='json')
+
+        def lote():
+            limite = settings.TRANSFERENCIAS_LOTE_MAXIMO
+            for inicio in range(0, len(itens), limite):
+                client.post('/api/v1/transferencias/batch/',
+                            {'transferencias': itens[inicio:inicio + limite]}, format='json')
+
+        consultas = []
+
+        def contar(execute, sql, params, many, context):
+            consultas.append(sql)
+            return execute(sql, params, many, context)
+
+        self.stdout.write(f'{transferencias} transfers from 1 account to {destinos} accounts')
+        for nome, caminho in (('single', individual), ('batch', lote)):
+            antes = Transferencia.objects.count()
+            consultas.clear()
+            with connection.execute_wrapper(contar):
+                inicio = time.perf_counter()
+                caminho()
+                duracao = time.perf_counter() - inicio
+            concluidas = Transferencia.objects.count() - antes
+            self.stdout.write(
+                f'{nome:>6}: {concluidas} transfers in {duracao:.2f}s, '
+                f'{concluidas / duracao:.1f} transfers/s, {len(consultas)} queries'
+            )
+
+        origem.refresh_from_db()
+        self.stdout.write(f'Saldo final da origem: {origem.saldo}')
+        call_command('conferir_razao', stdout=self.stdout)
@@ -0,0 +1,46 @@
+"""
+Django command to check Conta.saldo against the ledger.
+"""
+from decimal import Decimal
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from core.models import Conta, Lancamento
+
+
+class Command(BaseCommand):
+    """Report contas whose materialized saldo disagrees with their lançamentos."""
+
+    help = 'Compare Conta.saldo with the sum of its lançamentos.'
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Entrypoint for command."""
+        totais = Lancamento.objects.filter(conta__isnull=False).values('conta').annotate(
+            creditos=Sum('valor', filter=Q(natureza=Lancamento.CREDITO)),
+            debitos=Sum('valor', filter=Q(natureza=Lancamento.DEBITO)),
+        )
+        esperado = {
+            total['conta']: (total['creditos'] or 0) - (total['debitos'] or 0)
+            for total in totais.iterator()
+        }
+
+        divergentes = 0
+        for conta_id, saldo in Conta.objects.values_list('id', 'saldo').iterator():
+            saldo_razao = esperado.get(conta_id, Decimal('0'))
+            if saldo != saldo_razao:
+                divergentes += 1
+                self.stdout.write(f'Conta {conta_id}: saldo {saldo} != razão {saldo_razao}')
+
+        desbalanceados = Lancamento.objects.values('movimento').annotate(
+            creditos=Coalesce(Sum('valor', filter=Q(natureza=Lancamento.CREDITO)), Value(Decimal('0'))),
+            debitos=Coalesce(Sum('valor', filter=Q(natureza=Lancamento.DEBITO)), Value(Decimal('0'))),
+        ).exclude(creditos=F('debitos')).count()
+
+        if divergentes or desbalanceados:
+            raise CommandError(
+                f'{divergentes} contas divergentes, {desbalanceados} movimentos desbalanceados')
+
+        self.stdout.write(self.style.SUCCESS('Razão conferido!'))
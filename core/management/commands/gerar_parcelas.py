@@ -0,0 +1,64 @@
+"""
+Django command to create the installments of approved loans that have none.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from core import amortizacao
+from core.models import Emprestimo, ParcelaEmprestimo
+
+
+class Command(BaseCommand):
+    """Generate installment schedules in chunks of approved loans.
+
+    Each chunk is claimed with FOR UPDATE SKIP LOCKED, so overlapping runs
+    split the work instead of scheduling the same loans twice.
+    """
+
+    help = 'Create the ParcelaEmprestimo rows of approved loans without installments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000,
+                            help='Loans scheduled per transaction.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        pendentes = (
+            Emprestimo.objects
+            .filter(status='Aprovado')
+            .filter(~Exists(ParcelaEmprestimo.objects.filter(emprestimo=OuterRef('pk'))))
+            .order_by('pk')
+        )
+
+        inicio = time.perf_counter()
+        emprestimos = parcelas = 0
+        ultimo = 0
+        while True:
+            with transaction.atomic():
+                # Loans claimed by an overlapping run are skipped, not waited on.
+                lote = list(
+                    pendentes.filter(pk__gt=ultimo)
+                    .select_for_update(skip_locked=True)[:options['lote']]
+                )
+                if not lote:
+                    break
+                ultimo = lote[-1].pk
+
+                # A run that committed after this query started was not seen by
+                # its Exists check, so look again now that the rows are locked.
+                agendados = set(
+                    ParcelaEmprestimo.objects.filter(emprestimo__in=lote)
+                    .values_list('emprestimo_id', flat=True)
+                )
+                lote = [emprestimo for emprestimo in lote if emprestimo.pk not in agendados]
+
+                parcelas += amortizacao.criar_parcelas(lote)
+                emprestimos += len(lote)
+
+        decorrido = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{parcelas} parcelas de {emprestimos} empréstimos criadas em {decorrido:.2f}s'
+        ))
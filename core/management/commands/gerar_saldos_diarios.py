@@ -0,0 +1,23 @@
+"""
+Django command to snapshot end-of-day balances.
+"""
+from django.core.management.base import BaseCommand
+
+from core.saldos import gerar_saldos_diarios
+
+
+class Command(BaseCommand):
+    """Write SaldoDiario rows for the closed days not snapshotted yet."""
+
+    help = 'Snapshot the end-of-day saldo of every conta that moved.'
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        dias = saldos = 0
+        for data, escritos in gerar_saldos_diarios():
+            dias += 1
+            saldos += escritos
+            if escritos and options['verbosity'] > 1:
+                self.stdout.write(f'{data}: {escritos} saldos')
+
+        self.stdout.write(self.style.SUCCESS(f'{saldos} saldos diários em {dias} dias'))
@@ -0,0 +1,33 @@
+"""
+Django command to evict expired Idempotency-Key responses.
+"""
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ChaveIdempotencia
+
+
+class Command(BaseCommand):
+    """Delete stored responses whose TTL has passed, in chunks."""
+
+    help = 'Delete expired Idempotency-Key rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000)
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Entrypoint for command."""
+        agora = timezone.now()
+        removidas = 0
+        while True:
+            ids = list(
+                ChaveIdempotencia.objects.filter(expira_em__lte=agora)
+                .values_list('id', flat=True)[:options['lote']]
+            )
+            if not ids:
+                break
+            removidas += ChaveIdempotencia.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'{removidas} chaves expiradas removidas'))
@@ -0,0 +1,74 @@
+"""
+Django command to settle transfers queued with Prefer: respond-async.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from core import services
+
+
+def liquidar(lote, continuo=False, intervalo=1.0):
+    """Settle pending transfers until none is left, or forever if continuo."""
+    liquidadas = 0
+    while True:
+        quantidade = services.liquidar_transferencias(lote)
+        liquidadas += quantidade
+        if quantidade:
+            continue
+        if not continuo:
+            return liquidadas
+        time.sleep(intervalo)
+
+
+def _liquidar(lote, continuo, intervalo):
+    """Run a worker loop in its own process, on its own connection."""
+    try:
+        return liquidar(lote, continuo, intervalo)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """Claim pending transfers in batches and settle them.
+
+    Batches are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any
+    number of these commands, and of --processos inside one, can run
+    side by side.
+    """
+
+    help = 'Settle the transfers waiting in TransferenciaPendente.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type=int, default=1)
+        parser.add_argument('--lote', type=int, default=settings.TRANSFERENCIAS_PENDENTES_LOTE,
+                            help='Pending transfers claimed per transaction.')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Keep polling for new transfers instead of exiting once drained.')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Seconds to wait between polls of an empty queue.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        argumentos = (options['lote'], options['continuo'], options['intervalo'])
+
+        inicio = time.perf_counter()
+        if options['processos'] > 1:
+            # Forked workers must not share the parent's connection.
+            connections.close_all()
+            contexto = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=options['processos'], mp_context=contexto) as pool:
+                tarefas = [pool.submit(_liquidar, *argumentos) for _ in range(options['processos'])]
+                liquidadas = sum(tarefa.result() for tarefa in tarefas)
+        else:
+            liquidadas = liquidar(*argumentos)
+        decorrido = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{liquidadas} transferências liquidadas em {decorrido:.2f}s '
+            f'({liquidadas / max(decorrido, 1e-9):,.0f} transferências/s)'
+        ))
@@ -0,0 +1,83 @@
+"""
+Django command to accrue late fees and interest on overdue installments.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core import inadimplencia
+from core.models import Checkpoint
+
+
+def _processar(checkpoint_id, data, lote):
+    """Run one partition in a worker process, on its own connection."""
+    try:
+        return inadimplencia.processar_particao(checkpoint_id, data, lote)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """Walk the installment book in id ranges, split across processes.
+
+    Progress is checkpointed per chunk, so running the command again for
+    the same date resumes an interrupted run.
+    """
+
+    help = 'Mark overdue installments and accrue their late fee and interest.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Reference date (AAAA-MM-DD), today by default.')
+        parser.add_argument('--processos', type=int, default=1)
+        parser.add_argument('--lote', type=int, default=10000,
+                            help='Installment ids updated per transaction.')
+        parser.add_argument('--reiniciar', action='store_true',
+                            help='Forget the checkpoints of the date and start over.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        data = parse_date(options['data']) if options['data'] else timezone.localdate()
+        if data is None:
+            raise CommandError('Data inválida, use AAAA-MM-DD.')
+
+        if options['reiniciar']:
+            Checkpoint.objects.filter(job=inadimplencia.JOB, referencia=data.isoformat()).delete()
+
+        checkpoints = [
+            checkpoint
+            for checkpoint in inadimplencia.particionar(data, options['processos'])
+            if not checkpoint.concluido
+        ]
+        pendentes = [checkpoint.pk for checkpoint in checkpoints]
+        percorridas = sum(checkpoint.fim_id - checkpoint.ultimo_id for checkpoint in checkpoints)
+
+        inicio = time.perf_counter()
+        if options['processos'] > 1 and len(pendentes) > 1:
+            atualizadas = self.em_paralelo(pendentes, data, options)
+        else:
+            atualizadas = sum(
+                inadimplencia.processar_particao(checkpoint_id, data, options['lote'])
+                for checkpoint_id in pendentes
+            )
+        decorrido = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{atualizadas} parcelas atualizadas, {percorridas} ids percorridos em '
+            f'{decorrido:.2f}s ({percorridas / max(decorrido, 1e-9):,.0f} linhas/s)'
+        ))
+
+    def em_paralelo(self, pendentes, data, options):
+        # Forked workers must not share the parent's connection.
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=options['processos'], mp_context=contexto) as pool:
+            tarefas = [
+                pool.submit(_processar, checkpoint_id, data, options['lote'])
+                for checkpoint_id in pendentes
+            ]
+            return sum(tarefa.result() for tarefa in as_completed(tarefas))
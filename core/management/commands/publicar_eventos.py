@@ -0,0 +1,49 @@
+"""
+Django command to relay outbox events to the configured sink.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    """Publish outbox events in id order, resuming from the last published one."""
+
+    help = 'Publish the pending outbox events to settings.EVENTOS_DESTINO.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.EVENTOS_LOTE,
+                            help='Events handed to the sink at once.')
+        parser.add_argument('--destino', help='Sink class path, settings.EVENTOS_DESTINO by default.')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Keep polling for new events instead of exiting once caught up.')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Seconds to wait between polls once caught up.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['destino']:
+            destino = import_string(options['destino'])()
+        else:
+            destino = outbox.destino_configurado()
+
+        publicados = 0
+        inicio = time.perf_counter()
+        while True:
+            quantidade = outbox.publicar(destino, options['lote'])
+            publicados += quantidade
+            if quantidade:
+                continue
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
+        decorrido = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{publicados} eventos publicados em {decorrido:.2f}s '
+            f'({publicados / max(decorrido, 1e-9):,.0f} eventos/s)'
+        ))
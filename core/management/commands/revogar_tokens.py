@@ -0,0 +1,35 @@
+"""
+Django command to revoke JWTs by jti and evict expired revocations.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import revogacao
+from core.models import TokenRevogado
+
+
+class Command(BaseCommand):
+    """Revoke the given jtis, e.g. after a fraud event."""
+
+    help = 'Revoke JWTs by jti and delete revocations of expired tokens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('jtis', nargs='*')
+        parser.add_argument('--motivo', default='fraude')
+        parser.add_argument('--limpar', action='store_true',
+                            help='Also delete revocations whose tokens have expired.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['jtis']:
+            # The token itself is not at hand, so keep the revocation for as
+            # long as any token could live.
+            vida = max(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'],
+                       settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'])
+            revogacao.revogar_jtis(options['jtis'], timezone.now() + vida, options['motivo'])
+            self.stdout.write(self.style.SUCCESS(f"{len(options['jtis'])} tokens revogados"))
+
+        if options['limpar']:
+            removidos, _ = TokenRevogado.objects.filter(expira_em__lte=timezone.now()).delete()
+            self.stdout.write(self.style.SUCCESS(f'{removidos} revogações expiradas removidas'))
@@ -1,69 +1,93 @@
-from django.utils import timezone
-from core.models import User
-from django.http import JsonResponse
-from rest_framework import status
+import json
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import JsonResponse, QueryDict
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import JsonResponse
 from rest_framework import status
-from django.core.handlers.wsgi import WSGIRequest
-import json
+
+from core import bloqueio
+
 
 class LoginAttemptMiddleware:
+    """Lock an email out of /api/token/ after repeated failed logins.
+
+    Only POSTs to the token path are inspected; every other request goes
+    straight to the view without its body being read. A locked email is
+    refused before the view runs, so no password is hashed for it.
+
+    The middleware runs sync or async, like the chain around it, so the
+    async views are not pushed through a thread by it.
+    """
+    path = '/api/token/'
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request: WSGIRequest):
-        # Armazena o corpo da solicitação antes de ler de request.POST ou request.data
-        body = request.body
-
-        response = self.get_response(request)
-
-        if request.path == '/api/token/':
-            # Verifica o tipo de conteúdo da solicitação
-            content_type = request.headers.get('Content-Type', '').lower()
-
-            if 'application/json' in content_type:
-                # Se o tipo de conteúdo for JSON
-                try:
-                    data = json.loads(body.decode('utf-8'))
-                    email = data.get('email')
-                except json.JSONDecodeError:
-                    email = None
-            elif 'application/x-www-form-urlencoded' in content_type:
-                # Se o tipo de conteúdo for formulário
-                email = request.POST.get('email')
-            else:
-                email = None
-
-            if email:
-                user = User.objects.filter(email=email).first()
-
-                if user and response.status_code == status.HTTP_401_UNAUTHORIZED:
-                    
-                    user.login_attempts += 1
-                    user.save()
-
-                    if user.login_attempts >= 3:
-                        user.locked_at = timezone.now()
-                        user.unlocked_at = timezone.now() + timezone.timedelta(minutes=15)
-                        user.save()
-
-                        return JsonResponse(
-                            {'detail': 'Sua conta foi bloqueada. Tente novamente após 15 minutos.'},
-                            status=status.HTTP_401_UNAUTHORIZED
-                        )
-
-                if user and user.login_attempts >= 3 and user.locked_at != None and user.unlocked_at != None and status.HTTP_200_OK:
-                    
-                    if timezone.now() >= user.unlocked_at:
-                        user.login_attempts = 0
-                        user.locked_at = None
-                        user.unlocked_at = None
-                        user.save()
-                    else:
-                        return JsonResponse(
-                            {'detail': 'Sua conta foi bloqueada. Tente novamente mais tarde.'},
-                            status=status.HTTP_401_UNAUTHORIZED
-                        )
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not self.inspecionar(request):
+            return self.get_response(request)
+
+        email = self.email(request)
+        if email and bloqueio.bloqueado(email):
+            return self.bloqueado()
+
+        return self.registrar(email, self.get_response(request))
+
+    async def __acall__(self, request):
+        if not self.inspecionar(request):
+            return await self.get_response(request)
+
+        email = self.email(request)
+        if email and await sync_to_async(bloqueio.bloqueado)(email):
+            return self.bloqueado()
+
+        response = await self.get_response(request)
+        return await sync_to_async(self.registrar)(email, response)
+
+    def inspecionar(self, request):
+        """Return whether request is a login attempt."""
+        return request.path == self.path and request.method == 'POST'
+
+    def bloqueado(self):
+        return JsonResponse(
+            {'detail': 'Sua conta foi bloqueada. Tente novamente mais tarde.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    def registrar(self, email, response):
+        """Count a failed login or clear the failures after a successful one."""
+        if email:
+            if response.status_code == status.HTTP_401_UNAUTHORIZED:
+                if bloqueio.registrar_falha(email):
+                    return JsonResponse(
+                        {'detail': 'Sua conta foi bloqueada. Tente novamente após 15 minutos.'},
+                        status=status.HTTP_401_UNAUTHORIZED
+                    )
+            elif response.status_code == status.HTTP_200_OK:
+                bloqueio.limpar(email)
 
         return response
+
+    def email(self, request):
+        """Return the email sent to the token view, if any."""
+        content_type = request.headers.get('Content-Type', '').lower()
+
+        if 'application/json' in content_type:
+            try:
+                data = json.loads(request.body.decode('utf-8'))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                return None
+            email = data.get('email') if isinstance(data, dict) else None
+        elif 'application/x-www-form-urlencoded' in content_type:
+            email = QueryDict(request.body, encoding=request.encoding).get('email')
+        else:
+            return None
+
+        return email if isinstance(email, str) and email else None
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+def lancar_saldos_abertura(apps, schema_editor):
+    """Record the current saldo of every conta as its opening movement."""
+    Conta = apps.get_model('core', 'Conta')
+    Lancamento = apps.get_model('core', 'Lancamento')
+
+    lancamentos = []
+    for conta_id, saldo in Conta.objects.exclude(saldo=0).values_list('id', 'saldo').iterator():
+        movimento = uuid.uuid4()
+        natureza_conta, natureza_sistema = ('C', 'D') if saldo > 0 else ('D', 'C')
+        lancamentos += [
+            Lancamento(movimento=movimento, tipo='Saldo Abertura', natureza=natureza_conta,
+                       valor=abs(saldo), conta_id=conta_id),
+            Lancamento(movimento=movimento, tipo='Saldo Abertura', natureza=natureza_sistema,
+                       valor=abs(saldo), conta_sistema='saldo_abertura'),
+        ]
+
+    Lancamento.objects.bulk_create(lancamentos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_extrato'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lancamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movimento', models.UUIDField(db_index=True)),
+                ('tipo', models.CharField(max_length=255)),
+                ('natureza', models.CharField(choices=[('D', 'Débito'), ('C', 'Crédito')], max_length=1)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('conta_sistema', models.CharField(blank=True, max_length=50)),
+                ('origem_tipo', models.CharField(blank=True, max_length=50)),
+                ('origem_id', models.BigIntegerField(null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conta', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='lancamentos', to='core.conta')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['conta', 'id'], name='core_lancam_conta_i_0d7cdf_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='lancamento',
+            constraint=models.CheckConstraint(check=models.Q(('valor__gt', 0)), name='lancamento_valor_positivo'),
+        ),
+        migrations.AddConstraint(
+            model_name='lancamento',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('conta__isnull', False), ('conta_sistema', '')), models.Q(('conta__isnull', True), models.Q(('conta_sistema', ''), _negated=True)), _connector='OR'), name='lancamento_conta_ou_sistema'),
+        ),
+        migrations.RunPython(lancar_saldos_abertura, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_chaveidempotencia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cartao',
+            name='numero',
+            field=models.CharField(max_length=16, unique=True),
+        ),
+        migrations.RunSQL(
+            'CREATE SEQUENCE IF NOT EXISTS core_cartao_numero_seq',
+            'DROP SEQUENCE IF EXISTS core_cartao_numero_seq',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+def _digito_luhn(numero):
+    soma = 0
+    for posicao, digito in enumerate(reversed(numero)):
+        valor = int(digito)
+        if posicao % 2 == 0:
+            valor *= 2
+            if valor > 9:
+                valor -= 9
+        soma += valor
+    return str((10 - soma % 10) % 10)
+
+
+def renumerar_duplicadas(apps, schema_editor):
+    """Give a new numero to every conta sharing (agencia, numero) with an older one."""
+    Conta = apps.get_model('core', 'Conta')
+    repetidos = Conta.objects.values('agencia', 'numero').annotate(
+        total=models.Count('id')).filter(total__gt=1)
+
+    with schema_editor.connection.cursor() as cursor:
+        for repetido in repetidos:
+            contas = Conta.objects.filter(
+                agencia=repetido['agencia'], numero=repetido['numero']).order_by('id')[1:]
+            for conta in contas:
+                while Conta.objects.filter(agencia=conta.agencia, numero=conta.numero).exists():
+                    cursor.execute("SELECT nextval('core_conta_numero_seq')")
+                    parcial = f'{cursor.fetchone()[0]:07d}'
+                    conta.numero = parcial + _digito_luhn(parcial)
+                conta.save(update_fields=['numero'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_cartao_numero_unico'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE SEQUENCE IF NOT EXISTS core_conta_numero_seq INCREMENT BY 100',
+            'DROP SEQUENCE IF EXISTS core_conta_numero_seq',
+        ),
+        migrations.RunPython(renumerar_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='conta',
+            constraint=models.UniqueConstraint(fields=('agencia', 'numero'), name='conta_agencia_numero_unico'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_conta_agencia_numero_unico'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cartaogasto',
+            index=models.Index(fields=['cartao', 'id'], name='core_cartao_cartao__5b17c9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extrato',
+            index=models.Index(fields=['conta', 'id'], name='core_extrat_conta_i_eb4f4a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(fields=['from_account', 'id'], name='core_transf_from_ac_78c9e4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(fields=['to_account', 'id'], name='core_transf_to_acco_a2b29e_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_historico_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cartaogasto',
+            index=models.Index(fields=['cartao', 'created_at'], name='core_cartao_cartao__dc830e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extrato',
+            index=models.Index(fields=['conta', 'created_at'], name='core_extrat_conta_i_a38eb6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(fields=['from_account', 'created_at'], name='core_transf_from_ac_b1b50c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(fields=['to_account', 'created_at'], name='core_transf_to_acco_3e99b1_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def somar_ciclos(apps, schema_editor):
+    """Fill the cycle counters from the gastos already recorded."""
+    CartaoGasto = apps.get_model('core', 'CartaoGasto')
+    GastoCiclo = apps.get_model('core', 'GastoCiclo')
+
+    ciclos = (
+        CartaoGasto.objects
+        .annotate(mes=TruncMonth('created_at'))
+        .values('cartao_id', 'mes')
+        .annotate(total=Sum('valor'))
+        .order_by()
+    )
+    GastoCiclo.objects.bulk_create(
+        (GastoCiclo(cartao_id=c['cartao_id'], ciclo=c['mes'].date(), total=c['total'])
+         for c in ciclos.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_historico_periodo_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GastoCiclo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ciclo', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cartao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ciclos', to='core.cartao')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='gastociclo',
+            constraint=models.UniqueConstraint(fields=('cartao', 'ciclo'), name='gasto_ciclo_unico'),
+        ),
+        migrations.RunPython(somar_ciclos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.6 on 2026-10-18 15:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_gastociclo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='lancamento',
+            index=models.Index(fields=['conta', 'created_at'], name='core_lancam_conta_i_a00e8b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamento',
+            index=models.Index(fields=['created_at'], name='core_lancam_created_067795_idx'),
+        ),
+        migrations.AddField(
+            model_name='saldodiario',
+            name='conta',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_diarios', to='core.conta'),
+        ),
+        migrations.AddConstraint(
+            model_name='saldodiario',
+            constraint=models.UniqueConstraint(fields=('conta', 'data'), name='saldo_diario_unico'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_tokenrevogado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('status', 'Aprovado'), _negated=True), fields=['created_at'], name='user_pendente_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.6 on 2026-10-18 16:11
+
+from decimal import Decimal
+
+import core.models
+from django.db import migrations, models
+
+
+def taxa_implicita(parcelas, fator=1.8):
+    """Monthly rate whose Price schedule repays fator times the principal."""
+    baixa, alta = 0.0, 1.0
+    for _ in range(100):
+        taxa = (baixa + alta) / 2
+        total = parcelas * taxa / (1 - (1 + taxa) ** -parcelas)
+        if total < fator:
+            baixa = taxa
+        else:
+            alta = taxa
+    return Decimal(taxa).quantize(Decimal('0.00000001'))
+
+
+def preencher_taxas(apps, schema_editor):
+    """Give legacy loans the rate implied by their 1.8x total."""
+    Emprestimo = apps.get_model('core', 'Emprestimo')
+
+    prazos = Emprestimo.objects.values_list('qtd_parcelas', flat=True).distinct().order_by()
+    for parcelas in prazos:
+        taxa = taxa_implicita(parcelas) if parcelas > 1 else Decimal('0.8')
+        Emprestimo.objects.filter(qtd_parcelas=parcelas).update(taxa_juros=taxa)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_user_pendente_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emprestimo',
+            name='sistema_amortizacao',
+            field=models.CharField(choices=[('Price', 'Price'), ('SAC', 'SAC')], default='Price', max_length=5),
+        ),
+        migrations.AddField(
+            model_name='emprestimo',
+            name='taxa_juros',
+            field=models.DecimalField(decimal_places=8, default=core.models.taxa_emprestimo_padrao, max_digits=9),
+        ),
+        migrations.AddField(
+            model_name='parcelaemprestimo',
+            name='amortizacao',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='parcelaemprestimo',
+            name='juros',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddConstraint(
+            model_name='parcelaemprestimo',
+            constraint=models.UniqueConstraint(fields=('emprestimo', 'numParcela'), name='parcela_emprestimo_unica'),
+        ),
+        migrations.RunPython(preencher_taxas, migrations.RunPython.noop),
+    ]
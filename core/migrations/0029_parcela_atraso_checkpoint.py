@@ -0,0 +1,59 @@
+# Generated by Django 4.2.6 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+def marcar_pagas(apps, schema_editor):
+    """Installments with a payment date are paid."""
+    ParcelaEmprestimo = apps.get_model('core', 'ParcelaEmprestimo')
+    ParcelaEmprestimo.objects.filter(dataPaga__isnull=False).update(status='Paga')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_emprestimo_amortizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Checkpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100)),
+                ('referencia', models.CharField(blank=True, default='', max_length=50)),
+                ('particao', models.PositiveIntegerField(default=0)),
+                ('inicio_id', models.BigIntegerField(default=0)),
+                ('fim_id', models.BigIntegerField(null=True)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('linhas', models.BigIntegerField(default=0)),
+                ('concluido', models.BooleanField(default=False)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='parcelaemprestimo',
+            name='dias_atraso',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='parcelaemprestimo',
+            name='juros_mora',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='parcelaemprestimo',
+            name='multa',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='parcelaemprestimo',
+            name='status',
+            field=models.CharField(choices=[('Em Aberto', 'Em Aberto'), ('Vencida', 'Vencida'), ('Paga', 'Paga')], default='Em Aberto', max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='checkpoint',
+            constraint=models.UniqueConstraint(fields=('job', 'referencia', 'particao'), name='checkpoint_unico'),
+        ),
+        migrations.RunPython(marcar_pagas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.6 on 2026-10-18 16:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_parcela_atraso_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emprestimo',
+            name='pontuacao_credito',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.CreateModel(
+            name='PerfilCredito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entradas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('saidas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('movimentos', models.PositiveIntegerField(default=0)),
+                ('soma_saldos', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('dias_saldo', models.PositiveIntegerField(default=0)),
+                ('gastos_cartao', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('utilizacao_cartao', models.DecimalField(decimal_places=4, default=0, max_digits=7)),
+                ('atualizado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='perfil_credito', to='core.conta')),
+            ],
+        ),
+    ]
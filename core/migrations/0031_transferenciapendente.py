@@ -0,0 +1,32 @@
+# Generated by Django 4.2.6 on 2026-10-18 16:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_perfilcredito'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransferenciaPendente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('Pendente', 'Pendente'), ('Concluida', 'Concluida'), ('Recusada', 'Recusada')], default='Pendente', max_length=20)),
+                ('motivo', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processada_em', models.DateTimeField(null=True)),
+                ('from_account', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.conta')),
+                ('to_account', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.conta')),
+                ('transferencia', models.OneToOneField(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.transferencia')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['from_account', 'id'], name='core_transf_from_ac_7d93c1_idx'), models.Index(condition=models.Q(('status', 'Pendente')), fields=['id'], name='transferencia_pendente_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.6 on 2026-10-18 16:36
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_transferenciapendente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Evento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movimento', models.UUIDField()),
+                ('tipo', models.CharField(max_length=50)),
+                ('origem_tipo', models.CharField(blank=True, default='', max_length=50)),
+                ('origem_id', models.BigIntegerField(null=True)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_evento'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='perfilcredito',
+            name='utilizacao_cartao',
+        ),
+    ]
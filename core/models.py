@@ -8,6 +8,7 @@ from django.contrib.auth.models import (AbstractBaseUser,
                                         BaseUserManager,
                                         PermissionsMixin)
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
 
@@ -57,10 +58,65 @@ class Transferencia(models.Model):
     )
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['from_account', 'id']),
+            models.Index(fields=['to_account', 'id']),
+            models.Index(fields=['from_account', 'created_at']),
+            models.Index(fields=['to_account', 'created_at']),
+        ]
+
     def __str__(self) -> str:
         return self.from_account
 
 
+class TransferenciaPendente(models.Model):
+    """Transfer accepted by the API and waiting to be settled by a worker."""
+    PENDENTE = 'Pendente'
+    CONCLUIDA = 'Concluida'
+    RECUSADA = 'Recusada'
+    STATUS = [
+        (PENDENTE, 'Pendente'),
+        (CONCLUIDA, 'Concluida'),
+        (RECUSADA, 'Recusada'),
+    ]
+
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+    from_account = models.ForeignKey(
+        'core.Conta',
+        on_delete=models.DO_NOTHING,
+        related_name='+'
+    )
+    to_account = models.ForeignKey(
+        'core.Conta',
+        on_delete=models.DO_NOTHING,
+        related_name='+'
+    )
+    status = models.CharField(max_length=20, choices=STATUS, default=PENDENTE)
+    motivo = models.CharField(max_length=100, blank=True, default='')
+    transferencia = models.OneToOneField(
+        Transferencia,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    processada_em = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['from_account', 'id']),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(status='Pendente'),
+                name='transferencia_pendente_idx'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.from_account_id} -> {self.to_account_id} - {self.status}"
+
+
 class Conta(models.Model):
     """Conta para cada um dos clientes"""
     agencia = models.CharField(max_length=4)
@@ -72,6 +128,14 @@ class Conta(models.Model):
     )
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['agencia', 'numero'],
+                name='conta_agencia_numero_unico'
+            ),
+        ]
+
     def __str__(self) -> str:
         return self.agencia
 
@@ -80,7 +144,7 @@ class Cartao(models.Model):
     """Cartão associado a uma conta"""
     nome = models.CharField(max_length=255)
     cvv = models.CharField(max_length=3)
-    numero = models.CharField(max_length=16)
+    numero = models.CharField(max_length=16, unique=True)
     data_exp = models.DateField(null=True)
     limite = models.DecimalField(max_digits=10, decimal_places=2)
     tipo = models.CharField(max_length=255)
@@ -104,7 +168,36 @@ class CartaoGasto(models.Model):
     valor = models.DecimalField(max_digits=10, decimal_places=2)
     nome = models.CharField(max_length=255)
     created_at = models.DateTimeField(default=timezone.now)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cartao', 'id']),
+            models.Index(fields=['cartao', 'created_at']),
+        ]
+
+
+class GastoCiclo(models.Model):
+    """Total spent on a cartão in one billing cycle."""
+    cartao = models.ForeignKey(
+        Cartao,
+        related_name='ciclos',
+        on_delete=models.CASCADE
+    )
+    ciclo = models.DateField()
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cartao', 'ciclo'],
+                name='gasto_ciclo_unico'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.ciclo} - {self.total}"
+
+
 class Extrato(models.Model):
     conta = models.ForeignKey(
         Conta,
@@ -115,7 +208,146 @@ class Extrato(models.Model):
     tipo = models.CharField(max_length=255)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['conta', 'id']),
+            models.Index(fields=['conta', 'created_at']),
+        ]
+
+
+class LancamentoQuerySet(models.QuerySet):
+    """Lançamentos can only be inserted, never changed or removed."""
+
+    def update(self, **kwargs):
+        raise ValueError('Lançamentos são imutáveis')
+
+    def delete(self):
+        raise ValueError('Lançamentos são imutáveis')
+
+
+class Lancamento(models.Model):
+    """Partida de débito ou crédito no razão.
+
+    Each money movement is recorded as a balanced group of lançamentos that
+    share the same movimento. A lançamento belongs either to a customer
+    Conta or to an internal conta_sistema (caixa, cartões, empréstimos).
+    """
+    DEBITO = 'D'
+    CREDITO = 'C'
+    NATUREZAS = [
+        (DEBITO, 'Débito'),
+        (CREDITO, 'Crédito'),
+    ]
+
+    movimento = models.UUIDField(db_index=True)
+    tipo = models.CharField(max_length=255)
+    natureza = models.CharField(max_length=1, choices=NATUREZAS)
+    valor = models.DecimalField(max_digits=10, decimal_places=2)
+    conta = models.ForeignKey(
+        Conta,
+        related_name='lancamentos',
+        on_delete=models.DO_NOTHING,
+        null=True
+    )
+    conta_sistema = models.CharField(max_length=50, blank=True)
+    origem_tipo = models.CharField(max_length=50, blank=True)
+    origem_id = models.BigIntegerField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = LancamentoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['conta', 'id']),
+            models.Index(fields=['conta', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(valor__gt=0),
+                name='lancamento_valor_positivo'
+            ),
+            models.CheckConstraint(
+                check=(
+                    models.Q(conta__isnull=False, conta_sistema='') |
+                    (models.Q(conta__isnull=True) & ~models.Q(conta_sistema=''))
+                ),
+                name='lancamento_conta_ou_sistema'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Lançamentos são imutáveis')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Lançamentos são imutáveis')
+
+    def __str__(self) -> str:
+        return f"{self.natureza} {self.valor} - {self.tipo}"
+
+
+class SaldoDiario(models.Model):
+    """Saldo of a conta at the end of a day it moved."""
+    conta = models.ForeignKey(
+        Conta,
+        related_name='saldos_diarios',
+        on_delete=models.CASCADE
+    )
+    data = models.DateField()
+    saldo = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['conta', 'data'],
+                name='saldo_diario_unico'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.data} - {self.saldo}"
+
+
+class PerfilCredito(models.Model):
+    """Credit features of a conta, kept up to date by core.perfis."""
+    conta = models.OneToOneField(
+        Conta,
+        related_name='perfil_credito',
+        on_delete=models.CASCADE
+    )
+    entradas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    saidas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    movimentos = models.PositiveIntegerField(default=0)
+    soma_saldos = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    dias_saldo = models.PositiveIntegerField(default=0)
+    gastos_cartao = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    atualizado_em = models.DateTimeField(default=timezone.now)
+
+    @property
+    def saldo_medio(self):
+        """Average end-of-day saldo over the days the conta moved."""
+        if not self.dias_saldo:
+            return 0
+        return self.soma_saldos / self.dias_saldo
+
+    def __str__(self) -> str:
+        return f"{self.conta_id} - {self.atualizado_em}"
+
+
+def taxa_emprestimo_padrao():
+    return settings.EMPRESTIMO_TAXA_MENSAL
+
+
 class Emprestimo(models.Model):
+    PRICE = 'Price'
+    SAC = 'SAC'
+    SISTEMAS_AMORTIZACAO = [
+        (PRICE, 'Price'),
+        (SAC, 'SAC'),
+    ]
+
     valorRequisitado = models.DecimalField(max_digits=10, decimal_places=2)
     valorTotal = models.DecimalField(max_digits=10, decimal_places=2)
     data_pedido = models.DateTimeField(default=timezone.now)
@@ -126,26 +358,142 @@ class Emprestimo(models.Model):
         on_delete=models.DO_NOTHING
     )
     status = models.CharField(max_length=255, default='Em Análise')
+    taxa_juros = models.DecimalField(max_digits=9, decimal_places=8,
+                                     default=taxa_emprestimo_padrao)
+    sistema_amortizacao = models.CharField(max_length=5,
+                                           choices=SISTEMAS_AMORTIZACAO,
+                                           default=PRICE)
+    pontuacao_credito = models.IntegerField(null=True)
     
     def __str__(self) -> str:
         return f"{self.data_pedido} - {self.valorTotal}"
     
 
 class ParcelaEmprestimo(models.Model):
+    EM_ABERTO = 'Em Aberto'
+    VENCIDA = 'Vencida'
+    PAGA = 'Paga'
+    STATUS = [
+        (EM_ABERTO, 'Em Aberto'),
+        (VENCIDA, 'Vencida'),
+        (PAGA, 'Paga'),
+    ]
+
     valorParcela = models.DecimalField(max_digits=10, decimal_places=2)
     valorPago = models.DecimalField(max_digits=10, decimal_places=2)
+    amortizacao = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    juros = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     numParcela = models.IntegerField()
     dataVencimento = models.DateField(null=False)
     dataPaga = models.DateField(null=True)
+    status = models.CharField(max_length=20, choices=STATUS, default=EM_ABERTO)
+    dias_atraso = models.PositiveIntegerField(default=0)
+    multa = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    juros_mora = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     emprestimo = models.ForeignKey(
         Emprestimo,
         related_name='emprestimos_parcelas',
         on_delete=models.DO_NOTHING
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['emprestimo', 'numParcela'],
+                name='parcela_emprestimo_unica'
+            ),
+        ]
     
     def __str__(self) -> str:
         return f"{self.valorPago} - {self.valorParcela}"
 
+
+class Evento(models.Model):
+    """Outbox row written in the same transaction as a money movement.
+
+    The publicar_eventos command relays the rows, in id order, to the sink
+    named by settings.EVENTOS_DESTINO.
+    """
+    movimento = models.UUIDField()
+    tipo = models.CharField(max_length=50)
+    origem_tipo = models.CharField(max_length=50, blank=True, default='')
+    origem_id = models.BigIntegerField(null=True)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return f"{self.id} {self.tipo} {self.origem_tipo} #{self.origem_id}"
+
+
+class ChaveIdempotencia(models.Model):
+    """Stored response of a request sent with an Idempotency-Key header."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    chave = models.CharField(max_length=255)
+    assinatura = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    resposta = models.JSONField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'chave'],
+                name='chave_idempotencia_unica'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return self.chave
+
+
+class TokenRevogado(models.Model):
+    """JWT revoked before it expired, identified by its jti."""
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True
+    )
+    motivo = models.CharField(max_length=50)
+    expira_em = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.jti} - {self.motivo}"
+
+
+class Checkpoint(models.Model):
+    """Progress of a resumable batch job over an id range.
+
+    A job split in partitions keeps one row per partition; referencia
+    tells apart runs of the same job, e.g. the business date processed.
+    """
+    job = models.CharField(max_length=100)
+    referencia = models.CharField(max_length=50, blank=True, default='')
+    particao = models.PositiveIntegerField(default=0)
+    inicio_id = models.BigIntegerField(default=0)
+    fim_id = models.BigIntegerField(null=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    linhas = models.BigIntegerField(default=0)
+    concluido = models.BooleanField(default=False)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['job', 'referencia', 'particao'],
+                name='checkpoint_unico'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.job} {self.referencia} #{self.particao} - {self.ultimo_id}"
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """User in the system"""
     email = models.EmailField(max_length=255, unique=True)
@@ -165,5 +513,14 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_at'],
+                condition=~models.Q(status='Aprovado'),
+                name='user_pendente_idx'
+            ),
+        ]
+
     def __str__(self) -> str:
         return self.first_name
@@ -0,0 +1,87 @@
+"""
+Relay of the outbox events to downstream consumers.
+
+core.ledger writes one Evento per money movement in the transaction of the
+movement. publicar reads them forward by id from the position kept in a
+Checkpoint, hands each batch to the configured sink and moves the
+checkpoint, so published rows are never read again. A batch that fails
+after reaching the sink is sent again: delivery is at least once and
+consumers drop repeated ids.
+
+Ids are handed out before the rows commit, so a batch stops at the first
+event younger than settings.EVENTOS_ESPERA: an event with a lower id that
+is still being written has that long to commit before the relay moves
+past it.
+"""
+import itertools
+import json
+import os
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Checkpoint, Evento
+
+
+JOB = 'outbox'
+
+CAMPOS = ['id', 'movimento', 'tipo', 'origem_tipo', 'origem_id', 'payload', 'created_at']
+
+
+class DestinoMemoria:
+    """Keep published events in a list shared by every instance, for tests."""
+
+    publicados = []
+
+    def publicar(self, eventos):
+        self.publicados.extend(eventos)
+
+
+class DestinoArquivo:
+    """Append published events as JSON lines to settings.EVENTOS_ARQUIVO.
+
+    The file is synced before publicar returns, so an event is on disk
+    before the checkpoint moves past it.
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or settings.EVENTOS_ARQUIVO
+
+    def publicar(self, eventos):
+        with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+            for evento in eventos:
+                arquivo.write(json.dumps(evento, cls=DjangoJSONEncoder) + '\n')
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+
+
+def destino_configurado():
+    """Return an instance of the sink named by settings.EVENTOS_DESTINO."""
+    return import_string(settings.EVENTOS_DESTINO)()
+
+
+def publicar(destino, lote=1000):
+    """Hand the next batch of events to destino and return how many.
+
+    The checkpoint row stays locked while the batch is published, so two
+    relays never publish the same events or publish them out of order.
+    """
+    limite = timezone.now() - settings.EVENTOS_ESPERA
+    with transaction.atomic():
+        checkpoint, _ = Checkpoint.objects.select_for_update().get_or_create(job=JOB)
+        eventos = list(itertools.takewhile(
+            lambda evento: evento['created_at'] <= limite,
+            Evento.objects.filter(id__gt=checkpoint.ultimo_id).order_by('id').values(*CAMPOS)[:lote]
+        ))
+        if not eventos:
+            return 0
+
+        destino.publicar(eventos)
+
+        checkpoint.ultimo_id = eventos[-1]['id']
+        checkpoint.linhas += len(eventos)
+        checkpoint.save(update_fields=['ultimo_id', 'linhas', 'atualizado_em'])
+        return len(eventos)
@@ -0,0 +1,141 @@
+"""
+Incremental maintenance of the credit features of each conta.
+
+PerfilCredito holds running totals. Each source table (Extrato,
+Transferencia, CartaoGasto and SaldoDiario) is read forward by id from the
+position kept in its Checkpoint, and each batch is folded into the
+profiles with one INSERT ... ON CONFLICT DO UPDATE, in the same
+transaction that moves the checkpoint. A credit decision then reads one
+row instead of aggregating the history of the conta.
+
+Ids are handed out before the rows commit, so a batch stops at the first
+row younger than MARGEM: a row with a lower id that is still being
+written has that long to commit before the checkpoint moves past it.
+"""
+import datetime
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Cartao, CartaoGasto, Checkpoint, Extrato, PerfilCredito, SaldoDiario, Transferencia
+
+
+JOB = 'perfil_credito'
+MARGEM = datetime.timedelta(seconds=30)
+
+ENTRADAS = ['Deposito']
+SAIDAS = ['Saque', 'Pagamento Emprestimo']
+
+_perfil = PerfilCredito._meta.db_table
+_acumulados = ['entradas', 'saidas', 'movimentos', 'soma_saldos', 'dias_saldo', 'gastos_cartao']
+
+Fonte = namedtuple('Fonte', 'tabela tempo colunas consulta')
+
+# Each consulta aggregates the rows with inicio < id <= fim per conta_id,
+# returning conta_id followed by the increments of its colunas.
+FONTES = {
+    'extrato': Fonte(
+        Extrato._meta.db_table, 'created_at', ['entradas', 'saidas', 'movimentos'], f'''
+        SELECT conta_id,
+               SUM(CASE WHEN tipo = ANY(%(entradas)s) THEN valor ELSE 0 END),
+               SUM(CASE WHEN tipo = ANY(%(saidas)s) THEN valor ELSE 0 END),
+               COUNT(*)
+        FROM {Extrato._meta.db_table}
+        WHERE id > %(inicio)s AND id <= %(fim)s AND tipo = ANY(%(entradas)s || %(saidas)s)
+        GROUP BY conta_id
+    '''),
+    'transferencia': Fonte(
+        Transferencia._meta.db_table, 'created_at', ['entradas', 'saidas', 'movimentos'], f'''
+        SELECT conta_id, SUM(entrada), SUM(saida), COUNT(*)
+        FROM (
+            SELECT to_account_id AS conta_id, value AS entrada, 0 AS saida
+            FROM {Transferencia._meta.db_table} WHERE id > %(inicio)s AND id <= %(fim)s
+            UNION ALL
+            SELECT from_account_id, 0, value
+            FROM {Transferencia._meta.db_table} WHERE id > %(inicio)s AND id <= %(fim)s
+        ) movimentos
+        GROUP BY conta_id
+    '''),
+    'cartaogasto': Fonte(
+        CartaoGasto._meta.db_table, 'created_at', ['gastos_cartao'], f'''
+        SELECT cartao.conta_id, SUM(gasto.valor)
+        FROM {CartaoGasto._meta.db_table} gasto
+        JOIN {Cartao._meta.db_table} cartao ON cartao.id = gasto.cartao_id
+        WHERE gasto.id > %(inicio)s AND gasto.id <= %(fim)s
+        GROUP BY cartao.conta_id
+    '''),
+    # Snapshots are written day by day by a single gerar_saldos_diarios run,
+    # so their ids commit in order and need no margin.
+    'saldodiario': Fonte(
+        SaldoDiario._meta.db_table, None, ['soma_saldos', 'dias_saldo'], f'''
+        SELECT conta_id, SUM(saldo), COUNT(*)
+        FROM {SaldoDiario._meta.db_table}
+        WHERE id > %(inicio)s AND id <= %(fim)s
+        GROUP BY conta_id
+    '''),
+}
+
+def _upsert(fonte):
+    colunas = ', '.join(fonte.colunas)
+    zeros = [coluna for coluna in _acumulados if coluna not in fonte.colunas]
+    return f'''
+        INSERT INTO {_perfil} (conta_id, {colunas}, {', '.join(zeros)}, atualizado_em)
+        SELECT conta_id, {colunas}, {', '.join('0' for _ in zeros)}, %(agora)s
+        FROM ({fonte.consulta}) AS lote (conta_id, {colunas})
+        ON CONFLICT (conta_id) DO UPDATE SET
+            {', '.join(f'{coluna} = {_perfil}.{coluna} + EXCLUDED.{coluna}' for coluna in fonte.colunas)},
+            atualizado_em = EXCLUDED.atualizado_em
+    '''
+
+
+def _fim_do_lote(cursor, fonte, inicio, lote, agora):
+    """Return the last id of the next batch, stopping before rows younger than MARGEM."""
+    if fonte.tempo is None:
+        cursor.execute(f'''
+            SELECT MAX(id) FROM (
+                SELECT id FROM {fonte.tabela} WHERE id > %s ORDER BY id LIMIT %s
+            ) janela
+        ''', [inicio, lote])
+    else:
+        cursor.execute(f'''
+            WITH janela AS (
+                SELECT id, {fonte.tempo} AS tempo FROM {fonte.tabela}
+                WHERE id > %(inicio)s ORDER BY id LIMIT %(lote)s
+            )
+            SELECT COALESCE(
+                (SELECT MIN(id) - 1 FROM janela WHERE tempo > %(limite)s),
+                (SELECT MAX(id) FROM janela)
+            )
+        ''', {'inicio': inicio, 'lote': lote, 'limite': agora - MARGEM})
+    fim, = cursor.fetchone()
+    return fim if fim is not None and fim > inicio else None
+
+
+def atualizar(nome, lote=10000):
+    """Fold the next batch of the source nome into the profiles.
+
+    Return the number of source ids consumed, 0 once caught up.
+    """
+    fonte = FONTES[nome]
+    agora = timezone.now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        checkpoint, _ = Checkpoint.objects.select_for_update().get_or_create(job=JOB, referencia=nome)
+        fim = _fim_do_lote(cursor, fonte, checkpoint.ultimo_id, lote, agora)
+        if fim is None:
+            return 0
+
+        parametros = {
+            'inicio': checkpoint.ultimo_id,
+            'fim': fim,
+            'agora': agora,
+            'entradas': ENTRADAS,
+            'saidas': SAIDAS,
+        }
+        cursor.execute(_upsert(fonte), parametros)
+
+        consumidos = fim - checkpoint.ultimo_id
+        checkpoint.ultimo_id = fim
+        checkpoint.linhas += consumidos
+        checkpoint.save(update_fields=['ultimo_id', 'linhas', 'atualizado_em'])
+        return consumidos
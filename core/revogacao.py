@@ -0,0 +1,147 @@
+"""
+Revocation of JWTs before they expire.
+
+Revoked jtis are stored in TokenRevogado. Each worker keeps a Bloom filter
+of them, refreshed every REVOGACAO_ATUALIZACAO with the rows created since
+the previous refresh and rebuilt from scratch every REVOGACAO_RECONSTRUCAO
+so expired tokens fall out. A jti missing from the filter is certainly not
+revoked and needs no query; only the rare possible match is confirmed in
+the database.
+
+A token revoked in one worker is rejected by the others once they refresh.
+"""
+import datetime
+import hashlib
+import math
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from core.models import TokenRevogado
+
+
+# Rows committed this long after their created_at are still picked up by
+# the incremental refresh.
+MARGEM = datetime.timedelta(seconds=30)
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded false positive rate."""
+
+    def __init__(self, capacidade, erro):
+        self.bits = max(8, int(-capacidade * math.log(erro) / math.log(2) ** 2))
+        self.funcoes = max(1, round(self.bits / capacidade * math.log(2)))
+        self.capacidade = capacidade
+        self.tamanho = 0
+        self.vetor = bytearray((self.bits + 7) // 8)
+
+    def _posicoes(self, valor):
+        digest = hashlib.blake2b(valor.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.funcoes)]
+
+    def add(self, valor):
+        for posicao in self._posicoes(valor):
+            self.vetor[posicao >> 3] |= 1 << (posicao & 7)
+        self.tamanho += 1
+
+    def __contains__(self, valor):
+        return all(self.vetor[posicao >> 3] & (1 << (posicao & 7))
+                   for posicao in self._posicoes(valor))
+
+    @property
+    def cheio(self):
+        return self.tamanho > self.capacidade
+
+
+_trava = threading.Lock()
+_estado = {'filtro': None, 'atualizado_em': 0.0, 'reconstruido_em': 0.0, 'desde': None}
+
+
+def _reconstruir(agora):
+    jtis = list(
+        TokenRevogado.objects.filter(expira_em__gt=timezone.now()).values_list('jti', flat=True)
+    )
+    filtro = BloomFilter(max(settings.REVOGACAO_BLOOM_CAPACIDADE, 2 * len(jtis)),
+                         settings.REVOGACAO_BLOOM_ERRO)
+    for jti in jtis:
+        filtro.add(jti)
+    _estado['filtro'] = filtro
+    _estado['reconstruido_em'] = agora
+
+
+def _em_dia(agora):
+    return agora - _estado['atualizado_em'] < settings.REVOGACAO_ATUALIZACAO.total_seconds()
+
+
+def atualizar(forcar=False):
+    """Bring this worker's filter up to date if it is due."""
+    if not forcar and _em_dia(time.monotonic()):
+        return
+
+    with _trava:
+        agora = time.monotonic()
+        if not forcar and _em_dia(agora):
+            return
+
+        inicio = timezone.now()
+        filtro = _estado['filtro']
+        vencido = agora - _estado['reconstruido_em'] >= settings.REVOGACAO_RECONSTRUCAO.total_seconds()
+        if filtro is None or filtro.cheio or vencido:
+            _reconstruir(agora)
+        else:
+            for jti in TokenRevogado.objects.filter(
+                created_at__gte=_estado['desde'] - MARGEM
+            ).values_list('jti', flat=True):
+                # Rows inside MARGEM are read again on the next refresh.
+                if jti not in filtro:
+                    filtro.add(jti)
+        _estado['desde'] = inicio
+        _estado['atualizado_em'] = agora
+
+
+def revogado(jti):
+    """Return whether the token with jti was revoked."""
+    atualizar()
+    if jti not in _estado['filtro']:
+        return False
+    return TokenRevogado.objects.filter(jti=jti).exists()
+
+
+async def arevogado(jti):
+    """Async version of revogado; only a due refresh leaves the event loop."""
+    if _estado['filtro'] is None or not _em_dia(time.monotonic()):
+        await sync_to_async(atualizar)()
+    if jti not in _estado['filtro']:
+        return False
+    return await TokenRevogado.objects.filter(jti=jti).aexists()
+
+
+def revogar(token, motivo, user_id=None):
+    """Revoke a validated simplejwt token until it expires."""
+    jti = token[api_settings.JTI_CLAIM]
+    expira_em = datetime.datetime.fromtimestamp(token['exp'], tz=datetime.timezone.utc)
+    revogar_jtis([jti], expira_em, motivo, user_id)
+
+
+def revogar_jtis(jtis, expira_em, motivo, user_id=None):
+    """Store revocations and add them to this worker's filter once committed."""
+    TokenRevogado.objects.bulk_create(
+        [TokenRevogado(jti=jti, user_id=user_id, motivo=motivo, expira_em=expira_em)
+         for jti in jtis],
+        ignore_conflicts=True
+    )
+
+    def marcar():
+        filtro = _estado['filtro']
+        if filtro is not None:
+            for jti in jtis:
+                filtro.add(jti)
+
+    transaction.on_commit(marcar)
@@ -0,0 +1,110 @@
+"""
+End-of-day balance snapshots.
+
+SaldoDiario stores the saldo of a conta at the end of each day it moved.
+The balance on any date is then the latest snapshot up to that date plus
+the lançamentos posted after it, instead of a replay of the whole history.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Case, F, Max, Min, Sum, When
+from django.utils import timezone
+
+from core.models import Lancamento, SaldoDiario
+
+
+UM_DIA = datetime.timedelta(days=1)
+# A day is only snapshotted once it ended this long ago, so transactions
+# still committing around midnight are not left out.
+MARGEM = datetime.timedelta(minutes=5)
+
+
+def _inicio_do_dia(data):
+    return timezone.make_aware(datetime.datetime.combine(data, datetime.time.min))
+
+
+def _variacao():
+    """Net effect of lançamentos on a customer saldo."""
+    return Sum(Case(
+        When(natureza=Lancamento.CREDITO, then=F('valor')),
+        default=-F('valor')
+    ))
+
+
+def saldo_em(conta_id, data):
+    """Return the saldo of the conta at the end of data."""
+    lancamentos = Lancamento.objects.filter(
+        conta_id=conta_id,
+        created_at__lt=_inicio_do_dia(data + UM_DIA)
+    )
+    snapshot = SaldoDiario.objects.filter(
+        conta_id=conta_id, data__lte=data
+    ).order_by('-data').first()
+
+    saldo = 0
+    if snapshot:
+        saldo = snapshot.saldo
+        lancamentos = lancamentos.filter(created_at__gte=_inicio_do_dia(snapshot.data + UM_DIA))
+
+    return saldo + (lancamentos.aggregate(variacao=_variacao())['variacao'] or 0)
+
+
+def ultimo_dia_fechado():
+    """Return the last day whose lançamentos can no longer change."""
+    return timezone.localdate(timezone.now() - MARGEM) - UM_DIA
+
+
+def _primeiro_dia_pendente():
+    ultimo = SaldoDiario.objects.aggregate(data=Max('data'))['data']
+    if ultimo:
+        return ultimo + UM_DIA
+
+    primeiro = Lancamento.objects.filter(
+        conta__isnull=False
+    ).aggregate(created_at=Min('created_at'))['created_at']
+    return timezone.localdate(primeiro) if primeiro else None
+
+
+def fechar_dia(data):
+    """Snapshot every conta that moved on data. Return how many were written."""
+    with transaction.atomic():
+        variacoes = dict(
+            Lancamento.objects.filter(
+                conta__isnull=False,
+                created_at__gte=_inicio_do_dia(data),
+                created_at__lt=_inicio_do_dia(data + UM_DIA)
+            ).values('conta_id').annotate(
+                variacao=_variacao()
+            ).order_by().values_list('conta_id', 'variacao')
+        )
+        if not variacoes:
+            return 0
+
+        anteriores = dict(
+            SaldoDiario.objects.filter(
+                conta_id__in=variacoes, data__lt=data
+            ).order_by('conta_id', '-data').distinct('conta_id').values_list('conta_id', 'saldo')
+        )
+        SaldoDiario.objects.bulk_create(
+            [
+                SaldoDiario(conta_id=conta_id, data=data,
+                            saldo=anteriores.get(conta_id, 0) + variacao)
+                for conta_id, variacao in variacoes.items()
+            ],
+            batch_size=1000
+        )
+        return len(variacoes)
+
+
+def gerar_saldos_diarios(ate=None):
+    """Snapshot each closed day after the last one snapshotted.
+
+    Yields (data, snapshots written) per day. Each day is committed on its
+    own, so an interrupted run resumes from the next day.
+    """
+    ate = ate or ultimo_dia_fechado()
+    data = _primeiro_dia_pendente()
+    while data is not None and data <= ate:
+        yield data, fechar_dia(data)
+        data += UM_DIA
@@ -0,0 +1,371 @@
+"""
+Money movement services for accounts.
+
+Balances are changed inside the database (``F()`` expressions) instead of
+being read into Python, changed and saved back, so concurrent requests can
+not overwrite each other. Every movement is recorded in the ledger in the
+same transaction as its Extrato, Transferencia or CartaoGasto row.
+"""
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from core import ledger
+from core.ledger import SaldoInsuficiente  # noqa: F401
+from core.models import (Conta, Extrato, Transferencia, TransferenciaPendente, CartaoGasto,
+                         GastoCiclo, Emprestimo, ParcelaEmprestimo)
+
+
+class LimiteInsuficiente(Exception):
+    """Raised when a card can not cover a spend."""
+
+
+class ContaDestinoInvalida(Exception):
+    """Raised when a transfer is sent to the conta it comes from."""
+
+
+class ParcelasInvalidas(Exception):
+    """Raised when the installments asked for can not be paid."""
+
+
+def _saldo_atual(conta_id):
+    """Return the saldo of conta as seen by the current transaction."""
+    return Conta.objects.values_list('saldo', flat=True).get(pk=conta_id)
+
+
+def depositar(conta_id, valor):
+    """Credit valor to the conta and return the new saldo."""
+    with transaction.atomic():
+        extrato = Extrato.objects.create(conta_id=conta_id, valor=valor, tipo='Deposito')
+        ledger.lancar(
+            ledger.Movimento('Deposito', origem=extrato)
+            .debitar(valor, sistema=ledger.CAIXA)
+            .creditar(valor, conta_id=conta_id)
+        )
+
+        return _saldo_atual(conta_id)
+
+
+def sacar(conta_id, valor):
+    """Debit valor from the conta if it has enough saldo and return the new saldo."""
+    with transaction.atomic():
+        extrato = Extrato.objects.create(conta_id=conta_id, valor=valor, tipo='Saque')
+        ledger.lancar(
+            ledger.Movimento('Saque', origem=extrato)
+            .debitar(valor, conta_id=conta_id)
+            .creditar(valor, sistema=ledger.CAIXA)
+        )
+
+        return _saldo_atual(conta_id)
+
+
+def transferir(from_account_id, to_account_id, valor):
+    """Move valor between two contas and return the Transferencia.
+
+    The ledger locks both contas in id order, so two opposite transfers
+    between the same pair of accounts can never deadlock.
+    """
+    # Both legs would net to zero on the same conta and skip the saldo check.
+    if from_account_id == to_account_id:
+        raise ContaDestinoInvalida
+
+    with transaction.atomic():
+        transferencia = Transferencia.objects.create(
+            from_account_id=from_account_id,
+            to_account_id=to_account_id,
+            value=valor
+        )
+        Extrato.objects.bulk_create(_extratos_transferencia(transferencia))
+        ledger.lancar(
+            ledger.Movimento('Transferencia', origem=transferencia)
+            .debitar(valor, conta_id=from_account_id)
+            .creditar(valor, conta_id=to_account_id)
+        )
+
+        return transferencia
+
+
+def _extratos_transferencia(transferencia):
+    """Build the Extrato rows of both sides of a transferencia."""
+    return [
+        Extrato(conta_id=transferencia.from_account_id, valor=transferencia.value,
+                tipo='Transferencia Enviada', created_at=transferencia.created_at),
+        Extrato(conta_id=transferencia.to_account_id, valor=transferencia.value,
+                tipo='Transferencia Recebida', created_at=transferencia.created_at),
+    ]
+
+
+def transferir_lote(from_account_id, itens):
+    """Settle a list of (to_account_id, valor) transfers from one conta.
+
+    Every conta involved is locked once, in id order. Items are checked in
+    order against the running saldo of the sender; the accepted ones are
+    written with bulk_create and the net saldo change of each conta is
+    applied with one UPDATE. Return one result dict per item.
+    """
+    with transaction.atomic():
+        destinos = {to_account_id for to_account_id, _ in itens}
+        saldos = dict(
+            Conta.objects.select_for_update().filter(
+                pk__in=destinos | {from_account_id}
+            ).order_by('pk').values_list('pk', 'saldo')
+        )
+        if from_account_id not in saldos:
+            raise Conta.DoesNotExist
+
+        saldo = saldos[from_account_id]
+        resultados = []
+        transferencias = []
+        for indice, (to_account_id, valor) in enumerate(itens):
+            if to_account_id not in saldos:
+                resultados.append({'indice': indice, 'message': 'Conta não encontrada'})
+            elif to_account_id == from_account_id:
+                resultados.append({'indice': indice, 'message': 'Conta de destino inválida'})
+            elif valor > saldo:
+                resultados.append({'indice': indice, 'message': 'Saldo insuficiente'})
+            else:
+                saldo -= valor
+                resultados.append({'indice': indice, 'message': 'ok'})
+                transferencias.append(Transferencia(
+                    from_account_id=from_account_id,
+                    to_account_id=to_account_id,
+                    value=valor
+                ))
+
+        Transferencia.objects.bulk_create(transferencias)
+        Extrato.objects.bulk_create([
+            extrato
+            for transferencia in transferencias
+            for extrato in _extratos_transferencia(transferencia)
+        ])
+        ledger.lancar(*[
+            ledger.Movimento('Transferencia', origem=transferencia)
+            .debitar(transferencia.value, conta_id=from_account_id)
+            .creditar(transferencia.value, conta_id=transferencia.to_account_id)
+            for transferencia in transferencias
+        ])
+
+        aceitas = iter(transferencias)
+        for resultado in resultados:
+            if resultado['message'] == 'ok':
+                resultado['id'] = next(aceitas).pk
+
+        return resultados
+
+
+def agendar_transferencia(from_account_id, to_account_id, valor):
+    """Record a transfer for liquidar_transferencias and return the TransferenciaPendente.
+
+    Only the destination is checked here; the saldo is checked when the
+    transfer is settled.
+    """
+    if valor <= 0:
+        raise ValueError(f'Valor inválido: {valor}')
+    if from_account_id == to_account_id:
+        raise ContaDestinoInvalida
+    if not Conta.objects.filter(pk=to_account_id).exists():
+        raise Conta.DoesNotExist
+
+    return TransferenciaPendente.objects.create(
+        from_account_id=from_account_id,
+        to_account_id=to_account_id,
+        value=valor
+    )
+
+
+def liquidar_transferencias(lote):
+    """Settle up to lote pending transfers, oldest first, and return how many.
+
+    Pending rows are claimed with SKIP LOCKED, so several workers can run
+    at once without waiting on each other's batch. The contas of the batch
+    are locked once, in id order, and each transfer is checked in order
+    against the running saldos; the accepted ones are written with
+    bulk_create and a single ledger entry per transfer. A row that can not
+    be settled is marked Recusada, so it never holds back the rest of the
+    queue.
+    """
+    with transaction.atomic():
+        pendentes = list(
+            TransferenciaPendente.objects.select_for_update(skip_locked=True).filter(
+                status=TransferenciaPendente.PENDENTE
+            ).order_by('id')[:lote]
+        )
+        if not pendentes:
+            return 0
+
+        envolvidas = set()
+        for pendente in pendentes:
+            envolvidas |= {pendente.from_account_id, pendente.to_account_id}
+        saldos = dict(
+            Conta.objects.select_for_update().filter(
+                pk__in=envolvidas
+            ).order_by('pk').values_list('pk', 'saldo')
+        )
+
+        agora = timezone.now()
+        aceitas = []
+        for pendente in pendentes:
+            pendente.processada_em = agora
+            if pendente.value <= 0:
+                pendente.status, pendente.motivo = TransferenciaPendente.RECUSADA, 'Valor inválido'
+            elif pendente.from_account_id == pendente.to_account_id:
+                pendente.status, pendente.motivo = TransferenciaPendente.RECUSADA, 'Conta de destino inválida'
+            elif pendente.from_account_id not in saldos or pendente.to_account_id not in saldos:
+                pendente.status, pendente.motivo = TransferenciaPendente.RECUSADA, 'Conta não encontrada'
+            elif pendente.value > saldos[pendente.from_account_id]:
+                pendente.status, pendente.motivo = TransferenciaPendente.RECUSADA, 'Saldo insuficiente'
+            else:
+                saldos[pendente.from_account_id] -= pendente.value
+                saldos[pendente.to_account_id] += pendente.value
+                pendente.status = TransferenciaPendente.CONCLUIDA
+                pendente.transferencia = Transferencia(
+                    from_account_id=pendente.from_account_id,
+                    to_account_id=pendente.to_account_id,
+                    value=pendente.value,
+                    created_at=agora
+                )
+                aceitas.append(pendente.transferencia)
+
+        Transferencia.objects.bulk_create(aceitas)
+        Extrato.objects.bulk_create([
+            extrato
+            for transferencia in aceitas
+            for extrato in _extratos_transferencia(transferencia)
+        ])
+        ledger.lancar(*[
+            ledger.Movimento('Transferencia', origem=transferencia)
+            .debitar(transferencia.value, conta_id=transferencia.from_account_id)
+            .creditar(transferencia.value, conta_id=transferencia.to_account_id)
+            for transferencia in aceitas
+        ])
+        TransferenciaPendente.objects.bulk_update(
+            pendentes, ['status', 'motivo', 'transferencia', 'processada_em'])
+
+        return len(pendentes)
+
+
+def inicio_do_ciclo(data=None):
+    """Return the first day of the billing cycle that contains data."""
+    return (data or timezone.localdate()).replace(day=1)
+
+
+def registrar_gasto(cartao, valor, nome):
+    """Record a spend on the cartao if its limite allows it.
+
+    The spend is authorized by one conditional UPDATE on the cycle counter,
+    so concurrent authorizations on the same card can never overspend.
+    """
+    if valor <= 0:
+        raise ValueError(f'Valor inválido: {valor}')
+
+    ciclo = inicio_do_ciclo()
+    with transaction.atomic():
+        GastoCiclo.objects.bulk_create(
+            [GastoCiclo(cartao=cartao, ciclo=ciclo)], ignore_conflicts=True)
+        autorizado = GastoCiclo.objects.filter(
+            cartao=cartao, ciclo=ciclo, total__lte=cartao.limite - valor
+        ).update(total=F('total') + valor)
+        if not autorizado:
+            raise LimiteInsuficiente
+
+        gasto = CartaoGasto.objects.create(cartao=cartao, valor=valor, nome=nome)
+        ledger.lancar(
+            ledger.Movimento('Gasto Cartao', origem=gasto)
+            .debitar(valor, sistema=ledger.CARTOES_A_RECEBER)
+            .creditar(valor, sistema=ledger.ESTABELECIMENTOS)
+        )
+
+        return gasto
+
+
+def desembolsar_emprestimo(emprestimo):
+    """Credit the requested value of an approved loan to its conta."""
+    with transaction.atomic():
+        valor = emprestimo.valorRequisitado
+        extrato = Extrato.objects.create(
+            conta_id=emprestimo.conta_id, valor=valor, tipo='Emprestimo')
+        ledger.lancar(
+            ledger.Movimento('Emprestimo', origem=emprestimo)
+            .debitar(valor, sistema=ledger.EMPRESTIMOS_A_RECEBER)
+            .creditar(valor, conta_id=emprestimo.conta_id)
+        )
+
+        return extrato
+
+
+def _valor_devido(parcela, quitar, hoje):
+    """Return what paying parcela costs today.
+
+    On a payoff the installments not yet due pay only their amortization,
+    since their interest has not accrued.
+    """
+    if quitar and parcela.dataVencimento > hoje:
+        return max(parcela.amortizacao - parcela.valorPago, 0)
+    return parcela.valorParcela + parcela.multa + parcela.juros_mora - parcela.valorPago
+
+
+def pagar_parcelas(emprestimo, numeros=None, quantidade=None, quitar=False):
+    """Pay open installments of an approved emprestimo from its conta.
+
+    Pays the installments numbered numeros, the next quantidade open ones,
+    or every open one when quitar is set. The open installments are locked,
+    marked paid with one UPDATE, the conta is debited with one conditional
+    UPDATE through the ledger and one Extrato per installment is written
+    with bulk_create, all in one transaction. Return the paid installments
+    with their valorPago.
+    """
+    if emprestimo.status != 'Aprovado':
+        raise ParcelasInvalidas('Empréstimo não está ativo')
+
+    hoje = timezone.localdate()
+    with transaction.atomic():
+        abertas = list(
+            ParcelaEmprestimo.objects.select_for_update()
+            .filter(emprestimo=emprestimo, dataPaga__isnull=True)
+            .order_by('numParcela')
+        )
+        if quitar:
+            pagas = abertas
+        elif numeros:
+            pagas = [parcela for parcela in abertas if parcela.numParcela in set(numeros)]
+            if len(pagas) != len(set(numeros)):
+                raise ParcelasInvalidas('Parcela inexistente ou já paga')
+        else:
+            pagas = abertas[:quantidade or 1]
+        if not pagas:
+            raise ParcelasInvalidas('Nenhuma parcela em aberto')
+
+        for parcela in pagas:
+            parcela.valorPago += _valor_devido(parcela, quitar, hoje)
+            parcela.dataPaga = hoje
+            parcela.status = ParcelaEmprestimo.PAGA
+
+        ParcelaEmprestimo.objects.filter(pk__in=[parcela.pk for parcela in pagas]).update(
+            valorPago=Case(
+                *[When(pk=parcela.pk, then=Value(parcela.valorPago)) for parcela in pagas],
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            ),
+            dataPaga=hoje,
+            status=ParcelaEmprestimo.PAGA
+        )
+
+        total = sum(parcela.valorPago for parcela in pagas)
+        principal = sum(min(parcela.amortizacao, parcela.valorPago) for parcela in pagas)
+        movimento = (
+            ledger.Movimento('Pagamento Emprestimo', origem=emprestimo)
+            .debitar(total, conta_id=emprestimo.conta_id)
+            .creditar(principal, sistema=ledger.EMPRESTIMOS_A_RECEBER)
+        )
+        if total > principal:
+            movimento.creditar(total - principal, sistema=ledger.RECEITAS_EMPRESTIMOS)
+        ledger.lancar(movimento)
+
+        Extrato.objects.bulk_create([
+            Extrato(conta_id=emprestimo.conta_id, valor=parcela.valorPago, tipo='Pagamento Emprestimo')
+            for parcela in pagas
+        ])
+
+        if len(pagas) == len(abertas):
+            Emprestimo.objects.filter(pk=emprestimo.pk).update(status='Quitado')
+
+        return pagas
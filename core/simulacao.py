@@ -0,0 +1,61 @@
+"""
+Loan simulations over a grid of terms and rates.
+
+A simulation answers "what would this loan cost" for every combination of
+qtd_parcelas and monthly rate at once. The closed forms of the Price and
+SAC systems are evaluated with NumPy over the whole grid instead of
+building one schedule per scenario. Values are rounded half up to cents
+per installment; the schedule of a contracted loan (core.amortizacao)
+can still differ from them by a cent because it rounds month by month.
+"""
+import numpy as np
+
+from core.models import Emprestimo
+
+
+def _centavos(valores):
+    return np.floor(valores * 100 + 0.5) / 100
+
+
+def simular(principal, prazos, taxas, sistema=Emprestimo.PRICE):
+    """Return the simulation of principal for every (taxa, prazo) pair.
+
+    The result has one row per taxa and, in each row, one entry per prazo
+    with the first and last installment, the total paid and the interest.
+    """
+    principal = float(principal)
+    n = np.asarray(prazos, dtype=np.float64)[np.newaxis, :]
+    i = np.asarray([float(taxa) for taxa in taxas], dtype=np.float64)[:, np.newaxis]
+
+    if sistema == Emprestimo.PRICE:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prestacao = np.where(i > 0, principal * i / (1 - (1 + i) ** -n), principal / n)
+        primeira = ultima = _centavos(prestacao)
+        total = _centavos(prestacao * n)
+    elif sistema == Emprestimo.SAC:
+        amortizacao = principal / n
+        primeira = _centavos(amortizacao + principal * i)
+        ultima = _centavos(amortizacao * (1 + i))
+        total = _centavos(principal + principal * i * (n + 1) / 2)
+    else:
+        raise ValueError(f'Sistema de amortização desconhecido: {sistema}')
+
+    primeira, ultima, total = np.broadcast_arrays(primeira, ultima, total)
+    juros = _centavos(total - principal)
+
+    return [
+        {
+            'taxa_juros': taxa,
+            'cenarios': [
+                {
+                    'qtd_parcelas': prazo,
+                    'primeira_parcela': primeira[linha, coluna].item(),
+                    'ultima_parcela': ultima[linha, coluna].item(),
+                    'valorTotal': total[linha, coluna].item(),
+                    'juros': juros[linha, coluna].item(),
+                }
+                for coluna, prazo in enumerate(prazos)
+            ],
+        }
+        for linha, taxa in enumerate(taxas)
+    ]
@@ -1,3 +1,746 @@
-from django.test import TestCase
+"""
+Tests for the core app.
+"""
+import datetime
+import importlib
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import amortizacao, cartoes, contas, credito, inadimplencia, ledger, outbox, perfis, saldos, services
+from core.benchmark import executar_concorrente
+from core.models import (Cartao, CartaoGasto, Checkpoint, Conta, Emprestimo, Evento, Extrato, GastoCiclo,
+                         Lancamento,
+                         ParcelaEmprestimo, PerfilCredito, SaldoDiario, Transferencia,
+                         TransferenciaPendente, User)
+
+
+class CronogramaTests(SimpleTestCase):
+    """Schedules are exact to the cent."""
+
+    inicio = datetime.date(2024, 1, 31)
+
+    def assertFechaNoPrincipal(self, cronograma, principal):
+        self.assertEqual(sum(p.amortizacao for p in cronograma), principal)
+        self.assertEqual(cronograma[-1].saldo, 0)
+        for parcela in cronograma:
+            self.assertEqual(parcela.valor, parcela.amortizacao + parcela.juros)
+            self.assertGreaterEqual(parcela.amortizacao, 0)
+
+    def test_price(self):
+        for principal, taxa, parcelas in [('1000.00', '0.0399', 12), ('100.00', '0.0399', 72),
+                                          ('50000.00', '0.0199', 72), ('999.99', '0.015', 7)]:
+            with self.subTest(principal=principal, parcelas=parcelas):
+                cronograma = amortizacao.cronograma(Decimal(principal), Decimal(taxa), parcelas,
+                                                    Emprestimo.PRICE, self.inicio)
+                self.assertEqual(len(cronograma), parcelas)
+                self.assertFechaNoPrincipal(cronograma, Decimal(principal))
+                valores = [p.valor for p in cronograma]
+                self.assertLessEqual(max(valores) - min(valores), Decimal('0.01'))
+
+    def test_price_ajuste_final(self):
+        cronograma = amortizacao.cronograma(Decimal('100.00'), Decimal('0.0399'), 72,
+                                            Emprestimo.PRICE, self.inicio)
+        self.assertEqual(cronograma[0].valor, Decimal('4.24'))
+        self.assertEqual(cronograma[-1].valor, Decimal('4.24'))
+
+    def test_sac(self):
+        cronograma = amortizacao.cronograma(Decimal('1000.00'), Decimal('0.0399'), 12,
+                                            Emprestimo.SAC, self.inicio)
+        self.assertFechaNoPrincipal(cronograma, Decimal('1000.00'))
+        amortizacoes = [p.amortizacao for p in cronograma]
+        self.assertLessEqual(max(amortizacoes) - min(amortizacoes), Decimal('0.01'))
+        valores = [p.valor for p in cronograma]
+        self.assertEqual(valores, sorted(valores, reverse=True))
+        self.assertEqual(cronograma[0].juros, Decimal('39.90'))
+
+    def test_taxa_zero(self):
+        for sistema in (Emprestimo.PRICE, Emprestimo.SAC):
+            with self.subTest(sistema=sistema):
+                cronograma = amortizacao.cronograma(Decimal('100.00'), Decimal('0'), 3,
+                                                    sistema, self.inicio)
+                self.assertFechaNoPrincipal(cronograma, Decimal('100.00'))
+                self.assertEqual([p.juros for p in cronograma], [0, 0, 0])
+                self.assertEqual([p.valor for p in cronograma],
+                                 [Decimal('33.33'), Decimal('33.34'), Decimal('33.33')])
+
+    def test_vencimento_no_fim_do_mes(self):
+        cronograma = amortizacao.cronograma(Decimal('100.00'), Decimal('0.01'), 13,
+                                            Emprestimo.PRICE, self.inicio)
+        self.assertEqual(
+            [p.vencimento for p in cronograma[:3]],
+            [datetime.date(2024, 2, 29), datetime.date(2024, 3, 31), datetime.date(2024, 4, 30)]
+        )
+        self.assertEqual(cronograma[-1].vencimento, datetime.date(2025, 2, 28))
+
+    def test_sistema_desconhecido(self):
+        with self.assertRaises(ValueError):
+            amortizacao.cronograma(Decimal('100.00'), Decimal('0.01'), 3, 'Alemão', self.inicio)
+
+
+class LedgerTests(TestCase):
+    """Movements are balanced, positive and immutable once recorded."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(email='razao@example.com', cpf='60000000000')
+        cls.conta = Conta.objects.create(user=user, agencia='0001', numero='00000600', saldo=0)
+
+    def test_valor_nao_positivo(self):
+        for valor in (Decimal('0'), Decimal('-10.00')):
+            with self.subTest(valor=valor), self.assertRaises(ValueError):
+                ledger.Movimento('Deposito').debitar(valor, sistema=ledger.CAIXA)
+            with self.subTest(valor=valor), self.assertRaises(ValueError):
+                services.sacar(self.conta.pk, valor)
+        self.assertFalse(Lancamento.objects.exists())
+        self.assertFalse(Extrato.objects.exists())
+
+    def test_movimento_desbalanceado(self):
+        movimento = ledger.Movimento('Deposito').debitar(Decimal('10.00'), sistema=ledger.CAIXA)
+        movimento.creditar(Decimal('9.99'), conta_id=self.conta.pk)
+
+        with self.assertRaises(ledger.MovimentoDesbalanceado):
+            ledger.lancar(movimento)
+        with self.assertRaises(ledger.MovimentoDesbalanceado):
+            ledger.lancar(ledger.Movimento('Deposito'))
+
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo, 0)
+        self.assertFalse(Lancamento.objects.exists())
+
+    def test_lancamentos_imutaveis(self):
+        services.depositar(self.conta.pk, Decimal('10.00'))
+        lancamento = Lancamento.objects.filter(conta=self.conta).get()
+
+        lancamento.valor = Decimal('1000.00')
+        for alterar in (lancamento.save, lancamento.delete,
+                        lambda: Lancamento.objects.update(valor=Decimal('1000.00')),
+                        lambda: Lancamento.objects.all().delete()):
+            with self.subTest(alterar=alterar), self.assertRaises(ValueError):
+                alterar()
+
+        self.assertEqual(Lancamento.objects.filter(conta=self.conta).get().valor, Decimal('10.00'))
+        self.assertEqual(Lancamento.objects.count(), 2)
+
+    def test_saldos_de_abertura(self):
+        user = User.objects.create(email='abertura@example.com', cpf='60000000001')
+        contas = [Conta.objects.create(user=user, agencia='0001', numero=f'0000061{n}', saldo=saldo)
+                  for n, saldo in enumerate([Decimal('150.00'), Decimal('-20.00'), 0])]
+        migracao = importlib.import_module('core.migrations.0018_lancamento')
+
+        migracao.lancar_saldos_abertura(apps, None)
+
+        for conta in contas:
+            creditos = conta.lancamentos.filter(natureza=Lancamento.CREDITO).aggregate(s=Sum('valor'))['s']
+            debitos = conta.lancamentos.filter(natureza=Lancamento.DEBITO).aggregate(s=Sum('valor'))['s']
+            self.assertEqual((creditos or 0) - (debitos or 0), conta.saldo)
+        call_command('conferir_razao', stdout=io.StringIO())
+
+    def test_conferir_razao(self):
+        services.depositar(self.conta.pk, Decimal('10.00'))
+        saida = io.StringIO()
+        call_command('conferir_razao', stdout=saida)
+        self.assertIn('Razão conferido!', saida.getvalue())
+
+        Conta.objects.filter(pk=self.conta.pk).update(saldo=Decimal('11.00'))
+        saida = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 contas divergentes, 0 movimentos desbalanceados'):
+            call_command('conferir_razao', stdout=saida)
+        self.assertIn(f'Conta {self.conta.pk}: saldo 11.00 != razão 10.00', saida.getvalue())
+
+
+def _luhn_valido(numero):
+    return cartoes.digito_luhn(numero[:-1]) == numero[-1]
+
+
+class NumeracaoTests(SimpleTestCase):
+    """Card and account numbers carry a Luhn digit and never repeat."""
+
+    def test_digito_luhn(self):
+        for parcial, digito in [('7992739871', '3'), ('650487000000000', '4'), ('0000001', '8')]:
+            with self.subTest(parcial=parcial):
+                self.assertEqual(cartoes.digito_luhn(parcial), digito)
+
+    def test_permutacao_sem_repeticao(self):
+        chave = b'chave-de-teste'
+        for inicio in (0, 123456789, cartoes.DOMINIO - 5000):
+            with self.subTest(inicio=inicio):
+                bloco = [cartoes.permutar(valor, chave) for valor in range(inicio, inicio + 5000)]
+                self.assertEqual(len(set(bloco)), len(bloco))
+                self.assertTrue(all(0 <= valor < cartoes.DOMINIO for valor in bloco))
+                self.assertNotEqual(bloco[:10], list(range(inicio, inicio + 10)))
+
+
+class NumeracaoBancoTests(TestCase):
+    """Allocated numbers skip the ones issued before the allocator existed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='numeracao@example.com', cpf='61000000000')
+        cls.antiga = Conta.objects.create(user=cls.user, agencia='0001', numero='00000620', saldo=0)
+        Cartao.objects.create(nome='Antigo', cvv='123', numero='6504870000000620',
+                              limite=Decimal('100.00'), tipo='Crédito', conta=cls.antiga)
+
+    def test_gerar_numero_de_cartao(self):
+        numero = cartoes.gerar_numero()
+
+        self.assertEqual((len(numero), numero[:6]), (16, settings.CARTAO_BIN))
+        self.assertTrue(_luhn_valido(numero))
+        self.assertNotEqual(cartoes.gerar_numero(), numero)
+
+    def test_conta_colide_com_numero_antigo(self):
+        with mock.patch.object(contas, 'gerar_numero', side_effect=['00000620', '00000638']):
+            conta = contas.abrir_conta(self.user)
+
+        self.assertEqual(conta.numero, '00000638')
+        with mock.patch.object(contas, 'gerar_numero', return_value='00000620'):
+            with self.assertRaises(IntegrityError):
+                contas.abrir_conta(self.user)
+
+    def test_cartao_colide_com_numero_antigo(self):
+        campos = {'nome': 'Novo', 'limite': Decimal('100.00'), 'tipo': 'Crédito', 'conta': self.antiga}
+        with mock.patch.object(cartoes, 'gerar_numero', side_effect=['6504870000000620', '6504870000000638']):
+            cartao = cartoes.emitir_cartao(**campos)
+
+        self.assertEqual(cartao.numero, '6504870000000638')
+        with mock.patch.object(cartoes, 'gerar_numero', return_value='6504870000000620'):
+            with self.assertRaises(IntegrityError):
+                cartoes.emitir_cartao(**campos)
+
+
+class NumeracaoConcorrenteTests(TransactionTestCase):
+    """Workers reserving blocks of account numbers at the same time never share a number."""
+
+    def test_blocos_de_workers_diferentes(self):
+        # Each worker process keeps its own block; swap the state to play two of them.
+        workers = [{'proximo': 0, 'fim': 0}, {'proximo': 0, 'fim': 0}]
+        numeros = []
+        for rodada in range(contas.BLOCO * 2 + 1):
+            estado = workers[rodada % 2]
+            with mock.patch.dict(contas._bloco, estado):
+                numeros.append(contas.gerar_numero())
+                estado.update(contas._bloco)
+
+        self.assertEqual(len(set(numeros)), len(numeros))
+        self.assertEqual(int(numeros[1][:7]) - int(numeros[0][:7]), contas.BLOCO)
+
+    def test_threads_do_mesmo_worker(self):
+        numeros = []
+
+        def alocar(indice):
+            numeros.extend(contas.gerar_numero() for _ in range(contas.BLOCO))
+
+        _, erros = executar_concorrente(4, alocar)
+
+        self.assertEqual(erros, [])
+        self.assertEqual(len(set(numeros)), 4 * contas.BLOCO)
+        self.assertTrue(all(len(numero) == 8 and _luhn_valido(numero) for numero in numeros))
+
+
+def _cartao(limite, cpf):
+    user = User.objects.create(email=f'gastos{cpf}@example.com', cpf=cpf)
+    conta = Conta.objects.create(user=user, agencia='0001', numero=cpf[-8:], saldo=0)
+    return Cartao.objects.create(nome='Gastos Teste', cvv='123', numero=f'650487{cpf[-10:]}',
+                                 limite=limite, tipo='Crédito', conta=conta)
+
+
+class RegistrarGastoTests(TestCase):
+    """Card spends are authorized against the limit of the current cycle."""
+
+    def setUp(self):
+        self.cartao = _cartao(Decimal('100.00'), '70000000000')
+
+    def test_gasto_ate_o_limite(self):
+        services.registrar_gasto(self.cartao, Decimal('60.00'), 'Mercado')
+        services.registrar_gasto(self.cartao, Decimal('40.00'), 'Farmácia')
+
+        with self.assertRaises(services.LimiteInsuficiente):
+            services.registrar_gasto(self.cartao, Decimal('0.01'), 'Padaria')
+
+        self.assertEqual(GastoCiclo.objects.get(cartao=self.cartao).total, Decimal('100.00'))
+        self.assertEqual(CartaoGasto.objects.filter(cartao=self.cartao).count(), 2)
+
+    def test_gasto_acima_do_limite(self):
+        with self.assertRaises(services.LimiteInsuficiente):
+            services.registrar_gasto(self.cartao, Decimal('100.01'), 'Mercado')
+
+        self.assertFalse(CartaoGasto.objects.exists())
+
+    def test_valor_nao_positivo(self):
+        for valor in (Decimal('0'), Decimal('-50.00')):
+            with self.subTest(valor=valor), self.assertRaises(ValueError):
+                services.registrar_gasto(self.cartao, valor, 'Estorno')
+
+        self.assertFalse(GastoCiclo.objects.exists())
+
+
+class RegistrarGastoConcorrenteTests(TransactionTestCase):
+    """Concurrent spends on one card never add up past its limit."""
+
+    def test_gastos_simultaneos(self):
+        cartao = _cartao(Decimal('100.00'), '70000000001')
+        recusados = []
+
+        def gastar(indice):
+            try:
+                services.registrar_gasto(cartao, Decimal('60.00'), f'Loja {indice}')
+            except services.LimiteInsuficiente:
+                recusados.append(indice)
+
+        _, erros = executar_concorrente(2, gastar)
+
+        self.assertEqual(erros, [])
+        self.assertEqual(len(recusados), 1)
+        self.assertEqual(GastoCiclo.objects.get(cartao=cartao).total, Decimal('60.00'))
+        self.assertEqual(CartaoGasto.objects.count(), 1)
+
+
+def _emprestimos(quantidade, status='Aprovado'):
+    user = User.objects.create(email=f'parcelas{User.objects.count()}@example.com',
+                               cpf=str(User.objects.count()).zfill(11))
+    conta = Conta.objects.create(user=user, agencia='0001', numero=str(user.pk).zfill(8), saldo=0)
+    return Emprestimo.objects.bulk_create(
+        Emprestimo(valorRequisitado=Decimal('1200.00'), valorTotal=0, qtd_parcelas=12,
+                   conta=conta, status=status)
+        for _ in range(quantidade)
+    )
+
+
+class GerarParcelasTests(TestCase):
+    """gerar_parcelas schedules each approved loan once."""
+
+    def test_agenda_aprovados_uma_vez(self):
+        aprovados = _emprestimos(5)
+        _emprestimos(2, status='Não Aprovado')
+
+        call_command('gerar_parcelas', lote=2, stdout=io.StringIO())
+        call_command('gerar_parcelas', lote=2, stdout=io.StringIO())
+
+        por_emprestimo = (ParcelaEmprestimo.objects.values('emprestimo')
+                          .annotate(quantidade=Count('id'), total=Sum('amortizacao')))
+        self.assertEqual(len(por_emprestimo), len(aprovados))
+        for linha in por_emprestimo:
+            self.assertEqual(linha['quantidade'], 12)
+            self.assertEqual(linha['total'], Decimal('1200.00'))
+
+
+class GerarParcelasConcorrenteTests(TransactionTestCase):
+    """Overlapping gerar_parcelas runs never schedule a loan twice."""
+
+    def test_execucoes_simultaneas(self):
+        _emprestimos(300)
+
+        _, erros = executar_concorrente(
+            3, lambda _: call_command('gerar_parcelas', lote=20, stdout=io.StringIO())
+        )
+
+        self.assertEqual(erros, [])
+        self.assertEqual(ParcelaEmprestimo.objects.count(), 300 * 12)
+
+
+class ProcessarParcelasTests(TestCase):
+    """processar_parcelas accrues overdue installments from the reference date."""
+
+    data = datetime.date(2024, 6, 30)
+
+    def setUp(self):
+        emprestimo = _emprestimos(1)[0]
+        self.parcelas = ParcelaEmprestimo.objects.bulk_create(
+            ParcelaEmprestimo(emprestimo=emprestimo, numParcela=numero, valorParcela=Decimal('100.00'),
+                              valorPago=Decimal('0'), dataVencimento=vencimento)
+            for numero, vencimento in enumerate([datetime.date(2024, 5, 31), datetime.date(2024, 6, 20),
+                                                 datetime.date(2024, 6, 30), datetime.date(2024, 7, 31)], 1)
+        )
+        ParcelaEmprestimo.objects.filter(numParcela=2).update(valorPago=Decimal('40.00'))
+
+    def processar(self, data=None, **options):
+        call_command('processar_parcelas', data=str(data or self.data), lote=2,
+                     stdout=io.StringIO(), **options)
+        return {p.numParcela: p for p in ParcelaEmprestimo.objects.all()}
+
+    def test_acumula_vencidas(self):
+        parcelas = self.processar()
+
+        self.assertEqual(parcelas[1].status, ParcelaEmprestimo.VENCIDA)
+        self.assertEqual(parcelas[1].dias_atraso, 30)
+        self.assertEqual(parcelas[1].multa, Decimal('2.00'))
+        self.assertEqual(parcelas[1].juros_mora, Decimal('0.99'))
+        self.assertEqual(parcelas[2].dias_atraso, 10)
+        self.assertEqual(parcelas[2].multa, Decimal('1.20'))
+        self.assertEqual(parcelas[2].juros_mora, Decimal('0.20'))
+        for numero in (3, 4):
+            self.assertEqual(parcelas[numero].status, ParcelaEmprestimo.EM_ABERTO)
+            self.assertEqual(parcelas[numero].juros_mora, 0)
+
+    def test_data_seguinte_recalcula(self):
+        self.processar()
+        parcelas = self.processar(self.data + datetime.timedelta(days=1))
+
+        self.assertEqual(parcelas[1].dias_atraso, 31)
+        self.assertEqual(parcelas[3].dias_atraso, 1)
+
+    def test_retoma_do_checkpoint(self):
+        checkpoint, = inadimplencia.particionar(self.data, 1)
+        Checkpoint.objects.filter(pk=checkpoint.pk).update(ultimo_id=self.parcelas[0].pk)
+
+        parcelas = self.processar()
+
+        self.assertEqual(parcelas[1].status, ParcelaEmprestimo.EM_ABERTO)
+        self.assertEqual(parcelas[2].status, ParcelaEmprestimo.VENCIDA)
+        checkpoint.refresh_from_db()
+        self.assertTrue(checkpoint.concluido)
+        self.assertEqual(checkpoint.linhas, 1)
+
+    def test_particoes(self):
+        checkpoints = inadimplencia.particionar(self.data, 3)
+
+        self.assertEqual([(c.inicio_id, c.fim_id) for c in checkpoints],
+                         [(self.parcelas[0].pk, self.parcelas[1].pk),
+                          (self.parcelas[2].pk, self.parcelas[3].pk)])
+        self.assertEqual(inadimplencia.particionar(self.data, 1), checkpoints)
+
+
+class SaldoDiarioTests(TestCase):
+    """Balances on past dates read from the snapshots match the ledger."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(email='saldodiario@example.com', cpf='80000000000')
+        cls.a = Conta.objects.create(user=user, agencia='0001', numero='00000800', saldo=0)
+        cls.b = Conta.objects.create(user=user, agencia='0001', numero='00000801', saldo=0)
+        cls.dias = [timezone.localdate() - datetime.timedelta(days=10 - n) for n in range(6)]
+
+        cls.lancar(0, ledger.Movimento('Deposito').debitar('100.00', sistema=ledger.CAIXA)
+                   .creditar('100.00', conta_id=cls.a.pk))
+        cls.lancar(1, ledger.Movimento('Transferencia').debitar('30.00', conta_id=cls.a.pk)
+                   .creditar('30.00', conta_id=cls.b.pk))
+        cls.lancar(3, ledger.Movimento('Saque').debitar('20.00', conta_id=cls.a.pk)
+                   .creditar('20.00', sistema=ledger.CAIXA))
+        cls.lancar(3, ledger.Movimento('Deposito').debitar('5.00', sistema=ledger.CAIXA)
+                   .creditar('5.00', conta_id=cls.b.pk))
+
+    @classmethod
+    def lancar(cls, dia, movimento):
+        """Record movimento at noon of dias[dia]."""
+        lancamentos = movimento.lancamentos()
+        for lancamento in lancamentos:
+            lancamento.created_at = saldos._inicio_do_dia(cls.dias[dia]) + datetime.timedelta(hours=12)
+        with transaction.atomic():
+            ledger.aplicar_deltas(movimento.deltas())
+            Lancamento.objects.bulk_create(lancamentos)
+
+    def assertSaldosDoRazao(self):
+        for conta in (self.a, self.b):
+            for data in [self.dias[0] - datetime.timedelta(days=1), *self.dias]:
+                razao = Lancamento.objects.filter(
+                    conta=conta, created_at__lt=saldos._inicio_do_dia(data + saldos.UM_DIA)
+                ).aggregate(variacao=saldos._variacao())['variacao'] or 0
+                with self.subTest(conta=conta.numero, data=data):
+                    self.assertEqual(saldos.saldo_em(conta.pk, data), razao)
+
+    def snapshots(self):
+        return set(SaldoDiario.objects.values_list('conta_id', 'data', 'saldo'))
+
+    def test_saldo_em(self):
+        self.assertSaldosDoRazao()
+        list(saldos.gerar_saldos_diarios(ate=self.dias[2]))
+        self.assertSaldosDoRazao()
+        list(saldos.gerar_saldos_diarios())
+        self.assertSaldosDoRazao()
+
+        self.assertEqual(saldos.saldo_em(self.a.pk, self.dias[5]), Decimal('50.00'))
+        self.assertEqual(saldos.saldo_em(self.b.pk, self.dias[2]), Decimal('30.00'))
+
+    def test_incremental_igual_a_reconstrucao(self):
+        self.assertEqual(dict(saldos.gerar_saldos_diarios(ate=self.dias[1])),
+                         {self.dias[0]: 1, self.dias[1]: 2})
+        call_command('gerar_saldos_diarios', stdout=io.StringIO())
+        incremental = self.snapshots()
+
+        SaldoDiario.objects.all().delete()
+        call_command('gerar_saldos_diarios', stdout=io.StringIO())
+
+        self.assertEqual(self.snapshots(), incremental)
+        self.assertEqual(len(incremental), 5)
+        self.assertFalse(any(escritos for _, escritos in saldos.gerar_saldos_diarios()))
+
+
+class PerfilCreditoTests(TestCase):
+    """Credit profiles are folded incrementally from the source tables."""
+
+    @classmethod
+    def setUpTestData(cls):
+        usuarios = [User.objects.create(email=f'perfil{n}@example.com', cpf=f'2000000000{n}')
+                    for n in range(2)]
+        cls.conta, cls.outra = [
+            Conta.objects.create(user=user, agencia='0001', numero=f'0000010{n}', saldo=0)
+            for n, user in enumerate(usuarios)
+        ]
+        cls.cartao = Cartao.objects.create(nome='Perfil', cvv='123', numero='6504870000000099',
+                                           limite=Decimal('100.00'), tipo='Crédito', conta=cls.conta)
+
+    def movimentar(self):
+        services.depositar(self.conta.pk, Decimal('100.00'))
+        services.sacar(self.conta.pk, Decimal('30.00'))
+        services.transferir(self.conta.pk, self.outra.pk, Decimal('20.00'))
+        services.registrar_gasto(self.cartao, Decimal('40.00'), 'Mercado')
+
+    def atualizar(self, lote=2):
+        # Rows written just now are inside the margin; pretend it has passed.
+        depois = timezone.now() + perfis.MARGEM * 2
+        with mock.patch.object(timezone, 'now', return_value=depois):
+            call_command('atualizar_perfis_credito', lote=lote, stdout=io.StringIO())
+
+    def test_acumula_e_retoma(self):
+        self.movimentar()
+        self.atualizar()
+        self.movimentar()
+        self.atualizar()
+
+        perfil = PerfilCredito.objects.get(conta=self.conta)
+        self.assertEqual((perfil.entradas, perfil.saidas, perfil.movimentos),
+                         (Decimal('200.00'), Decimal('100.00'), 6))
+        self.assertEqual(perfil.gastos_cartao, Decimal('80.00'))
+        outra = PerfilCredito.objects.get(conta=self.outra)
+        self.assertEqual((outra.entradas, outra.saidas, outra.movimentos), (Decimal('40.00'), 0, 2))
+        ultimo = Extrato.objects.latest('id').pk
+        self.assertEqual(Checkpoint.objects.get(job=perfis.JOB, referencia='extrato').ultimo_id, ultimo)
+
+    def test_respeita_a_margem(self):
+        self.movimentar()
+        call_command('atualizar_perfis_credito', stdout=io.StringIO())
+
+        self.assertFalse(PerfilCredito.objects.exists())
+
+    def test_saldo_medio(self):
+        SaldoDiario.objects.bulk_create([
+            SaldoDiario(conta=self.conta, data=datetime.date(2024, 1, dia), saldo=Decimal(saldo))
+            for dia, saldo in [(1, '10.00'), (2, '20.00'), (3, '60.00')]
+        ])
+        self.atualizar()
+
+        self.assertEqual(PerfilCredito.objects.get(conta=self.conta).saldo_medio, Decimal('30.00'))
+
+
+class RecusaTudo:
+    def __call__(self, perfil, pedido):
+        return credito.Parecer(recusa='Recusado pela regra de teste')
+
+
+class CreditoTests(TestCase):
+    """Loans are decided by the configured rules over the profile."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(email='credito@example.com', cpf='30000000000')
+        cls.conta = Conta.objects.create(user=user, agencia='0001', numero='00000200',
+                                         saldo=Decimal('100.00'))
+
+    def test_conta_sem_historico_usa_o_saldo(self):
+        with self.assertNumQueries(2):
+            self.assertTrue(credito.decidir(self.conta, Decimal('320.00'), 12).aprovado)
+        decisao = credito.decidir(self.conta, Decimal('320.01'), 12)
+        self.assertEqual((decisao.aprovado, decisao.motivo),
+                         (False, 'O valor solicitado é muito para sua conta'))
+
+    def cartao_gasto(self, valor):
+        cartao = Cartao.objects.create(nome='Credito', cvv='123', numero='6504870000000200',
+                                       limite=Decimal('100.00'), tipo='Crédito', conta=self.conta)
+        services.registrar_gasto(cartao, valor, 'Mercado')
+        PerfilCredito.objects.create(conta=self.conta, entradas=10, saidas=50, movimentos=3,
+                                     gastos_cartao=valor)
+
+    def test_pontuacao(self):
+        self.cartao_gasto(Decimal('95.00'))
+
+        decisao = credito.decidir(self.conta, Decimal('10.00'), 12)
+
+        self.assertEqual((decisao.aprovado, decisao.pontos), (False, -30))
+
+    def test_utilizacao_recomeca_com_o_ciclo(self):
+        self.cartao_gasto(Decimal('95.00'))
+        self.assertEqual(credito.utilizacao_cartao(self.conta), Decimal('0.95'))
+
+        proximo = (services.inicio_do_ciclo() + datetime.timedelta(days=31)).replace(day=1)
+        with mock.patch.object(timezone, 'localdate', return_value=proximo):
+            self.assertEqual(credito.utilizacao_cartao(self.conta), 0)
+            decisao = credito.decidir(self.conta, Decimal('10.00'), 12)
+
+        self.assertEqual(decisao.pontos, -5)
+
+    @override_settings(CREDITO_REGRAS=['core.tests.RecusaTudo'])
+    def test_regras_configuraveis(self):
+        decisao = credito.decidir(self.conta, Decimal('1.00'), 1)
+        self.assertEqual(decisao.motivo, 'Recusado pela regra de teste')
+
+
+def _pendentes(contas, valores):
+    return TransferenciaPendente.objects.bulk_create(
+        TransferenciaPendente(from_account=de, to_account=para, value=valor)
+        for (de, para), valor in zip(contas, valores)
+    )
+
+
+class LiquidarTransferenciasTests(TestCase):
+    """Pending transfers are settled in order against the running saldos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(email='pendentes@example.com', cpf='40000000000')
+        cls.a = Conta.objects.create(user=user, agencia='0001', numero='00000300', saldo=0)
+        cls.b = Conta.objects.create(user=user, agencia='0001', numero='00000301', saldo=0)
+        services.depositar(cls.a.pk, Decimal('10.00'))
+
+    def test_saldo_corrente_do_lote(self):
+        _pendentes([(self.a, self.b), (self.a, self.b), (self.b, self.a), (self.a, self.b)],
+                   [Decimal('6.00'), Decimal('6.00'), Decimal('3.00'), Decimal('7.00')])
+
+        self.assertEqual(services.liquidar_transferencias(10), 4)
+
+        pendentes = list(TransferenciaPendente.objects.order_by('id'))
+        self.assertEqual([p.status for p in pendentes], [
+            TransferenciaPendente.CONCLUIDA, TransferenciaPendente.RECUSADA,
+            TransferenciaPendente.CONCLUIDA, TransferenciaPendente.CONCLUIDA,
+        ])
+        self.assertEqual(pendentes[1].motivo, 'Saldo insuficiente')
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.saldo, self.b.saldo), (Decimal('0.00'), Decimal('10.00')))
+        self.assertEqual(Transferencia.objects.count(), 3)
+        self.assertEqual(Extrato.objects.filter(tipo__startswith='Transferencia').count(), 6)
+        self.assertEqual(Lancamento.objects.filter(tipo='Transferencia').count(), 6)
+        self.assertEqual(services.liquidar_transferencias(10), 0)
+
+    def test_linha_invalida_nao_trava_a_fila(self):
+        _pendentes([(self.a, self.b), (self.a, self.b), (self.a, self.a), (self.a, self.b)],
+                   [Decimal('5.00'), Decimal('-10.00'), Decimal('1.00'), Decimal('2.00')])
+
+        self.assertEqual(services.liquidar_transferencias(10), 4)
+
+        pendentes = list(TransferenciaPendente.objects.order_by('id'))
+        self.assertEqual([(p.status, p.motivo) for p in pendentes], [
+            (TransferenciaPendente.CONCLUIDA, ''),
+            (TransferenciaPendente.RECUSADA, 'Valor inválido'),
+            (TransferenciaPendente.RECUSADA, 'Conta de destino inválida'),
+            (TransferenciaPendente.CONCLUIDA, ''),
+        ])
+        self.b.refresh_from_db()
+        self.assertEqual(self.b.saldo, Decimal('7.00'))
+
+    def test_agendar_valor_invalido(self):
+        for valor in (Decimal('0'), Decimal('-10.00')):
+            with self.assertRaises(ValueError):
+                services.agendar_transferencia(self.a.pk, self.b.pk, valor)
+        self.assertFalse(TransferenciaPendente.objects.exists())
+
+    def test_lote(self):
+        _pendentes([(self.a, self.b)] * 5, [Decimal('1.00')] * 5)
+
+        self.assertEqual(services.liquidar_transferencias(2), 2)
+        self.assertEqual(TransferenciaPendente.objects.filter(
+            status=TransferenciaPendente.PENDENTE).count(), 3)
+
+
+class LiquidarTransferenciasConcorrenteTests(TransactionTestCase):
+    """Parallel workers settle every pending transfer exactly once."""
+
+    def test_trabalhadores_simultaneos(self):
+        user = User.objects.create(email='liquidantes@example.com', cpf='40000000001')
+        contas = [Conta.objects.create(user=user, agencia='0001', numero=f'0000040{n}',
+                                       saldo=Decimal('1000.00')) for n in range(3)]
+        _pendentes([(contas[n % 3], contas[(n + 1) % 3]) for n in range(300)], [Decimal('1.00')] * 300)
+
+        _, erros = executar_concorrente(
+            3, lambda _: call_command('liquidar_transferencias', lote=20, stdout=io.StringIO())
+        )
+
+        self.assertEqual(erros, [])
+        self.assertEqual(Transferencia.objects.count(), 300)
+        self.assertFalse(TransferenciaPendente.objects.exclude(
+            status=TransferenciaPendente.CONCLUIDA).exists())
+        self.assertEqual(Conta.objects.aggregate(total=Sum('saldo'))['total'], Decimal('3000.00'))
+
+
+class OutboxTests(TestCase):
+    """Money movements write outbox events that the relay publishes once, in order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(email='outbox@example.com', cpf='50000000000')
+        cls.a = Conta.objects.create(user=user, agencia='0001', numero='00000500', saldo=0)
+        cls.b = Conta.objects.create(user=user, agencia='0001', numero='00000501', saldo=0)
+        cls.cartao = Cartao.objects.create(nome='Outbox', cvv='123', numero='6504870000000500',
+                                           limite=Decimal('100.00'), tipo='Crédito', conta=cls.a)
+
+    def setUp(self):
+        outbox.DestinoMemoria.publicados = []
+        self.destino = outbox.DestinoMemoria()
+
+    def publicar(self, lote=1000):
+        depois = timezone.now() + settings.EVENTOS_ESPERA
+        with mock.patch.object(outbox.timezone, 'now', return_value=depois):
+            return outbox.publicar(self.destino, lote)
+
+    def test_evento_na_transacao_do_movimento(self):
+        services.depositar(self.a.pk, Decimal('10.00'))
+        transferencia = services.transferir(self.a.pk, self.b.pk, Decimal('4.00'))
+        gasto = services.registrar_gasto(self.cartao, Decimal('2.50'), 'Padaria')
+        with self.assertRaises(services.SaldoInsuficiente):
+            services.sacar(self.b.pk, Decimal('5.00'))
+
+        eventos = list(Evento.objects.order_by('id'))
+        self.assertEqual([e.tipo for e in eventos], ['Deposito', 'Transferencia', 'Gasto Cartao'])
+        self.assertEqual((eventos[1].origem_tipo, eventos[1].origem_id), ('transferencia', transferencia.pk))
+        self.assertEqual(eventos[1].payload['contas'], {str(self.a.pk): '-4.00', str(self.b.pk): '4.00'})
+        self.assertEqual(eventos[2].payload['origem']['cartao_id'], self.cartao.pk)
+        self.assertEqual(eventos[2].payload['valor'], '2.50')
+        self.assertEqual(eventos[2].origem_id, gasto.pk)
+        self.assertEqual(Lancamento.objects.filter(movimento=eventos[1].movimento).count(), 2)
+
+    def test_publica_em_ordem_sem_repetir(self):
+        for _ in range(5):
+            services.depositar(self.a.pk, Decimal('1.00'))
+
+        self.assertEqual(self.publicar(lote=2), 2)
+        self.assertEqual(self.publicar(lote=10), 3)
+        self.assertEqual(self.publicar(), 0)
+
+        ids = [evento['id'] for evento in outbox.DestinoMemoria.publicados]
+        self.assertEqual(ids, list(Evento.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_espera_eventos_recentes(self):
+        services.depositar(self.a.pk, Decimal('1.00'))
+
+        self.assertEqual(outbox.publicar(self.destino), 0)
+        self.assertEqual(self.publicar(), 1)
+
+    def test_falha_do_destino_nao_avanca(self):
+        services.depositar(self.a.pk, Decimal('1.00'))
+
+        with mock.patch.object(outbox.DestinoMemoria, 'publicar', side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.publicar()
+        self.assertEqual(self.publicar(), 1)
+
+    def test_destino_arquivo(self):
+        services.depositar(self.a.pk, Decimal('1.00'))
+        self.destino = outbox.DestinoArquivo(os.path.join(self.enterContext(tempfile.TemporaryDirectory()),
+                                                          'eventos.ndjson'))
+
+        self.publicar()
+
+        with open(self.destino.caminho, encoding='utf-8') as arquivo:
+            linhas = [json.loads(linha) for linha in arquivo]
+        self.assertEqual([linha['tipo'] for linha in linhas], ['Deposito'])
+        self.assertEqual(linhas[0]['payload']['valor'], '1.00')
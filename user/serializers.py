@@ -4,9 +4,14 @@ Serializers for the user API View.
 from django.contrib.auth import get_user_model, authenticate
 
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
 from django.utils.translation import gettext as _
 
+from core import revogacao
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object."""
@@ -29,10 +34,18 @@ class UserSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """Update and return user."""
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
-
         if password:
-            user.set_password(password)
-            user.save()
+            instance.set_password(password)
+
+        return super().update(instance, validated_data)
+
+
+class RevogavelTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh serializer that refuses revoked refresh tokens."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revogacao.revogado(refresh[api_settings.JTI_CLAIM]):
+            raise InvalidToken(_('Token has been revoked'))
 
-        return user
+        return super().validate(attrs)
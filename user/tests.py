@@ -1,3 +1,250 @@
-from django.test import TestCase
+"""
+Tests for the user app.
+"""
+import datetime
+import io
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import bloqueio, revogacao
+from core.authentication import guardar_usuario, obter_usuario
+from core.middleware import LoginAttemptMiddleware
+from core.models import TokenRevogado, User
+
+
+class PerfilCacheTests(TestCase):
+    """Profile updates never write back a stale cached User."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='perfil@example.com', password='senha123',
+                                             cpf='12312312312', first_name='Antes')
+        guardar_usuario(self.user)
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_atualizacao_usa_a_linha_do_banco(self):
+        User.objects.filter(pk=self.user.pk).update(status='Aprovado', login_attempts=3)
+
+        response = self.client.patch('/api/user/me/', {'first_name': 'Depois'}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Depois')
+        self.assertEqual(self.user.status, 'Aprovado')
+        self.assertEqual(self.user.login_attempts, 3)
+
+    def test_bloqueio_persistido_invalida_o_cache(self):
+        # _persistir runs on its own thread and closes its connection.
+        with mock.patch.object(bloqueio, 'connection'):
+            bloqueio._persistir(self.user.email, 3, None, None)
+
+        self.assertIsNone(obter_usuario(self.user.pk))
+
+
+class LoginBloqueioTests(TestCase):
+    """Repeated failed logins lock the email out of /api/token/."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='bloqueio@example.com', password='senha123',
+                                             cpf='32132132132')
+        self.client = APIClient()
+
+    def login(self, senha):
+        return self.client.post('/api/token/', {'email': 'bloqueio@example.com', 'password': senha},
+                                format='json')
+
+    def test_bloqueia_apos_falhas(self):
+        for _ in range(settings.LOGIN_TENTATIVAS_MAXIMAS - 1):
+            self.assertNotIn('bloqueada', self.login('errada').json()['detail'])
+        self.assertIn('bloqueada', self.login('errada').json()['detail'])
+
+        response = self.login('senha123')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(bloqueio.bloqueado('  BLOQUEIO@example.com'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.login_attempts, 0)
+
+    def test_login_correto_limpa_as_falhas(self):
+        for _ in range(settings.LOGIN_TENTATIVAS_MAXIMAS - 1):
+            self.login('errada')
+        self.assertEqual(self.login('senha123').status_code, 200)
+
+        for _ in range(settings.LOGIN_TENTATIVAS_MAXIMAS - 1):
+            self.login('errada')
+
+        self.assertFalse(bloqueio.bloqueado(self.user.email))
+        self.assertEqual(self.login('senha123').status_code, 200)
+
+    def test_janela_deslizante(self):
+        janela = settings.LOGIN_JANELA.total_seconds()
+        inicio = 1000 * janela
+        # Two failures early in one window, then the rest after the window turns:
+        # the old ones count by how much of their window the sliding window still covers.
+        for email, depois, bloqueia_na in [('meia@example.com', 1.5, 2), ('fim@example.com', 1.9, 3),
+                                           ('longe@example.com', 2.5, 3)]:
+            with self.subTest(email=email):
+                with mock.patch.object(time, 'time', return_value=inicio + 0.1 * janela):
+                    self.assertEqual([bloqueio.registrar_falha(email) for _ in range(2)], [False, False])
+                with mock.patch.object(time, 'time', return_value=inicio + depois * janela):
+                    resultados = [bloqueio.registrar_falha(email) for _ in range(bloqueia_na)]
+                self.assertEqual(resultados, [False] * (bloqueia_na - 1) + [True])
+
+    def test_outras_rotas_nao_leem_o_corpo(self):
+        middleware = LoginAttemptMiddleware(lambda request: HttpResponse(status=401))
+        fabrica = RequestFactory()
+        for request in (fabrica.post('/api/v1/extrato/', '{"email": "bloqueio@example.com"}',
+                                     content_type='application/json'),
+                        fabrica.get('/api/token/', {'email': 'bloqueio@example.com'})):
+            with self.subTest(path=request.path, method=request.method):
+                middleware(request)
+                self.assertFalse(request._read_started)
+
+        self.assertFalse(bloqueio.bloqueado('bloqueio@example.com'))
+        self.assertFalse(cache.get(bloqueio._chave('falhas', 'bloqueio@example.com',
+                                                   int(time.time() // settings.LOGIN_JANELA.total_seconds()))))
+
+
+class RevogacaoTests(TestCase):
+    """Revoked tokens are refused by every worker once it refreshes its filter."""
+
+    def setUp(self):
+        # Start each test as a worker that has not built its filter yet.
+        self.enterContext(mock.patch.dict(revogacao._estado, {
+            'filtro': None, 'atualizado_em': 0.0, 'reconstruido_em': 0.0, 'desde': None,
+        }))
+        self.user = User.objects.create_user(email='revogacao@example.com', password='senha123',
+                                             cpf='45645645645')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.access = self.refresh.access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def revogar_em_outro_worker(self, jti, expira_em=None):
+        TokenRevogado.objects.create(jti=jti, motivo='teste',
+                                     expira_em=expira_em or timezone.now() + datetime.timedelta(hours=1))
+
+    def test_logout_revoga_access_e_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/user/logout/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.client.get('/api/user/me/').status_code, 401)
+        response = APIClient().post('/api/token/refresh/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(TokenRevogado.objects.filter(user=self.user).count(), 2)
+
+    def test_atualizacao_incremental(self):
+        revogacao.atualizar(forcar=True)
+        self.revogar_em_outro_worker('de-outro-worker')
+
+        self.assertFalse(revogacao.revogado('de-outro-worker'))
+        with mock.patch.object(revogacao, '_reconstruir') as reconstruir:
+            revogacao.atualizar(forcar=True)
+
+        reconstruir.assert_not_called()
+        self.assertTrue(revogacao.revogado('de-outro-worker'))
+
+    @override_settings(REVOGACAO_RECONSTRUCAO=datetime.timedelta(0))
+    def test_reconstrucao(self):
+        revogacao.atualizar(forcar=True)
+        self.revogar_em_outro_worker('de-outro-worker')
+        self.revogar_em_outro_worker('expirado', timezone.now() - datetime.timedelta(seconds=1))
+
+        revogacao.atualizar(forcar=True)
+
+        self.assertIn('de-outro-worker', revogacao._estado['filtro'])
+        self.assertNotIn('expirado', revogacao._estado['filtro'])
+
+    def test_falso_positivo_consulta_o_banco(self):
+        revogacao.atualizar(forcar=True)
+        with self.assertNumQueries(0):
+            self.assertFalse(revogacao.revogado('nunca-revogado'))
+
+        with mock.patch.object(revogacao.BloomFilter, '__contains__', return_value=True):
+            with self.assertNumQueries(1):
+                self.assertFalse(revogacao.revogado('nunca-revogado'))
+            self.assertEqual(self.client.get('/api/user/me/').status_code, 200)
+
+
+class AprovarUsuariosTests(TestCase):
+    """Users that waited long enough are approved in chunks and evicted from the cache."""
+
+    def setUp(self):
+        antigo = timezone.now() - settings.APROVACAO_USUARIO_ESPERA - datetime.timedelta(seconds=1)
+        self.antigos = [User.objects.create(email=f'aprovar{n}@example.com', cpf=f'9000000000{n}',
+                                            created_at=antigo) for n in range(5)]
+        self.recente = User.objects.create(email='recente@example.com', cpf='90000000010')
+        self.aprovado = User.objects.create(email='aprovado@example.com', cpf='90000000011',
+                                            status='Aprovado', created_at=antigo)
+        for user in [*self.antigos, self.recente, self.aprovado]:
+            guardar_usuario(user)
+
+    def test_aprova_em_lotes(self):
+        saida = io.StringIO()
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            call_command('aprovar_usuarios', lote=2, stdout=saida)
+
+        self.assertIn('5 usuários aprovados', saida.getvalue())
+        self.assertEqual(sum(c['sql'].lstrip().startswith('UPDATE') for c in consultas.captured_queries), 3)
+        self.assertEqual(
+            set(User.objects.filter(status='Aprovado').values_list('pk', flat=True)),
+            {user.pk for user in [*self.antigos, self.aprovado]}
+        )
+        self.assertEqual([obter_usuario(user.pk) for user in self.antigos], [None] * 5)
+        self.assertEqual(obter_usuario(self.recente.pk).status, 'Em Análise')
+        self.assertIsNotNone(obter_usuario(self.aprovado.pk))
+
+        call_command('aprovar_usuarios', stdout=saida)
+        self.assertIn('0 usuários aprovados', saida.getvalue())
+
+
+class LoginAttemptMiddlewareAsyncTests(SimpleTestCase):
+    """Under ASGI the login middleware runs on the event loop."""
+
+    def setUp(self):
+        self.chamadas = []
+
+        async def resposta(request):
+            self.chamadas.append(request.path)
+            return HttpResponse(status=401)
+
+        self.middleware = LoginAttemptMiddleware(resposta)
+
+    def test_cadeia_toda_assincrona(self):
+        self.assertTrue(iscoroutinefunction(self.middleware))
+        sincronas = [caminho for caminho in settings.MIDDLEWARE
+                     if not getattr(import_string(caminho), 'async_capable', False)]
+        self.assertEqual(sincronas, [])
+
+    def test_outras_rotas_passam_direto(self):
+        request = RequestFactory().post('/api/v1/extrato/', '{"email": "x@example.com"}',
+                                        content_type='application/json')
+        with mock.patch.object(LoginAttemptMiddleware, 'email') as email:
+            response = async_to_sync(self.middleware)(request)
+
+        email.assert_not_called()
+        self.assertEqual((response.status_code, self.chamadas), (401, ['/api/v1/extrato/']))
+
+    def test_email_bloqueado(self):
+        request = RequestFactory().post('/api/token/', '{"email": "x@example.com"}',
+                                        content_type='application/json')
+        with mock.patch.object(bloqueio, 'bloqueado', return_value=True):
+            response = async_to_sync(self.middleware)(request)
+
+        self.assertEqual((response.status_code, self.chamadas), (401, []))
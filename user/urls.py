@@ -9,4 +9,5 @@ app_name = 'user'
 urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('me/', views.ManagerUserView.as_view(), name='me'),
+    path('logout/', views.LogoutView.as_view(), name='logout'),
 ]
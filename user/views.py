@@ -1,16 +1,21 @@
 """
 Views for the user API
 """
+from django.contrib.auth import get_user_model
 from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from rest_framework import (
     status,
     generics
 )
-from rest_framework_simplejwt import authentication as authenticationJWT
-from datetime import timedelta
-from django.utils import timezone
+from core import revogacao
+from core.authentication import CachedJWTAuthentication
 from user.serializers import UserSerializer
 from .permissions import IsCreationOrIsAuthenticated
 
@@ -23,21 +28,20 @@ class CreateUserView(generics.CreateAPIView):
 class ManagerUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [
-        authenticationJWT.JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsCreationOrIsAuthenticated]
 
     def get_object(self):
-        """Retrieve and return the authenticated user."""
-        user = self.request.user
-        created_time = user.created_at
-        current_time = timezone.now()
+        """Retrieve and return the authenticated user.
 
-        if (current_time >= created_time + timedelta(minutes=3)) and user.status != "Aprovado":
-            user.status = "Aprovado"
-            user.save()
+        Users are approved by the aprovar_usuarios command, so reading the
+        profile never writes. Updates load the row from the database: the
+        cached copy may be stale and saving it would write old fields back.
+        """
+        if self.request.method in SAFE_METHODS:
+            return self.request.user
 
-        return user
+        return get_user_model().objects.get(pk=self.request.user.pk)
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
@@ -50,3 +54,23 @@ class ManagerUserView(generics.RetrieveUpdateAPIView):
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class LogoutView(APIView):
+    """Revoke the access token of the request and the refresh token sent."""
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                refresh = RefreshToken(refresh)
+            except TokenError:
+                return Response({'message': 'Refresh token inválido'}, status=status.HTTP_400_BAD_REQUEST)
+            if str(refresh[api_settings.USER_ID_CLAIM]) != str(request.user.pk):
+                return Response({'message': 'Refresh token inválido'}, status=status.HTTP_400_BAD_REQUEST)
+            revogacao.revogar(refresh, 'logout', request.user.pk)
+
+        revogacao.revogar(request.auth, 'logout', request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)